@@ -1,17 +1,63 @@
 from __future__ import annotations
+import importlib
 import os
 from flask import Flask
 
-# データベーステーブル作成（モジュールレベルで1回だけ実行）
-try:
-    from .db import Base, engine
-    # モデルをインポートしてBaseに登録
-    from . import models_login  # noqa: F401
-    from . import models_auth  # noqa: F401
-    Base.metadata.create_all(bind=engine)
-    print("✅ データベーステーブル作成完了")
-except Exception as e:
-    print(f"⚠️ データベーステーブル作成エラー: {e}")
+# SQLAlchemy のエンジンは config.py が .env を読み込む前に生成する（従来どおりの接続先を保つ）
+from .db import Base, engine  # noqa: F401
+# モデルをインポートしてBaseに登録
+from . import models_login  # noqa: F401
+from . import models_auth  # noqa: F401
+
+# 登録するブループリント（モジュール, 登録エラー時の表示名）。上から順に登録する
+# ルーティングはアプリ生成時に確定している必要があるため、ブループリント自体は起動時に読み込む。
+# 各モジュールは ReportLab・pypdf・pdf2image・markdown などを関数内で読み込むので、
+# これらの重いライブラリは初めて使われるリクエストまで読み込まれない。
+BLUEPRINTS = [
+    (".blueprints.health", None),
+    (".blueprints.auth", "auth"),
+    (".blueprints.system_admin", "system_admin"),
+    (".blueprints.tenant_admin", "tenant_admin"),
+    (".blueprints.admin", "admin"),
+    (".blueprints.employee", "employee"),
+    (".blueprints.migrate", "migrate"),
+    (".blueprints.teikan", "teikan"),
+]
+
+
+def init_database() -> None:
+    """
+    テーブル作成・ログイン用スキーマ初期化・マイグレーションを行います。
+    Heroku では release フェーズ（init_db.py）で実行し、
+    DB_INIT_ON_STARTUP=0 の web ワーカーでは起動時の DB 往復を省きます。
+    """
+    # データベーステーブル作成
+    try:
+        Base.metadata.create_all(bind=engine)
+        print("✅ データベーステーブル作成完了")
+    except Exception as e:
+        print(f"⚠️ データベーステーブル作成エラー: {e}")
+
+    # データベース初期化
+    try:
+        from .utils.db import get_db
+        conn = get_db()
+        try:
+            conn.close()
+        except:
+            pass
+        print("✅ データベース初期化完了")
+    except Exception as e:
+        print(f"⚠️ データベース初期化エラー: {e}")
+
+    # データベースマイグレーション実行
+    try:
+        from .migrations import run_migrations
+        run_migrations()
+        print("✅ データベースマイグレーション完了")
+    except Exception as e:
+        print(f"⚠️ データベースマイグレーションエラー: {e}")
+
 
 def create_app() -> Flask:
     """
@@ -20,6 +66,11 @@ def create_app() -> Flask:
     """
     app = Flask(__name__)
 
+    # テンプレートのバイトコードキャッシュ・{% cache %} タグ・描画時間の計測
+    # （Jinja の環境を作る前に設定する）
+    from .templating import init_app as init_templating
+    init_templating(app)
+
     # SECRET_KEY設定
     app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 
@@ -30,6 +81,7 @@ def create_app() -> Flask:
         DEBUG=os.getenv("DEBUG", "1") in ("1", "true", "True"),
         VERSION=os.getenv("APP_VERSION", "0.1.0"),
         TZ=os.getenv("TZ", "Asia/Tokyo"),
+        DB_INIT_ON_STARTUP=os.getenv("DB_INIT_ON_STARTUP", "1") in ("1", "true", "True"),
     )
 
     # config.py があれば上書き
@@ -52,6 +104,18 @@ def create_app() -> Flask:
     except Exception:
         pass
 
+    # リクエスト計測（Server-Timing ヘッダー・リクエストログ）
+    from .instrumentation import init_app as init_instrumentation
+    init_instrumentation(app)
+
+    # 遅いリクエストのプロファイル取得（?_profile=1 / PROFILE_SLOW_MS）
+    from .profiling import init_app as init_profiling
+    init_profiling(app)
+
+    # レスポンスの圧縮（gzip / brotli）
+    from .compression import init_app as init_compression
+    init_compression(app)
+
     # CSRF トークンをテンプレートで使えるようにする
     @app.context_processor
     def inject_csrf():
@@ -62,7 +126,6 @@ def create_app() -> Flask:
     @app.context_processor
     def inject_context_info():
         from flask import session, url_for
-        from .utils import get_db, _sql
         
         context = {
             'current_tenant_name': None,
@@ -86,117 +149,40 @@ def create_app() -> Flask:
             # ブループリントが登録されていない場合はデフォルトのURLを使用
             context['mypage_url'] = url_for('auth.index')
         
-        # テナント情報を取得
+        # テナント・店舗の名前はディレクトリ（プロセス内に保持）から引く。
+        # 描画のたびに DB に問い合わせない
         tenant_id = session.get('tenant_id')
-        if tenant_id:
-            try:
-                conn = get_db()
-                cur = conn.cursor()
-                sql = _sql(conn, 'SELECT "名称" FROM "T_テナント" WHERE id=%s')
-                cur.execute(sql, (tenant_id,))
-                row = cur.fetchone()
-                if row:
-                    context['current_tenant_name'] = row[0]
-                conn.close()
-            except Exception:
-                pass
-        
-        # 店舗情報を取得
         store_id = session.get('store_id')
-        if store_id:
+        if tenant_id or store_id:
             try:
-                conn = get_db()
-                cur = conn.cursor()
-                sql = _sql(conn, 'SELECT "名称", tenant_id FROM "T_店舗" WHERE id=%s')
-                cur.execute(sql, (store_id,))
-                row = cur.fetchone()
-                if row:
-                    context['current_store_name'] = row[0]
+                from .services import directory
+                entries = directory.get()
+                tenant = entries.tenant(tenant_id) if tenant_id else None
+                if tenant:
+                    context['current_tenant_name'] = tenant['name']
+                store = entries.store(store_id) if store_id else None
+                if store:
+                    context['current_store_name'] = store['name']
                     # 店舗のテナント情報も取得
-                    if not context['current_tenant_name'] and row[1]:
-                        cur2 = conn.cursor()
-                        sql2 = _sql(conn, 'SELECT "名称" FROM "T_テナント" WHERE id=%s')
-                        cur2.execute(sql2, (row[1],))
-                        row2 = cur2.fetchone()
-                        if row2:
-                            context['current_tenant_name'] = row2[0]
-                conn.close()
+                    if not context['current_tenant_name'] and store['tenant_name']:
+                        context['current_tenant_name'] = store['tenant_name']
             except Exception:
                 pass
         
         return context
 
-    # データベース初期化
-    try:
-        from .utils.db import get_db
-        conn = get_db()
-        try:
-            conn.close()
-        except:
-            pass
-        print("✅ データベース初期化完了")
-    except Exception as e:
-        print(f"⚠️ データベース初期化エラー: {e}")
-    
-    
-    # データベースマイグレーション実行
-    try:
-        from .migrations import run_migrations
-        run_migrations()
-        print("✅ データベースマイグレーション完了")
-    except Exception as e:
-        print(f"⚠️ データベースマイグレーションエラー: {e}")
+    # データベース初期化（DB_INIT_ON_STARTUP=0 なら release フェーズで済んでいるものとして省略）
+    if app.config["DB_INIT_ON_STARTUP"]:
+        init_database()
 
     # blueprints 登録
-    try:
-        from .blueprints.health import bp as health_bp  # type: ignore
-        app.register_blueprint(health_bp)
-    except Exception:
-        pass
-
-    # 認証関連blueprints
-    try:
-        from .blueprints.auth import bp as auth_bp
-        app.register_blueprint(auth_bp)
-    except Exception as e:
-        print(f"⚠️ auth blueprint 登録エラー: {e}")
-
-    try:
-        from .blueprints.system_admin import bp as system_admin_bp
-        app.register_blueprint(system_admin_bp)
-    except Exception as e:
-        print(f"⚠️ system_admin blueprint 登録エラー: {e}")
-
-    try:
-        from .blueprints.tenant_admin import bp as tenant_admin_bp
-        app.register_blueprint(tenant_admin_bp)
-    except Exception as e:
-        print(f"⚠️ tenant_admin blueprint 登録エラー: {e}")
-
-    try:
-        from .blueprints.admin import bp as admin_bp
-        app.register_blueprint(admin_bp)
-    except Exception as e:
-        print(f"⚠️ admin blueprint 登録エラー: {e}")
-
-    try:
-        from .blueprints.employee import bp as employee_bp
-        app.register_blueprint(employee_bp)
-    except Exception as e:
-        print(f"⚠️ employee blueprint 登録エラー: {e}")
-
-    try:
-        from .blueprints.migrate import bp as migrate_bp
-        app.register_blueprint(migrate_bp)
-    except Exception as e:
-        print(f"⚠️ migrate blueprint 登録エラー: {e}")
-
-    # 定款アプリ
-    try:
-        from .blueprints.teikan import bp as teikan_bp
-        app.register_blueprint(teikan_bp)
-    except Exception as e:
-        print(f"⚠️ teikan blueprint 登録エラー: {e}")
+    for module_name, label in BLUEPRINTS:
+        try:
+            module = importlib.import_module(module_name, __name__)
+            app.register_blueprint(module.bp)
+        except Exception as e:
+            if label:
+                print(f"⚠️ {label} blueprint 登録エラー: {e}")
 
     # エラーハンドラ
     @app.errorhandler(404)
@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+"""
+重い処理（PDF 生成・ZIP 一式・画像プレビュー）の流量制限と同時実行数の制御
+
+1人が「全部ダウンロード」やプレビューのタブを連打しても、ワーカーのスレッドが PDF 生成で
+埋まってログインや入力画面が待たされないようにする。
+
+- トークンバケット: ユーザーごと・テナントごとに、一定の速さで補充されるトークンを
+  重い処理のたびに消費する（ZIP 一式は ZIP_COST 個）。足りなければ 429 を返す
+- 描画スロット: 全ワーカーで同時に PDF を生成できる数を RENDER_SLOTS に制限する。
+  空きが無ければ RENDER_WAIT 秒まで待ち、それでも空かなければ 429 を返す。
+  待っているリクエストもスレッドを使うので、待てる数はワーカーごとに RENDER_QUEUE まで
+
+どちらも同じホストの全ワーカーで共有する（ADMISSION_DIR に置く）。
+
+- バケットは SQLite のファイルに保存し、BEGIN IMMEDIATE で残量の確認と消費をまとめて行う
+- スロットは RENDER_SLOTS 個のロックファイルで、flock を取れたものを使う。
+  ワーカーが異常終了してもロックは OS が外すので、スロットが失われない
+
+ログインの試行回数の制限（app/services/login.py）も check() / charge() で同じバケットを使う。
+ディレクトリを使えない環境（読み取り専用など）ではプロセス内で数える。
+ADMISSION=0 で無効にできる。
+"""
+
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, jsonify, render_template, session
+
+from . import metrics
+from .instrumentation import span
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger("app.admission")
+
+ENABLED = os.getenv("ADMISSION", "1") not in ("0", "false", "False")
+ADMISSION_DIR = os.getenv("ADMISSION_DIR") or os.path.join(tempfile.gettempdir(), "teikan-admission")
+
+# ユーザーごと: 最大 USER_BURST 回まで続けて生成でき、USER_RATE 回／秒で回復する
+USER_BURST = float(os.getenv("ADMISSION_USER_BURST", "20"))
+USER_RATE = float(os.getenv("ADMISSION_USER_RATE", "0.5"))
+# テナントごと（同じテナントの全ユーザーの合計）
+TENANT_BURST = float(os.getenv("ADMISSION_TENANT_BURST", "60"))
+TENANT_RATE = float(os.getenv("ADMISSION_TENANT_RATE", "2"))
+# ZIP 一式は PDF を十数件まとめて作るので、その分のトークンを消費する
+ZIP_COST = float(os.getenv("ADMISSION_ZIP_COST", "10"))
+
+# 全ワーカー合計の同時生成数（既定はワーカー数。残りのスレッドを画面の表示に回す）
+RENDER_SLOTS = max(1, int(os.getenv("ADMISSION_RENDER_SLOTS", os.getenv("WEB_CONCURRENCY", "2"))))
+RENDER_WAIT = float(os.getenv("ADMISSION_RENDER_WAIT", "10"))
+RENDER_QUEUE = max(0, int(os.getenv("ADMISSION_RENDER_QUEUE", "1")))
+
+_POLL_SECONDS = 0.05
+_PRUNE_SECONDS = 24 * 60 * 60
+
+
+class Rejected(Exception):
+    """受け付けなかった理由（user / tenant / busy）と、再試行までの秒数"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+
+# ========================================
+# トークンバケット
+# ========================================
+
+class _Buckets:
+    """
+    (キー → 残りトークン, 最終更新時刻) の表
+    ファイルが使えなければ、同じプロセスの接続だけで共有するメモリ上の DB にする
+    """
+
+    _MEMORY = "file:teikan-admission?mode=memory&cache=shared"
+
+    def __init__(self, directory):
+        self._local = threading.local()
+        try:
+            os.makedirs(directory, exist_ok=True)
+            self._target, self._uri = os.path.join(directory, "buckets.sqlite3"), False
+            self._connect()
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("admission: %s を使えないためプロセス内で数えます: %s", directory, e)
+            self._target, self._uri = self._MEMORY, True
+            self._local = threading.local()
+            # メモリ上の DB は接続が1本も無くなると消えるので、1本持っておく
+            self._keepalive = self._connect()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._target, uri=self._uri, timeout=2, isolation_level=None)
+            if not self._uri:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _levels(conn, limits, now):
+        """[(キー, 今の残り, 上限, 回復速度/秒, 理由)]"""
+        levels = []
+        for key, burst, rate, reason in limits:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+            levels.append((key, tokens, burst, rate, reason))
+        return levels
+
+    @staticmethod
+    def _shortage(levels, need):
+        """need に足りないバケットがあれば、一番長く待つものの Rejected"""
+        longest = None  # (待つ秒数, 理由)
+        for _key, tokens, burst, rate, reason in levels:
+            if tokens < need:
+                wait = (min(need, burst) - tokens) / rate if rate > 0 else 60
+                if longest is None or wait > longest[0]:
+                    longest = (wait, reason)
+        return None if longest is None else Rejected(longest[1], longest[0])
+
+    def _update(self, limits, write):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = write(conn, self._levels(conn, limits, now), now)
+            if random.random() < 0.001:
+                # しばらく使われていないバケットは満タンに戻っている（行が無いのと同じ）ので消す
+                conn.execute("DELETE FROM buckets WHERE updated < ?", (now - _PRUNE_SECONDS,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def take(self, limits, cost):
+        """
+        limits: [(キー, 上限, 回復速度/秒, 理由)]
+        すべてのバケットに cost 以上残っていれば全部から引いて None を、
+        どれかが足りなければ（どれからも引かずに）Rejected を返す
+        """
+        def write(conn, levels, now):
+            rejected = self._shortage(levels, cost)
+            if rejected is None:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                    [(key, tokens - cost, now) for key, tokens, *_ in levels],
+                )
+            return rejected
+        return self._update(limits, write)
+
+    def peek(self, limits, need):
+        """残りが need 未満のバケットがあれば Rejected（読むだけで書き込まない）"""
+        return self._shortage(self._levels(self._connect(), limits, time.time()), need)
+
+    def refund(self, limits, cost):
+        """take() で引いた cost を戻す（上限は超えない）"""
+        def write(conn, levels, now):
+            conn.executemany(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                [(key, min(burst, tokens + cost), now) for key, tokens, burst, *_ in levels],
+            )
+        self._update(limits, write)
+
+    def charge(self, limits, cost):
+        """残りにかかわらず cost を引く（0 未満にはしない）"""
+        def write(conn, levels, now):
+            conn.executemany(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                [(key, max(0.0, tokens - cost), now) for key, tokens, *_ in levels],
+            )
+        self._update(limits, write)
+
+
+_buckets = None
+_buckets_lock = threading.Lock()
+
+
+def _get_buckets():
+    global _buckets
+    if _buckets is None:
+        with _buckets_lock:
+            if _buckets is None:
+                _buckets = _Buckets(ADMISSION_DIR)
+    return _buckets
+
+
+def _limits():
+    """ログイン中のユーザー・テナントのバケット"""
+    limits = []
+    user_id = session.get("user_id")
+    if user_id is not None:
+        limits.append((f"user:{session.get('role')}:{user_id}", USER_BURST, USER_RATE, "user"))
+    tenant_id = session.get("tenant_id")
+    if tenant_id is not None:
+        limits.append((f"tenant:{tenant_id}", TENANT_BURST, TENANT_RATE, "tenant"))
+    return limits
+
+
+def _take_tokens(cost):
+    """トークンを引き、引いたバケット（_refund_tokens に渡す）を返す。足りなければ Rejected"""
+    limits = _limits()
+    if not limits:
+        return []
+    try:
+        rejected = _get_buckets().take(limits, cost)
+    except sqlite3.Error as e:
+        # 数えられないときは止めずに通す（描画スロットの制限は残る）
+        logger.warning("admission: トークンバケットを更新できません: %s", e)
+        return []
+    if rejected is not None:
+        raise rejected
+    return limits
+
+
+def _refund_tokens(limits, cost):
+    if not limits:
+        return
+    try:
+        _get_buckets().refund(limits, cost)
+    except sqlite3.Error as e:
+        logger.warning("admission: トークンバケットを更新できません: %s", e)
+
+
+def check(limits, need=1):
+    """
+    limits（[(キー, 上限, 回復速度/秒, 理由)]）のどれかの残りが need 未満なら Rejected を返す
+    失敗したときだけ charge() する使い方（ログインの試行回数など）で、成功した分を数えないために使う
+    """
+    try:
+        return _get_buckets().peek(limits, need)
+    except sqlite3.Error as e:
+        logger.warning("admission: トークンバケットを読めません: %s", e)
+        return None
+
+
+def charge(limits, cost=1):
+    """limits のバケットから cost を引く"""
+    try:
+        _get_buckets().charge(limits, cost)
+    except sqlite3.Error as e:
+        logger.warning("admission: トークンバケットを更新できません: %s", e)
+
+
+# ========================================
+# 描画スロット
+# ========================================
+
+class _Slots:
+    """RENDER_SLOTS 個のロックファイル（flock が使えなければプロセス内のセマフォ）"""
+
+    def __init__(self, directory, count):
+        self.count = count
+        self._paths = None
+        self._semaphore = None
+        if fcntl is not None:
+            try:
+                os.makedirs(directory, exist_ok=True)
+                self._paths = [os.path.join(directory, f"render-{i}.lock") for i in range(count)]
+            except OSError as e:
+                logger.warning("admission: %s を使えないためプロセス内で数えます: %s", directory, e)
+        if self._paths is None:
+            self._semaphore = threading.BoundedSemaphore(count)
+        self._waiting = 0
+        self._waiting_lock = threading.Lock()
+
+    def _try_acquire(self):
+        """空いているスロットを取れたら解放用のオブジェクト、取れなければ None"""
+        if self._semaphore is not None:
+            return self._semaphore if self._semaphore.acquire(blocking=False) else None
+        # 同じスロットにばかり集まらないよう、開始位置をずらして探す
+        start = random.randrange(self.count)
+        for i in range(self.count):
+            path = self._paths[(start + i) % self.count]
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                continue
+            return fd
+        return None
+
+    def release(self, handle):
+        if handle is self._semaphore:
+            self._semaphore.release()
+        else:
+            os.close(handle)  # flock も外れる
+
+    def acquire(self, timeout):
+        """スロットを取って解放用のオブジェクトを返す。待ちきれなければ Rejected"""
+        handle = self._try_acquire()
+        if handle is not None:
+            return handle
+        with self._waiting_lock:
+            if self._waiting >= RENDER_QUEUE:
+                raise Rejected("busy", RENDER_WAIT / 2)
+            self._waiting += 1
+        try:
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                time.sleep(_POLL_SECONDS * (0.5 + random.random()))
+                handle = self._try_acquire()
+                if handle is not None:
+                    return handle
+        finally:
+            with self._waiting_lock:
+                self._waiting -= 1
+        raise Rejected("busy", RENDER_WAIT / 2)
+
+
+_slots = None
+_slots_lock = threading.Lock()
+
+
+def _get_slots():
+    global _slots
+    if _slots is None:
+        with _slots_lock:
+            if _slots is None:
+                _slots = _Slots(ADMISSION_DIR, RENDER_SLOTS)
+    return _slots
+
+
+# ========================================
+# 受け付け
+# ========================================
+
+@contextmanager
+def rendering(cost=1):
+    """
+    with rendering(): ... の中で PDF を生成する
+
+    トークンを消費してから描画スロットを取る。受け付けられなければ Rejected を送出する。
+    スロットを待ちきれなかったとき、または中の生成が例外で終わったときは、消費したトークンを戻す
+    （作れなかった書類の分まで数えないため）。入力不足のリダイレクトなどで数えないよう、
+    ビューの中で生成する部分だけを囲む。
+    同じリクエストの中で入れ子にした場合（ZIP 一式の中の各 PDF など）は何もしない。
+    リクエストの外（CLI など）では制限しない。
+    """
+    if not ENABLED or not has_request_context() or g.get("_render_admitted"):
+        yield
+        return
+
+    try:
+        charged = _take_tokens(cost)
+    except Rejected as rejected:
+        metrics.count_admission(rejected.reason)
+        raise
+    try:
+        started = time.perf_counter()
+        with span("admission.wait"):
+            handle = _get_slots().acquire(RENDER_WAIT)
+        metrics.observe_render_wait(time.perf_counter() - started)
+    except Rejected as rejected:
+        _refund_tokens(charged, cost)
+        metrics.count_admission(rejected.reason)
+        raise
+    metrics.count_admission("admitted")
+
+    g._render_admitted = True
+    metrics.render_started()
+    try:
+        yield
+    except Exception:
+        _refund_tokens(charged, cost)
+        raise
+    finally:
+        metrics.render_finished()
+        g._render_admitted = False
+        _get_slots().release(handle)
+
+
+def too_many_requests(rejected, as_json=False):
+    """429 のレスポンス（Retry-After 付き）"""
+    if rejected.reason == "busy":
+        message = "書類の作成が混み合っています。少し待ってからもう一度お試しください。"
+    else:
+        message = "短時間に多くの書類を作成しています。少し待ってからもう一度お試しください。"
+    if as_json:
+        response = jsonify({"error": message, "retry_after": rejected.retry_after})
+    else:
+        response = render_template("429.html", message=message, retry_after=rejected.retry_after)
+    return response, 429, {"Retry-After": str(rejected.retry_after), "Cache-Control": "no-store"}
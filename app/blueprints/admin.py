@@ -4,12 +4,14 @@
 """
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
 from app.db import SessionLocal
+from app.services.login import hash_password
 from app.models_login import TKanrisha, TJugyoin, TTenant, TTenpo, TKanrishaTenpo, TJugyoinTenpo, TTenpoAppSetting, TTenantAdminTenant
 from sqlalchemy import func, and_, or_
 from ..utils.decorators import ROLES
 from ..utils.decorators import require_roles
+from app.services import app_settings
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -41,18 +43,7 @@ def dashboard():
             # 店舗情報を取得
             store = db.query(TTenpo).filter(TTenpo.id == store_id).first()
             
-            for app in AVAILABLE_APPS:
-                if app['scope'] == 'store':
-                    app_setting = db.query(TTenpoAppSetting).filter(
-                        and_(
-                            TTenpoAppSetting.store_id == store_id,
-                            TTenpoAppSetting.app_name == app['name']
-                        )
-                    ).first()
-                    enabled = app_setting.enabled if app_setting else 1
-                    
-                    if enabled:
-                        enabled_apps.append(app)
+            enabled_apps = app_settings.enabled_apps(app_settings.SCOPE_STORE, store_id, AVAILABLE_APPS)
         finally:
             db.close()
     
@@ -80,18 +71,7 @@ def available_apps():
             # 店舗情報を取得
             store = db.query(TTenpo).filter(TTenpo.id == store_id).first()
             
-            for app in AVAILABLE_APPS:
-                if app['scope'] == 'store':
-                    app_setting = db.query(TTenpoAppSetting).filter(
-                        and_(
-                            TTenpoAppSetting.store_id == store_id,
-                            TTenpoAppSetting.app_name == app['name']
-                        )
-                    ).first()
-                    enabled = app_setting.enabled if app_setting else 1
-                    
-                    if enabled:
-                        enabled_apps.append(app)
+            enabled_apps = app_settings.enabled_apps(app_settings.SCOPE_STORE, store_id, AVAILABLE_APPS)
         finally:
             db.close()
     
@@ -214,7 +194,7 @@ def mypage():
                     return render_template('admin_mypage.html', user=user, tenant_name=tenant_name, stores=stores, store_list=store_list, tenant_list=tenant_list)
                 
                 # パスワードを更新
-                user_obj.password_hash = generate_password_hash(new_password)
+                user_obj.password_hash = hash_password(new_password)
                 if hasattr(user_obj, 'updated_at'):
                     user_obj.updated_at = func.now()
                 db.commit()
@@ -521,7 +501,7 @@ def employee_new():
                 return render_template('admin_employee_new.html', stores=stores_list, from_store_id=store_id, back_url=url_for('admin.employees'), tenant=tenant, store=store)
             
             # 従業員作成
-            hashed_password = generate_password_hash(password) if password else None
+            hashed_password = hash_password(password) if password else None
             new_employee = TJugyoin(
                 login_id=login_id,
                 name=name,
@@ -615,7 +595,7 @@ def employee_edit(employee_id):
                                     login_id=employee.login_id,
                                     name=name,
                                     email=email,
-                                    password_hash=employee.password_hash if not password else generate_password_hash(password),
+                                    password_hash=employee.password_hash if not password else hash_password(password),
                                     role=ROLES["ADMIN"],
                                     tenant_id=tenant_id,
                                     active=active
@@ -647,7 +627,7 @@ def employee_edit(employee_id):
                                     login_id=employee.login_id,
                                     name=name,
                                     email=email,
-                                    password_hash=employee.password_hash if not password else generate_password_hash(password),
+                                    password_hash=employee.password_hash if not password else hash_password(password),
                                     role=ROLES["TENANT_ADMIN"],
                                     tenant_id=tenant_id,
                                     active=active
@@ -676,7 +656,7 @@ def employee_edit(employee_id):
                             employee.email = email
                             employee.active = active
                             if password:
-                                employee.password_hash = generate_password_hash(password)
+                                employee.password_hash = hash_password(password)
                             
                             # 店舗所属の更新
                             if store_ids:
@@ -930,6 +910,7 @@ def store_delete(store_id):
         
         # アプリ設定を削除
         db.query(TTenpoAppSetting).filter(TTenpoAppSetting.store_id == store_id).delete()
+        app_settings.invalidate(app_settings.SCOPE_STORE, store_id)
         
         # 店舗を削除
         db.delete(store_obj)
@@ -1060,7 +1041,7 @@ def admin_edit(admin_id):
                     admin.active = active
                     
                     if password:
-                        admin.password_hash = generate_password_hash(password)
+                        admin.password_hash = hash_password(password)
                     
                     # 所属店舗を更新
                     # 既存の所属店舗を削除
@@ -1447,7 +1428,7 @@ def admin_new():
                 return render_template('admin_admin_new.html', tenant=tenant, store=store, stores=stores_list, from_store_id=store_id, back_url=url_for('admin.admins'))
             
             # 管理者作成
-            hashed_password = generate_password_hash(password)
+            hashed_password = hash_password(password)
             new_admin = TKanrisha(
                 login_id=login_id,
                 name=name,
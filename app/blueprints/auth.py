@@ -4,8 +4,8 @@
 """
 
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from werkzeug.security import generate_password_hash, check_password_hash
 from ..utils import get_db, _sql, login_user, admin_exists, ROLES
+from ..services import directory, login
 
 bp = Blueprint('auth', __name__)
 
@@ -74,7 +74,7 @@ def first_admin_setup():
                     if exists:
                         error = "このログインIDはすでに使用されています。"
                     else:
-                        ph = generate_password_hash(password)
+                        ph = login.hash_password(password)
                         sql_ins = _sql(conn, '''
                             INSERT INTO "T_管理者"(login_id, name, email, password_hash, role, tenant_id, is_owner, can_manage_admins)
                             VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
@@ -94,116 +94,88 @@ def first_admin_setup():
     return render_template('first_setup.html', error=error)
 
 
+def _login_page(template, failure=None):
+    """ログイン画面（失敗したときは理由に応じたステータスで返す）"""
+    if failure is None:
+        return render_template(template, error=None)
+    return render_template(template, error=str(failure)), failure.status, failure.headers
+
+
 @bp.route('/system_admin_login', methods=['GET','POST'])
 def system_admin_login():
     """システム管理者ログイン"""
-    error = None
+    failure = None
     if request.method == 'POST':
         login_id = request.form.get('login_id','').strip()
         password = request.form.get('password','')
-        conn = get_db()
         try:
-            cur = conn.cursor()
-            sql = _sql(conn, 'SELECT id, name, password_hash, tenant_id, is_owner FROM "T_管理者" WHERE login_id=%s AND role=%s')
-            cur.execute(sql, (login_id, ROLES["SYSTEM_ADMIN"]))
-            row = cur.fetchone()
-            if row and check_password_hash(row[2], password):
-                user_id, name, tenant_id, is_owner = row[0], row[1], row[3], row[4]
-                login_user(user_id, name, ROLES["SYSTEM_ADMIN"], tenant_id)
-                session['is_owner'] = (is_owner == 1)
-                return redirect(url_for('system_admin.mypage'))
-            error = "ログインIDまたはパスワードが違います"
-        finally:
-            try: conn.close()
-            except: pass
-    return render_template('sysadmin_login.html', error=error)
+            user = login.authenticate(login.ADMIN, login_id, password, role=ROLES["SYSTEM_ADMIN"])
+        except login.LoginError as e:
+            failure = e
+        else:
+            login_user(user['id'], user['name'], ROLES["SYSTEM_ADMIN"], user['tenant_id'])
+            session['is_owner'] = user['is_owner']
+            return redirect(url_for('system_admin.mypage'))
+    return _login_page('sysadmin_login.html', failure)
 
 
 @bp.route('/tenant_admin_login', methods=['GET','POST'])
 def tenant_admin_login():
     """テナント管理者ログイン"""
-    error = None
+    failure = None
     if request.method == 'POST':
         login_id = request.form.get('login_id','').strip()
         password = request.form.get('password','')
-        conn = get_db()
         try:
-            cur = conn.cursor()
-            sql = _sql(conn, 'SELECT id, name, password_hash, tenant_id, is_owner FROM "T_管理者" WHERE login_id=%s AND role=%s')
-            cur.execute(sql, (login_id, ROLES["TENANT_ADMIN"]))
-            row = cur.fetchone()
-            if row and check_password_hash(row[2], password):
-                user_id, name, tenant_id, is_owner = row[0], row[1], row[3], row[4]
-                login_user(user_id, name, ROLES["TENANT_ADMIN"], tenant_id)
-                session['is_owner'] = (is_owner == 1)
-                return redirect(url_for('teikan.index'))
-            else:
-                error = "ログインIDまたはパスワードが違います"
-        finally:
-            try: conn.close()
-            except: pass
-    return render_template('tenant_admin_login.html', error=error)
+            user = login.authenticate(login.ADMIN, login_id, password, role=ROLES["TENANT_ADMIN"])
+        except login.LoginError as e:
+            failure = e
+        else:
+            login_user(user['id'], user['name'], ROLES["TENANT_ADMIN"], user['tenant_id'])
+            session['is_owner'] = user['is_owner']
+            return redirect(url_for('teikan.index'))
+    return _login_page('tenant_admin_login.html', failure)
 
 
 @bp.route('/admin_login', methods=['GET','POST'])
 def admin_login():
     """管理者ログイン"""
-    error = None
+    failure = None
     if request.method == 'POST':
         login_id = request.form.get('login_id','').strip()
         password = request.form.get('password','')
-        conn = get_db()
         try:
-            cur = conn.cursor()
-            sql = _sql(conn, 'SELECT id, name, password_hash, tenant_id, is_owner FROM "T_管理者" WHERE login_id=%s AND role=%s')
-            cur.execute(sql, (login_id, ROLES["ADMIN"]))
-            row = cur.fetchone()
-            if row and check_password_hash(row[2], password):
-                user_id, name, tenant_id, is_owner = row[0], row[1], row[3], row[4]
-                if not tenant_id:
-                    error = "この管理者にはテナントが紐づいていません。"
-                else:
-                    login_user(user_id, name, ROLES["ADMIN"], tenant_id)
-                    session['store_id'] = None  # 店舗未選択
-                    session['is_owner'] = (is_owner == 1)
-                    return redirect(url_for('admin.mypage'))
+            user = login.authenticate(login.ADMIN, login_id, password, role=ROLES["ADMIN"])
+        except login.LoginError as e:
+            failure = e
+        else:
+            if not user['tenant_id']:
+                failure = login.LoginError("この管理者にはテナントが紐づいていません。")
             else:
-                error = "ログインIDまたはパスワードが違います"
-        finally:
-            try: conn.close()
-            except: pass
-    return render_template('store_login.html', error=error)
+                login_user(user['id'], user['name'], ROLES["ADMIN"], user['tenant_id'])
+                session['store_id'] = None  # 店舗未選択
+                session['is_owner'] = user['is_owner']
+                return redirect(url_for('admin.mypage'))
+    return _login_page('store_login.html', failure)
 
 
 @bp.route('/employee_login', methods=['GET','POST'])
 def employee_login():
     """従業員ログイン"""
-    error = None
+    failure = None
     if request.method == 'POST':
         login_id = request.form.get('login_id','').strip()  # email でも login_id でもOK
         password = request.form.get('password','')
-        conn = get_db()
         try:
-            cur = conn.cursor()
-            sql = _sql(conn, 'SELECT id, name, password_hash, tenant_id FROM "T_従業員" WHERE login_id=%s OR email=%s')
-            cur.execute(sql, (login_id, login_id))
-            row = cur.fetchone()
-            if row:
-                user_id, name, hashv, tenant_id = row[0], row[1], row[2], row[3]
-                # 初回パス未設定 + 123456 を許容
-                if (not hashv or hashv == '') and password == '123456':
-                    login_user(user_id, name, ROLES["EMPLOYEE"], tenant_id, is_employee=True)
-                    session['store_id'] = None  # 店舗未選択
-                    return redirect(url_for('employee.mypage'))
-                if hashv and check_password_hash(hashv, password):
-                    login_user(user_id, name, ROLES["EMPLOYEE"], tenant_id, is_employee=True)
-                    session['store_id'] = None  # 店舗未選択
-                    return redirect(url_for('employee.mypage'))
-            error = "ログインIDまたはパスワードが違います"
-        finally:
-            try: conn.close()
-            except: pass
-    return render_template('staff_login.html', error=error)
+            # 初回パス未設定の従業員は 123456 を許容（login.EMPLOYEE_INITIAL_PASSWORD）
+            user = login.authenticate(login.EMPLOYEE, login_id, password)
+        except login.LoginError as e:
+            failure = e
+        else:
+            login_user(user['id'], user['name'], ROLES["EMPLOYEE"], user['tenant_id'], is_employee=True)
+            session['store_id'] = None  # 店舗未選択
+            return redirect(url_for('employee.mypage'))
+    return _login_page('staff_login.html', failure)
 
 
 @bp.route('/staff_login', methods=['GET','POST'])
@@ -265,22 +237,23 @@ def select_tenant():
                 login_user(user_id, name, role, int(tenant_id))
                 return redirect(url_for('tenant_admin.dashboard'))
         
-        # 所属テナント一覧を取得
+        # 所属テナント一覧を取得（名称などはディレクトリから引く）
         sql = _sql(conn, '''
-            SELECT t.id, t.名称, t.slug
-            FROM "T_テナント" t
-            INNER JOIN "T_テナント管理者_テナント" tt ON t.id = tt.tenant_id
-            WHERE tt.tenant_admin_id = %s AND t.有効 = 1
-            ORDER BY t.名称
+            SELECT tenant_id FROM "T_テナント管理者_テナント"
+            WHERE tenant_admin_id = %s
         ''')
         cur.execute(sql, (user_id,))
+        current = directory.get()
         tenants = []
-        for row in cur.fetchall():
-            tenants.append({
-                'id': row[0],
-                '名称': row[1],
-                'slug': row[2]
-            })
+        for (tid,) in cur.fetchall():
+            tenant = current.tenant(tid)
+            if tenant and tenant['active']:
+                tenants.append({
+                    'id': tenant['id'],
+                    '名称': tenant['name'],
+                    'slug': tenant['slug']
+                })
+        tenants.sort(key=lambda t: t['名称'])
         
         return render_template('select_tenant.html', tenants=tenants)
     finally:
@@ -325,32 +298,28 @@ def select_store():
                     session['store_id'] = int(store_id)
                     return redirect(url_for('admin.dashboard'))
         
-        # 所属店舗一覧を取得
+        # 所属店舗一覧を取得（名称などはディレクトリから引く）
         if role == ROLES["EMPLOYEE"]:
             sql = _sql(conn, '''
-                SELECT s.id, s.名称, s.slug
-                FROM "T_店舗" s
-                INNER JOIN "T_従業員_店舗" es ON s.id = es.store_id
-                WHERE es.employee_id = %s AND s.tenant_id = %s AND s.有効 = 1
-                ORDER BY s.名称
+                SELECT store_id FROM "T_従業員_店舗" WHERE employee_id = %s
             ''')
         else:
             sql = _sql(conn, '''
-                SELECT s.id, s.名称, s.slug
-                FROM "T_店舗" s
-                INNER JOIN "T_管理者_店舗" ams ON s.id = ams.store_id
-                WHERE ams.admin_id = %s AND s.tenant_id = %s AND s.有効 = 1
-                ORDER BY s.名称
+                SELECT store_id FROM "T_管理者_店舗" WHERE admin_id = %s
             ''')
         
-        cur.execute(sql, (user_id, tenant_id))
+        cur.execute(sql, (user_id,))
+        current = directory.get()
         stores = []
-        for row in cur.fetchall():
-            stores.append({
-                'id': row[0],
-                '名称': row[1],
-                'slug': row[2]
-            })
+        for (sid,) in cur.fetchall():
+            store = current.store(sid)
+            if store and store['active'] and store['tenant_id'] == int(tenant_id):
+                stores.append({
+                    'id': store['id'],
+                    '名称': store['name'],
+                    'slug': store['slug']
+                })
+        stores.sort(key=lambda s: s['名称'])
         
         return render_template('select_store.html', stores=stores)
     finally:
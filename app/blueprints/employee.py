@@ -4,8 +4,9 @@
 """
 
 from flask import Blueprint, render_template, session, redirect, url_for, flash, request
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
 from app.db import SessionLocal
+from app.services.login import hash_password
 from app.models_login import TJugyoin, TTenant, TTenpo, TJugyoinTenpo
 from sqlalchemy import func, and_, or_
 from ..utils.decorators import ROLES
@@ -119,7 +120,7 @@ def mypage():
                     return render_template('employee_mypage.html', user=user, tenant_name=tenant_name, stores=stores, store_list=store_list)
                 
                 # パスワード更新
-                employee.password_hash = generate_password_hash(new_password)
+                employee.password_hash = hash_password(new_password)
                 db.commit()
                 
                 flash('パスワードを変更しました', 'success')
@@ -13,3 +13,56 @@ def healthz():
         env=current_app.config.get("ENVIRONMENT"),
         version=current_app.config.get("VERSION"),
     )
+
+
+@bp.get("/metrics")
+def metrics():
+    """
+    Prometheus 形式のメトリクスを返します。
+    環境変数 METRICS_TOKEN のトークンを Authorization: Bearer <トークン> で送る必要があります。
+    METRICS_TOKEN が未設定の場合は 404 を返します
+    （ローカルで確認するときは METRICS_PUBLIC=1 でトークンなしでも返します）。
+    """
+    import hmac
+    import os
+    from flask import Response, abort, request
+    from app import metrics as app_metrics
+
+    token = os.environ.get("METRICS_TOKEN")
+    if token:
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        # str のままだと ASCII 以外の文字で TypeError になるため、バイト列で比べる
+        # （WSGI のヘッダーは受け取ったバイト列を latin-1 で読んだ文字列なので、latin-1 で戻す）
+        if not hmac.compare_digest(supplied.encode("latin-1", "replace"), token.encode("utf-8")):
+            abort(401)
+    elif os.environ.get("METRICS_PUBLIC") not in ("1", "true", "True"):
+        abort(404)
+
+    rendered = app_metrics.render_latest()
+    if rendered is None:
+        return Response("prometheus_client がインストールされていません\n", status=503,
+                        mimetype="text/plain")
+    body, content_type = rendered
+    return Response(body, content_type=content_type)
+
+
+@bp.get("/livez")
+def livez():
+    """
+    プロセスが応答できるかだけを返します（依存先は確認しません）。
+    失敗したらプロセスの再起動が必要です。
+    """
+    return jsonify(ok=True)
+
+
+@bp.get("/readyz")
+def readyz():
+    """
+    DB・フォント・雛形PDF・PDFプレビュー用ラスタライザーを確認し、
+    トラフィックを受けられる状態なら 200、そうでなければ 503 を返します。
+    結果は数秒間キャッシュされます。
+    """
+    from app.services.readiness import readiness
+
+    ok, checks, cached = readiness()
+    return jsonify(ok=ok, checks=checks, cached=cached), (200 if ok else 503)
@@ -4,15 +4,16 @@
 """
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, send_file
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
 from app.db import SessionLocal
+from app.services.login import hash_password
 from app.models_login import TKanrisha, TJugyoin, TTenant, TTenpo, TKanrishaTenpo, TJugyoinTenpo, TTenantAppSetting, TTenpoAppSetting, TTenantAdminTenant
 from sqlalchemy import func, and_, or_
 from ..utils.decorators import ROLES
 from ..utils.decorators import require_roles
 from ..blueprints.tenant_admin import AVAILABLE_APPS
+from app.services import app_settings, directory
 import os
-import markdown
 
 bp = Blueprint('system_admin', __name__, url_prefix='/system_admin')
 
@@ -50,6 +51,16 @@ def dashboard():
     return render_template('system_admin_dashboard.html')
 
 
+def _render_mypage(user):
+    """マイページを表示する（テナント・店舗の選択肢はディレクトリから取得）"""
+    current = directory.get()
+    return render_template(
+        'sys_mypage.html', user=user,
+        tenant_list=current.tenants(),
+        store_list=current.stores(),
+    )
+
+
 @bp.route('/mypage', methods=['GET', 'POST'])
 @require_roles(ROLES["SYSTEM_ADMIN"])
 def mypage():
@@ -93,18 +104,7 @@ def mypage():
                 
                 if not login_id or not name:
                     flash('ログインIDと氏名は必須です', 'error')
-                    # テナント・店舗リストを取得
-                    tenant_list = [{'id': t.id, 'name': t.名称} for t in db.query(TTenant).filter(TTenant.有効 == 1).order_by(TTenant.id).all()]
-                    store_list = []
-                    for s in db.query(TTenpo).filter(TTenpo.有効 == 1).order_by(TTenpo.tenant_id, TTenpo.id).all():
-                        tenant = db.query(TTenant).filter(TTenant.id == s.tenant_id).first()
-                        store_list.append({
-                            'id': s.id,
-                            'name': s.名称,
-                            'tenant_id': s.tenant_id,
-                            'tenant_name': tenant.名称 if tenant else ''
-                        })
-                    return render_template('sys_mypage.html', user=user, tenant_list=tenant_list, store_list=store_list)
+                    return _render_mypage(user)
                 
                 # ログインID重複チェック（自分以外）
                 existing = db.query(TKanrisha).filter(
@@ -113,18 +113,7 @@ def mypage():
                 
                 if existing:
                     flash('このログインIDは既に使用されています', 'error')
-                    # テナント・店舗リストを取得
-                    tenant_list = [{'id': t.id, 'name': t.名称} for t in db.query(TTenant).filter(TTenant.有効 == 1).order_by(TTenant.id).all()]
-                    store_list = []
-                    for s in db.query(TTenpo).filter(TTenpo.有効 == 1).order_by(TTenpo.tenant_id, TTenpo.id).all():
-                        tenant = db.query(TTenant).filter(TTenant.id == s.tenant_id).first()
-                        store_list.append({
-                            'id': s.id,
-                            'name': s.名称,
-                            'tenant_id': s.tenant_id,
-                            'tenant_name': tenant.名称 if tenant else ''
-                        })
-                    return render_template('sys_mypage.html', user=user, tenant_list=tenant_list, store_list=store_list)
+                    return _render_mypage(user)
                 
                 # プロフィール更新
                 admin.login_id = login_id
@@ -145,54 +134,21 @@ def mypage():
                 
                 if new_password != new_password_confirm:
                     flash('パスワードが一致しません', 'error')
-                    # テナント・店舗リストを取得
-                    tenant_list = [{'id': t.id, 'name': t.名称} for t in db.query(TTenant).filter(TTenant.有効 == 1).order_by(TTenant.id).all()]
-                    store_list = []
-                    for s in db.query(TTenpo).filter(TTenpo.有効 == 1).order_by(TTenpo.tenant_id, TTenpo.id).all():
-                        tenant = db.query(TTenant).filter(TTenant.id == s.tenant_id).first()
-                        store_list.append({
-                            'id': s.id,
-                            'name': s.名称,
-                            'tenant_id': s.tenant_id,
-                            'tenant_name': tenant.名称 if tenant else ''
-                        })
-                    return render_template('sys_mypage.html', user=user, tenant_list=tenant_list, store_list=store_list)
+                    return _render_mypage(user)
                 
                 # 現在のパスワードを確認
                 if not check_password_hash(admin.password_hash, current_password):
                     flash('現在のパスワードが正しくありません', 'error')
-                    # テナント・店舗リストを取得
-                    tenant_list = [{'id': t.id, 'name': t.名称} for t in db.query(TTenant).filter(TTenant.有効 == 1).order_by(TTenant.id).all()]
-                    store_list = []
-                    for s in db.query(TTenpo).filter(TTenpo.有効 == 1).order_by(TTenpo.tenant_id, TTenpo.id).all():
-                        tenant = db.query(TTenant).filter(TTenant.id == s.tenant_id).first()
-                        store_list.append({
-                            'id': s.id,
-                            'name': s.名称,
-                            'tenant_id': s.tenant_id,
-                            'tenant_name': tenant.名称 if tenant else ''
-                        })
-                    return render_template('sys_mypage.html', user=user, tenant_list=tenant_list, store_list=store_list)
+                    return _render_mypage(user)
                 
                 # パスワード更新
-                admin.password_hash = generate_password_hash(new_password)
+                admin.password_hash = hash_password(new_password)
                 db.commit()
                 
                 flash('パスワードを変更しました', 'success')
                 return redirect(url_for('system_admin.mypage'))
         
-        # GETリクエスト - テナント・店舗リストを取得
-        tenant_list = [{'id': t.id, 'name': t.名称} for t in db.query(TTenant).filter(TTenant.有効 == 1).order_by(TTenant.id).all()]
-        store_list = []
-        for s in db.query(TTenpo).filter(TTenpo.有効 == 1).order_by(TTenpo.tenant_id, TTenpo.id).all():
-            tenant = db.query(TTenant).filter(TTenant.id == s.tenant_id).first()
-            store_list.append({
-                'id': s.id,
-                'name': s.名称,
-                'tenant_id': s.tenant_id,
-                'tenant_name': tenant.名称 if tenant else ''
-            })
-        return render_template('sys_mypage.html', user=user, tenant_list=tenant_list, store_list=store_list)
+        return _render_mypage(user)
     
     finally:
         db.close()
@@ -269,6 +225,7 @@ def doc_view(filename):
         return redirect(url_for('system_admin.docs'))
     
     # Markdownファイルを読み込んでHTMLに変換
+    import markdown
     with open(doc_path, 'r', encoding='utf-8') as f:
         md_content = f.read()
     
@@ -306,6 +263,70 @@ def doc_download(filename):
     return send_file(doc_path, as_attachment=True, download_name=filename)
 
 
+@bp.route('/profiles')
+@require_roles(ROLES["SYSTEM_ADMIN"])
+def profiles():
+    """保存済みのリクエストプロファイル一覧"""
+    from app import profiling
+
+    return render_template('sys_profiles.html', profiles=profiling.list_profiles(),
+                           slow_ms=profiling.PROFILE_SLOW_MS)
+
+
+@bp.route('/profiles/<profile_id>/<kind>')
+@require_roles(ROLES["SYSTEM_ADMIN"])
+def profile_download(profile_id, kind):
+    """プロファイルのダウンロード（folded: flamegraph 用 ／ prof: cProfile の pstats）"""
+    from app import profiling
+
+    path = profiling.profile_path(profile_id, kind)
+    if not path:
+        flash('プロファイルが見つかりません', 'error')
+        return redirect(url_for('system_admin.profiles'))
+    return send_file(os.path.abspath(path), mimetype=profiling.KINDS[kind][1],
+                     as_attachment=True, download_name=os.path.basename(path))
+
+
+@bp.route('/analytics')
+@require_roles(ROLES["SYSTEM_ADMIN"])
+def analytics():
+    """テナント横断の利用状況（集計テーブルだけを読む）"""
+    from app.services import rollups
+
+    days = min(max(request.args.get('days', 30, type=int), 1), 366)
+    tenant_id = request.args.get('tenant_id', type=int)
+
+    current = directory.get()
+    by_tenant = rollups.documents_by_tenant()
+    window = rollups.window_totals_by_tenant(days)
+    tenant_rows = []
+    for tid in sorted(set(by_tenant) | set(window)):
+        entry = current.tenant(tid)
+        counts = by_tenant.get(tid, {'draft': 0, 'completed': 0})
+        recent = window.get(tid, {})
+        tenant_rows.append({
+            'id': tid,
+            'name': entry['name'] if entry else ('（テナント未選択）' if tid == 0 else f'（削除済み #{tid}）'),
+            'draft': counts['draft'],
+            'completed': counts['completed'],
+            'downloads': recent.get('pdf_downloads', 0) + recent.get('zip_downloads', 0),
+        })
+    tenant_rows.sort(key=lambda r: -(r['draft'] + r['completed']))
+
+    series = rollups.daily_totals(days, tenant_id=tenant_id)
+    peak = max((d['documents_created'] + d['pdf_downloads'] + d['zip_downloads'] for d in series), default=0)
+    return render_template(
+        'sys_analytics.html',
+        days=days,
+        tenant_id=tenant_id,
+        tenant_name=(current.tenant(tenant_id) or {}).get('name') if tenant_id is not None else None,
+        tenant_rows=tenant_rows,
+        mix=rollups.company_type_mix(tenant_id),
+        series=series,
+        peak=peak or 1,
+    )
+
+
 # ========================================
 # テナント管理
 # ========================================
@@ -512,43 +533,28 @@ def tenant_delete(tid):
             flash('テナントが見つかりません', 'error')
             return redirect(url_for('system_admin.tenants'))
         
-        # トランザクション開始
+        # 削除はバッチごとの短いトランザクションで行うため、ここでセッションを閉じておく
+        from app.services import cascade_delete
+
+        mode = request.form.get('mode', '')
+        background = request.form.get('background') == '1'
+        tenant_name = tenant_obj.名称
+        db.close()
+
+        if mode == 'dry_run':
+            counts = [f'{label} {n}件' for label, n in cascade_delete.dry_run(cascade_delete.SCOPE_TENANT, tid) if n]
+            flash(f'テナント「{tenant_name}」を削除すると次のデータが削除されます: ' + '、'.join(counts), 'success')
+            return redirect(url_for('system_admin.tenants'))
+
+        if background:
+            job_id = cascade_delete.start_job(cascade_delete.SCOPE_TENANT, tid)
+            flash(f'テナント「{tenant_name}」の削除をバックグラウンドで開始しました', 'success')
+            return redirect(url_for('system_admin.delete_job', job_id=job_id))
+
         try:
-            # 1. テナントに紐づく店舗を取得
-            stores = db.query(TTenpo).filter(TTenpo.tenant_id == tid).all()
-            store_ids = [store.id for store in stores]
-            
-            # 2. 店舗に紐づく中間テーブルを削除
-            if store_ids:
-                db.query(TKanrishaTenpo).filter(TKanrishaTenpo.store_id.in_(store_ids)).delete(synchronize_session=False)
-                db.query(TJugyoinTenpo).filter(TJugyoinTenpo.store_id.in_(store_ids)).delete(synchronize_session=False)
-                db.query(TTenpoAppSetting).filter(TTenpoAppSetting.store_id.in_(store_ids)).delete(synchronize_session=False)
-            
-            # 3. 店舗を削除
-            db.query(TTenpo).filter(TTenpo.tenant_id == tid).delete(synchronize_session=False)
-            
-            # 4. テナント管理者の中間テーブルを削除
-            db.query(TTenantAdminTenant).filter(TTenantAdminTenant.tenant_id == tid).delete(synchronize_session=False)
-            
-            # 5. テナントに紐づく管理者を削除（テナント管理者のみ）
-            db.query(TKanrisha).filter(
-                and_(TKanrisha.tenant_id == tid, TKanrisha.role == ROLES["TENANT_ADMIN"])
-            ).delete(synchronize_session=False)
-            
-            # 6. テナントに紐づく従業員を削除
-            db.query(TJugyoin).filter(TJugyoin.tenant_id == tid).delete(synchronize_session=False)
-            
-            # 7. テナントアプリ設定を削除
-            db.query(TTenantAppSetting).filter(TTenantAppSetting.tenant_id == tid).delete(synchronize_session=False)
-            
-            # 8. テナントを削除
-            db.delete(tenant_obj)
-            
-            # コミット
-            db.commit()
+            cascade_delete.run(cascade_delete.SCOPE_TENANT, tid)
             flash('テナントと関連データを削除しました', 'success')
         except Exception as e:
-            db.rollback()
             flash(f'テナント削除中にエラーが発生しました: {str(e)}', 'error')
         
         return redirect(url_for('system_admin.tenants'))
@@ -556,6 +562,19 @@ def tenant_delete(tid):
         db.close()
 
 
+@bp.route('/delete_jobs/<job_id>')
+@require_roles(ROLES["SYSTEM_ADMIN"])
+def delete_job(job_id):
+    """バックグラウンド削除ジョブの進捗"""
+    from app.services.cascade_delete import get_job
+
+    job = get_job(job_id)
+    if not job:
+        flash('削除ジョブが見つかりません', 'error')
+        return redirect(url_for('system_admin.tenants'))
+    return render_template('sys_delete_job.html', job=job)
+
+
 # ========================================
 # テナント管理者管理
 # ========================================
@@ -698,7 +717,7 @@ def tenant_admin_new(tid):
             is_first_admin = (existing_admin_count == 0)
             
             # テナント管理者作成
-            hashed_password = generate_password_hash(password)
+            hashed_password = hash_password(password)
             new_admin = TKanrisha(
                 login_id=login_id,
                 name=name,
@@ -905,7 +924,7 @@ def tenant_admin_edit(tid, admin_id):
                                 login_id=login_id,
                                 name=name,
                                 email=email,
-                                password_hash=admin.password_hash if not password else generate_password_hash(password),
+                                password_hash=admin.password_hash if not password else hash_password(password),
                                 role=ROLES["EMPLOYEE"],
                                 tenant_id=tid,
                                 active=active
@@ -928,7 +947,7 @@ def tenant_admin_edit(tid, admin_id):
                             admin.active = active
                             admin.can_manage_admins = can_manage
                             if password:
-                                admin.password_hash = generate_password_hash(password)
+                                admin.password_hash = hash_password(password)
                         
                         # テナント選択を保存
                         tenant_ids = request.form.getlist('tenant_ids')
@@ -1301,7 +1320,7 @@ def system_admin_new():
             is_first_admin = (existing_admin_count == 0)
             
             # システム管理者作成
-            hashed_password = generate_password_hash(password)
+            hashed_password = hash_password(password)
             new_admin = TKanrisha(
                 login_id=login_id,
                 name=name,
@@ -1395,7 +1414,7 @@ def system_admin_edit(admin_id):
                         if admin.is_owner != 1:
                             admin.can_manage_admins = can_manage
                         if password:
-                            admin.password_hash = generate_password_hash(password)
+                            admin.password_hash = hash_password(password)
                         db.commit()
                         flash('システム管理者を更新しました', 'success')
                         return redirect(url_for('system_admin.system_admins'))
@@ -1583,72 +1602,55 @@ def app_management():
 @require_roles(ROLES["SYSTEM_ADMIN"])
 def select_tenant_from_mypage():
     """マイページからテナントを選択してテナント管理者ダッシュボードへ"""
-    tenant_id = request.form.get('tenant_id')
+    tenant_id = request.form.get('tenant_id', type=int)
     
     if not tenant_id:
         flash('テナントを選択してください', 'error')
         return redirect(url_for('system_admin.mypage'))
     
     # テナントが存在するか確認
-    db = SessionLocal()
-    try:
-        tenant = db.query(TTenant).filter(
-            and_(TTenant.id == tenant_id, TTenant.有効 == 1)
-        ).first()
-        
-        if not tenant:
-            flash('選択したテナントが見つかりません', 'error')
-            return redirect(url_for('system_admin.mypage'))
-        
-        # セッションにテナント情報を保存
-        session['tenant_id'] = tenant.id
-        session['store_id'] = None  # 店舗選択をクリア
-        
-        flash(f'テナント「{tenant.名称}」を選択しました', 'success')
-        
-        # テナント管理者ダッシュボードへリダイレクト
-        return redirect('/tenant_admin/')
-    finally:
-        db.close()
+    tenant = directory.get().tenant(tenant_id)
+    if not tenant or not tenant['active']:
+        flash('選択したテナントが見つかりません', 'error')
+        return redirect(url_for('system_admin.mypage'))
+    
+    # セッションにテナント情報を保存
+    session['tenant_id'] = tenant['id']
+    session['store_id'] = None  # 店舗選択をクリア
+    
+    flash(f'テナント「{tenant["name"]}」を選択しました', 'success')
+    
+    # テナント管理者ダッシュボードへリダイレクト
+    return redirect('/tenant_admin/')
 
 
 @bp.route('/select_store_from_mypage', methods=['POST'])
 @require_roles(ROLES["SYSTEM_ADMIN"])
 def select_store_from_mypage():
     """マイページから店舗を選択して店舗管理者ダッシュボードへ"""
-    store_id = request.form.get('store_id')
+    store_id = request.form.get('store_id', type=int)
     
     if not store_id:
         flash('店舗を選択してください', 'error')
         return redirect(url_for('system_admin.mypage'))
     
-    # 店舗が存在するか確認
-    db = SessionLocal()
-    try:
-        store = db.query(TTenpo).filter(
-            and_(TTenpo.id == store_id, TTenpo.有効 == 1)
-        ).first()
-        
-        if not store:
-            flash('選択した店舗が見つかりません', 'error')
-            return redirect(url_for('system_admin.mypage'))
-        
-        # テナント名も取得
-        tenant = db.query(TTenant).filter(TTenant.id == store.tenant_id).first()
-        
-        # セッションに店舗情報とテナント情報を保存
-        session['store_id'] = store.id
-        session['tenant_id'] = store.tenant_id
-        
-        if tenant:
-            flash(f'店舗「{store.名称}」（テナント: {tenant.名称}）を選択しました', 'success')
-        else:
-            flash(f'店舗「{store.名称}」を選択しました', 'success')
-        
-        # 店舗管理者ダッシュボードへリダイレクト
-        return redirect('/admin/')
-    finally:
-        db.close()
+    # 店舗が存在するか確認（テナント名もディレクトリから取得）
+    store = directory.get().store(store_id)
+    if not store or not store['active']:
+        flash('選択した店舗が見つかりません', 'error')
+        return redirect(url_for('system_admin.mypage'))
+    
+    # セッションに店舗情報とテナント情報を保存
+    session['store_id'] = store['id']
+    session['tenant_id'] = store['tenant_id']
+    
+    if store['tenant_name']:
+        flash(f'店舗「{store["name"]}」（テナント: {store["tenant_name"]}）を選択しました', 'success')
+    else:
+        flash(f'店舗「{store["name"]}」を選択しました', 'success')
+    
+    # 店舗管理者ダッシュボードへリダイレクト
+    return redirect('/admin/')
 
 
 # ========================================
@@ -1677,22 +1679,7 @@ def tenant_apps(tid):
         }
         
         # テナントレベルで有効なアプリを取得
-        enabled_apps = []
-        
-        for app in AVAILABLE_APPS:
-            if app['scope'] == 'tenant':
-                app_setting = db.query(TTenantAppSetting).filter(
-                    and_(
-                        TTenantAppSetting.tenant_id == tid,
-                        TTenantAppSetting.app_name == app['name']
-                    )
-                ).first()
-                enabled = app_setting.enabled if app_setting else 1
-                
-                if enabled:
-                    enabled_apps.append(app)
-        
-        apps = enabled_apps
+        apps = app_settings.enabled_apps(app_settings.SCOPE_TENANT, tid, AVAILABLE_APPS)
         
         return render_template('sys_tenant_apps.html', tenant=tenant_data, apps=apps)
     finally:
@@ -1978,22 +1965,7 @@ def store_apps(tid, sid):
         }
         
         # 店舗レベルで有効なアプリを取得
-        enabled_apps = []
-        
-        for app in AVAILABLE_APPS:
-            if app['scope'] == 'store':
-                app_setting = db.query(TTenpoAppSetting).filter(
-                    and_(
-                        TTenpoAppSetting.store_id == sid,
-                        TTenpoAppSetting.app_name == app['name']
-                    )
-                ).first()
-                enabled = app_setting.enabled if app_setting else 1
-                
-                if enabled:
-                    enabled_apps.append(app)
-        
-        apps = enabled_apps
+        apps = app_settings.enabled_apps(app_settings.SCOPE_STORE, sid, AVAILABLE_APPS)
         
         return render_template('sys_store_apps.html', tenant=tenant_data, store=store_data, apps=apps, tid=tid, sid=sid)
     finally:
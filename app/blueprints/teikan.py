@@ -7,16 +7,35 @@ import io
 import json
 from flask import (
     Blueprint, render_template, request, redirect, url_for,
-    flash, session, send_file
+    flash, session, send_file, make_response
 )
 from app.utils import require_roles, ROLES
 # from app.utils.inkan_pdf import generate_inkan_pdf  # LibreOffice UNO版（スラグサイズ超過のため無効化）
 from app.db import SessionLocal
 from app.models_login import TeikanDocument
+from app.instrumentation import traced
+from app import admission, http_cache, metrics
+from app.services import revisions, rollups, teikan_document
 
 bp = Blueprint('teikan', __name__, url_prefix='/apps/teikan')
 
 
+@bp.after_request
+def _count_download(response):
+    """PDF・ZIP のダウンロード（添付ファイルとして返したもの）を日次集計に数える"""
+    if response.mimetype in ('application/pdf', 'application/zip'):
+        http_cache.mark_private(response)
+    if (response.status_code == 200
+            and response.mimetype in ('application/pdf', 'application/zip')
+            and 'attachment' in response.headers.get('Content-Disposition', '')):
+        try:
+            rollups.count_download(session.get('tenant_id'),
+                                   'zip' if response.mimetype == 'application/zip' else 'pdf')
+        except Exception as e:
+            print(f"⚠️ ダウンロード集計エラー: {e}")
+    return response
+
+
 def get_session_data():
     """セッションから定款データを取得する"""
     return session.get('teikan_data', {})
@@ -50,10 +69,14 @@ def autosave_draft(data):
                 TeikanDocument.tenant_id == tenant_id
             ).first()
             if doc and doc.status == 'draft':
+                rollups.document_changed(db, tenant_id, (doc.company_type, doc.status), (company_type, 'draft'))
+                revisions.record(db, doc.id, tenant_id, data, 'draft', created_by=user_id,
+                                 previous=json.loads(doc.data_json) if doc.data_json else None)
                 doc.company_name = company_name
                 doc.company_type = company_type
                 doc.data_json = data_json
                 db.commit()
+                metrics.count_autosave()
                 return  # 更新成功
 
         # 新規下書き作成
@@ -66,7 +89,11 @@ def autosave_draft(data):
             data_json=data_json
         )
         db.add(doc)
+        rollups.document_changed(db, tenant_id, None, (company_type, 'draft'))
+        db.flush()
+        revisions.record(db, doc.id, tenant_id, data, 'draft', created_by=user_id)
         db.commit()
+        metrics.count_autosave()
         db.refresh(doc)
         session['teikan_draft_id'] = doc.id  # 下書きIDをセッションに保存
         session.modified = True
@@ -193,7 +220,8 @@ def step3():
         autosave_draft(data)
         return redirect(url_for('teikan.confirm'))
 
-    return render_template('teikan/step3.html', data=data)
+    from app.services.purpose_index import load_bundled_phrases
+    return render_template('teikan/step3.html', data=data, industry_suggestions=load_bundled_phrases())
 
 
 @bp.route('/step4', methods=['GET', 'POST'])
@@ -231,7 +259,7 @@ def preview():
     if not data.get('company_name'):
         flash('最初から入力してください', 'warning')
         return redirect(url_for('teikan.step1'))
-    return render_template('teikan/preview.html', data=data)
+    return render_template('teikan/preview.html', data=data, document_html=teikan_document.html(data))
 
 
 @bp.route('/download_pdf')
@@ -244,7 +272,8 @@ def download_pdf():
         return redirect(url_for('teikan.step1'))
 
     try:
-        pdf_bytes = generate_teikan_pdf(data)
+        with admission.rendering():
+            pdf_bytes = generate_teikan_pdf(data)
         company_name = data.get('company_name', '定款')
         filename = f"{company_name}_定款.pdf"
 
@@ -254,6 +283,8 @@ def download_pdf():
             as_attachment=True,
             download_name=filename
         )
+    except admission.Rejected as rejected:
+        return admission.too_many_requests(rejected)
     except Exception as e:
         flash(f'PDF生成エラー: {str(e)}', 'error')
         return redirect(url_for('teikan.preview'))
@@ -267,6 +298,24 @@ def reset():
     return redirect(url_for('teikan.step1'))
 
 
+def _index_purposes(doc_id, data):
+    """完成保存した定款の事業目的を入力候補インデックスに反映する"""
+    from app.services import purpose_index
+    try:
+        purpose_index.add_document(doc_id, data.get('purposes', []))
+    except Exception as e:
+        print(f"⚠️ 事業目的インデックス反映エラー: {e}")
+
+
+def _unindex_purposes(doc_id):
+    """削除した定款の事業目的を入力候補インデックスから外す"""
+    from app.services import purpose_index
+    try:
+        purpose_index.remove_document(doc_id)
+    except Exception as e:
+        print(f"⚠️ 事業目的インデックス反映エラー: {e}")
+
+
 @bp.route('/save', methods=['POST'])
 @require_roles(ROLES["TENANT_ADMIN"], ROLES["SYSTEM_ADMIN"])
 def save():
@@ -295,11 +344,16 @@ def save():
                 TeikanDocument.tenant_id == tenant_id
             ).first()
             if doc:
+                rollups.document_changed(db, tenant_id, (doc.company_type, doc.status), (company_type, 'completed'))
+                revisions.record(db, doc.id, tenant_id, data, 'completed', created_by=user_id,
+                                 previous=json.loads(doc.data_json) if doc.data_json else None)
                 doc.company_name = company_name
                 doc.company_type = company_type
                 doc.status = 'completed'
                 doc.data_json = data_json
                 db.commit()
+                metrics.count_completed()
+                _index_purposes(doc.id, data)
                 flash(f'「{company_type}{company_name}」の定款を保存しました', 'success')
                 session.pop('teikan_data', None)
                 session.pop('teikan_draft_id', None)
@@ -315,8 +369,13 @@ def save():
             data_json=data_json
         )
         db.add(doc)
+        rollups.document_changed(db, tenant_id, None, (company_type, 'completed'))
+        db.flush()
+        revisions.record(db, doc.id, tenant_id, data, 'completed', created_by=user_id)
         db.commit()
         db.refresh(doc)
+        metrics.count_completed()
+        _index_purposes(doc.id, data)
         flash(f'「{doc.company_type}{doc.company_name}」の定款を保存しました', 'success')
         session.pop('teikan_data', None)
         session.pop('teikan_draft_id', None)
@@ -369,13 +428,51 @@ def history():
         db.close()
 
 
+def _document_validators(db, doc_id, tenant_id):
+    """
+    定款の検証子（ETag と Last-Modified の元）だけを取り出す（data_json は読まない）
+
+    内容のハッシュは最新の版（T_定款履歴）のものを使う。同じ秒のうちに2回保存されても ETag が変わる。
+    Returns:
+        (ETag の元になる値のタプル, 更新日時) または None（定款が無い）
+    """
+    from sqlalchemy import select
+    from app.models_login import TeikanRevision
+
+    latest_hash = (
+        select(TeikanRevision.data_hash)
+        .where(TeikanRevision.document_id == TeikanDocument.id)
+        .order_by(TeikanRevision.revision.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    row = db.execute(
+        select(TeikanDocument.updated_at, TeikanDocument.created_at, TeikanDocument.status, latest_hash)
+        .where(TeikanDocument.id == doc_id, TeikanDocument.tenant_id == tenant_id)
+    ).first()
+    if row is None:
+        return None
+    updated_at, created_at, status, digest = row
+    modified = updated_at or created_at
+    return (doc_id, modified.isoformat() if modified else '', status, digest or ''), modified
+
+
 @bp.route('/history/<int:doc_id>')
 @require_roles(ROLES["TENANT_ADMIN"], ROLES["SYSTEM_ADMIN"])
 def history_detail(doc_id):
-    """保存済み定款の詳細プレビュー"""
+    """保存済み定款の詳細プレビュー（変わっていなければ 304 を返す）"""
     tenant_id = session.get('tenant_id')
     db = SessionLocal()
     try:
+        validators = _document_validators(db, doc_id, tenant_id)
+        if not validators:
+            flash('定款が見つかりません', 'error')
+            return redirect(url_for('teikan.history'))
+        etag = http_cache.make_etag('detail', *validators[0])
+        cached = http_cache.not_modified(etag, validators[1])
+        if cached is not None:
+            return cached
+
         doc = db.query(TeikanDocument).filter(
             TeikanDocument.id == doc_id,
             TeikanDocument.tenant_id == tenant_id
@@ -384,7 +481,9 @@ def history_detail(doc_id):
             flash('定款が見つかりません', 'error')
             return redirect(url_for('teikan.history'))
         data = json.loads(doc.data_json)
-        return render_template('teikan/preview.html', data=data, doc=doc, readonly=True)
+        response = make_response(render_template('teikan/preview.html', data=data, doc=doc, readonly=True,
+                                                  document_html=teikan_document.html(data)))
+        return http_cache.set_validators(response, etag, validators[1])
     finally:
         db.close()
 
@@ -392,10 +491,16 @@ def history_detail(doc_id):
 @bp.route('/history/<int:doc_id>/download')
 @require_roles(ROLES["TENANT_ADMIN"], ROLES["SYSTEM_ADMIN"])
 def history_download(doc_id):
-    """保存済み定款のPDFダウンロード"""
+    """保存済み定款のPDFダウンロード（変わっていなければ PDF を作らずに 304 を返す）"""
     tenant_id = session.get('tenant_id')
     db = SessionLocal()
     try:
+        validators = _document_validators(db, doc_id, tenant_id)
+        if validators:
+            etag = http_cache.make_etag('pdf', *validators[0])
+            cached = http_cache.not_modified(etag, validators[1])
+            if cached is not None:
+                return cached
         doc = db.query(TeikanDocument).filter(
             TeikanDocument.id == doc_id,
             TeikanDocument.tenant_id == tenant_id
@@ -404,14 +509,18 @@ def history_download(doc_id):
             flash('定款が見つかりません', 'error')
             return redirect(url_for('teikan.history'))
         data = json.loads(doc.data_json)
-        pdf_bytes = generate_teikan_pdf(data)
+        with admission.rendering():
+            pdf_bytes = generate_teikan_pdf(data)
         filename = f"{doc.company_type}{doc.company_name}_定款.pdf"
-        return send_file(
+        response = send_file(
             io.BytesIO(pdf_bytes),
             mimetype='application/pdf',
             as_attachment=True,
             download_name=filename
         )
+        return http_cache.set_validators(response, etag, validators[1])
+    except admission.Rejected as rejected:
+        return admission.too_many_requests(rejected)
     except Exception as e:
         flash(f'PDF生成エラー: {str(e)}', 'error')
         return redirect(url_for('teikan.history'))
@@ -434,8 +543,11 @@ def history_delete(doc_id):
             flash('定款が見つかりません', 'error')
             return redirect(url_for('teikan.history'))
         name = f"{doc.company_type}{doc.company_name}"
+        rollups.document_changed(db, tenant_id, (doc.company_type, doc.status), None)
+        revisions.forget(db, doc.id)
         db.delete(doc)
         db.commit()
+        _unindex_purposes(doc_id)
         flash(f'「{name}」の定款を削除しました', 'success')
         return redirect(url_for('teikan.history'))
     except Exception as e:
@@ -446,6 +558,44 @@ def history_delete(doc_id):
         db.close()
 
 
+@bp.route('/history/<int:doc_id>/revisions')
+@require_roles(ROLES["TENANT_ADMIN"], ROLES["SYSTEM_ADMIN"])
+def history_revisions(doc_id):
+    """定款の版の一覧と、2つの版の差分（?a=古い版&b=新しい版）"""
+    tenant_id = session.get('tenant_id')
+    items = [r for r in revisions.list_revisions(doc_id) if r['tenant_id'] == tenant_id]
+    if not items:
+        flash('この定款の履歴はありません', 'warning')
+        return redirect(url_for('teikan.history'))
+
+    db = SessionLocal()
+    try:
+        doc = db.query(TeikanDocument).filter(
+            TeikanDocument.id == doc_id,
+            TeikanDocument.tenant_id == tenant_id
+        ).first()
+    finally:
+        db.close()
+
+    numbers = [r['revision'] for r in items]
+    b = request.args.get('b', type=int)
+    a = request.args.get('a', type=int)
+    changes = None
+    if b is not None and b in numbers:
+        if a is None:
+            # 指定が無ければ1つ前の版と比べる
+            older = [n for n in numbers if n < b]
+            a = older[0] if older else None
+        if a is None or a in numbers:
+            old_data = revisions.load(doc_id, a) if a is not None else {}
+            changes = revisions.diff(old_data, revisions.load(doc_id, b))
+    else:
+        a = b = None
+
+    return render_template('teikan/revisions.html', doc=doc, doc_id=doc_id, items=items,
+                           a=a, b=b, changes=changes)
+
+
 @bp.route('/history/<int:doc_id>/edit')
 @require_roles(ROLES["TENANT_ADMIN"], ROLES["SYSTEM_ADMIN"])
 def history_edit(doc_id):
@@ -470,6 +620,84 @@ def history_edit(doc_id):
         db.close()
 
 
+@bp.route('/history/export')
+@require_roles(ROLES["TENANT_ADMIN"], ROLES["SYSTEM_ADMIN"])
+def history_export():
+    """テナントの保存済み定款をNDJSON（gzip）で一括エクスポート"""
+    from datetime import datetime
+    from flask import Response
+    from app.services.teikan_archive import iter_export_gzip
+
+    tenant_id = session.get('tenant_id')
+    filename = f"teikan_archive_tenant{tenant_id or 0}_{datetime.now():%Y%m%d%H%M%S}.ndjson.gz"
+    return Response(
+        iter_export_gzip(tenant_id),
+        mimetype='application/gzip',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+
+@bp.route('/history/import', methods=['POST'])
+@require_roles(ROLES["TENANT_ADMIN"], ROLES["SYSTEM_ADMIN"])
+def history_import():
+    """NDJSON（gzip可）のアーカイブからテナントの定款を一括インポート"""
+    from app.services.teikan_archive import import_archive
+
+    tenant_id = session.get('tenant_id')
+    user_id = session.get('user_id')
+    archive = request.files.get('archive')
+    if not archive or not archive.filename:
+        flash('インポートするファイルを選択してください', 'warning')
+        return redirect(url_for('teikan.history'))
+    try:
+        stats = import_archive(archive.stream, tenant_id, created_by=user_id)
+        flash(
+            f"インポートしました（新規 {stats['inserted']}件 / 更新 {stats['updated']}件 / スキップ {stats['skipped']}件）",
+            'success'
+        )
+    except Exception as e:
+        flash(f'インポートエラー: {str(e)}', 'error')
+    return redirect(url_for('teikan.history'))
+
+
+
+@bp.route('/api/postal')
+@require_roles(ROLES["TENANT_ADMIN"], ROLES["SYSTEM_ADMIN"])
+def postal_lookup():
+    """
+    郵便番号から住所を返す（ローカル索引を使用）
+    7桁なら完全一致、3〜6桁なら前方一致の候補を返す
+    索引が作成されていない場合、7桁は zipcloud に問い合わせ、前方一致の候補は返さない
+    """
+    from flask import jsonify
+    from app.services import postal_index
+
+    code = postal_index.normalize(request.args.get('code', ''))
+    if len(code) == 7:
+        results = postal_index.lookup(code)
+        if results is None:
+            results = postal_index.lookup_remote(code)
+    else:
+        results = postal_index.suggest(code)
+        if results is None:
+            results = []
+    if results is None:
+        return jsonify({'results': None, 'error': '郵便番号を検索できません（索引が未作成で、zipcloud にも接続できません）'}), 503
+    return jsonify({'results': results})
+
+
+@bp.route('/api/purposes')
+@require_roles(ROLES["TENANT_ADMIN"], ROLES["SYSTEM_ADMIN"])
+def purpose_suggest():
+    """事業目的の入力候補（部分一致）を返す"""
+    from flask import jsonify
+    from app.services import purpose_index
+
+    query = request.args.get('q', '')
+    limit = min(request.args.get('limit', purpose_index.DEFAULT_LIMIT, type=int), 50)
+    return jsonify({'results': purpose_index.search(query, limit=limit)})
+
+@traced("pdf.teikan")
 def generate_teikan_pdf(data):
     """
     定款PDFを生成する（ReportLabを使用）
@@ -479,6 +707,7 @@ def generate_teikan_pdf(data):
     from reportlab.pdfgen import canvas
     from reportlab.pdfbase import pdfmetrics
     from reportlab.pdfbase.ttfonts import TTFont
+    from app.services.teikan_layout import Document, Page
     import os
 
     # 日本語フォントの設定（リポジトリ内 → システムの順に探索）
@@ -506,265 +735,20 @@ def generate_teikan_pdf(data):
         font_name = 'Helvetica'
         font_bold = 'Helvetica-Bold'
 
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
     width, height = A4
+    # ブロックごとの改行・改ページ位置はプロセス内にキャッシュされ、変わった部分だけ配置し直す
+    doc = Document(Page(
+        width=width, height=height,
+        margin_left=25 * mm, margin_right=25 * mm, margin_top=25 * mm, margin_bottom=20 * mm,
+        font_name=font_name, font_bold=font_bold,
+    ))
 
-    margin_left = 25 * mm
-    margin_right = 25 * mm
-    margin_top = 25 * mm
-    margin_bottom = 20 * mm
-    content_width = width - margin_left - margin_right
-
-    y_ref = [height - margin_top]
-
-    def get_y():
-        return y_ref[0]
-
-    def set_y(val):
-        y_ref[0] = val
-
-    def new_page():
-        c.showPage()
-        set_y(height - margin_top)
-
-    def check_page_break(needed_mm=25):
-        if get_y() < margin_bottom + needed_mm * mm:
-            new_page()
-
-    def draw_wrapped_text(text, x, y_pos, max_width, font=font_name, size=10.5, line_height=16):
-        c.setFont(font, size)
-        line = ''
-        lines = []
-        for char in text:
-            test_line = line + char
-            if c.stringWidth(test_line, font, size) <= max_width:
-                line = test_line
-            else:
-                if line:
-                    lines.append(line)
-                line = char
-        if line:
-            lines.append(line)
-
-        for ln in lines:
-            if y_pos < margin_bottom + 10 * mm:
-                new_page()
-                y_pos = height - margin_top
-            c.drawString(x, y_pos, ln)
-            y_pos -= line_height
-        return y_pos
-
-    def draw_chapter(title_text):
-        check_page_break(30)
-        c.setFont(font_bold, 12)
-        tw = c.stringWidth(title_text, font_bold, 12)
-        c.drawString((width - tw) / 2, get_y(), title_text)
-        set_y(get_y() - 25)
-
-    def draw_article(article_num, title_text, content_lines):
-        check_page_break(25)
-        c.setFont(font_bold, 10.5)
-        header = f'第{article_num}条（{title_text}）'
-        c.drawString(margin_left, get_y(), header)
-        set_y(get_y() - 18)
-        for line in content_lines:
-            if not line:
-                set_y(get_y() - 8)
-                continue
-            check_page_break(15)
-            indent = margin_left + 5 * mm
-            new_y = draw_wrapped_text(line, indent, get_y(), content_width - 10 * mm, size=10.5, line_height=16)
-            set_y(new_y - 2)
-        set_y(get_y() - 8)
-
-    # ===== 共通データ取得 =====
-    company_name = data.get('company_name', '')
-    company_type = data.get('company_type', '合同会社')
-    purposes = data.get('purposes', [])
-    address = data.get('address', '') + data.get('address_detail', '')
-    capital = data.get('capital', '0')
-    try:
-        capital_int = int(str(capital).replace(',', '').replace('円', ''))
-        capital_str = f'{capital_int:,}円'
-    except Exception:
-        capital_str = f'{capital}円'
-    members = data.get('members', [])
-    fiscal_start_month = data.get('fiscal_start_month', '3')
-    fiscal_start_day = data.get('fiscal_start_day', '1')
-    fiscal_end_month = data.get('fiscal_end_month', '2')
-    fiscal_end_day = data.get('fiscal_end_day', '末日')
-    if fiscal_end_day == '末日':
-        fiscal_end_str = f'{fiscal_end_month}月末日'
-    else:
-        fiscal_end_str = f'{fiscal_end_month}月{fiscal_end_day}日'
-    established_date = data.get('established_date', '') or '令和　　年　　月　　日'
-    rep_members = [m for m in members if m.get('is_representative')]
-    if not rep_members and members:
-        rep_members = [members[0]]
-    rep_lines = [f'　{m.get("name", "")}' for m in rep_members] or ['　（代表者氏名）']
-
-    # ===== 表紙 =====
-    c.setFont(font_bold, 18)
-    title = '定　　款'
-    title_width = c.stringWidth(title, font_bold, 18)
-    c.drawString((width - title_width) / 2, get_y(), title)
-    set_y(get_y() - 40)
-    c.setFont(font_bold, 14)
-    cn = f'{company_type}{company_name}'
-    cn_width = c.stringWidth(cn, font_bold, 14)
-    c.drawString((width - cn_width) / 2, get_y(), cn)
-    set_y(get_y() - 60)
-
-    # ===== 法人形態別テンプレート =====
-    if company_type == '合同会社':
-        # ---------- 合同会社 ----------
-        draw_chapter('第一章　総則')
-        draw_article('1', '商号', [f'当会社は、合同会社{company_name}と称する。'])
-        purpose_lines = ['当会社は、次の事業を営むことを目的とする。']
-        for i, p in enumerate(purposes, 1):
-            purpose_lines.append(f'　{i}．{p}')
-        draw_article('2', '目的', purpose_lines)
-        draw_article('3', '本店の所在地', [f'当会社は、本店を{address}に置く。'])
-        draw_article('4', '公告方法', ['当会社の公告は、官報に掲載する方法により行う。'])
-
-        draw_chapter('第二章　社員及び出資')
-        contribution_lines = ['社員の氏名、住所及び出資の目的並びにその価額は、次のとおりである。']
-        for m in members:
-            contrib = m.get('contribution', '0')
-            try:
-                contrib_str = f"{int(str(contrib).replace(',','').replace('円','')):,}円"
-            except Exception:
-                contrib_str = f'{contrib}円'
-            contribution_lines += [f'　氏名：{m.get("name","")}', f'　住所：{m.get("address","")}', f'　出資の価額：金{contrib_str}', '']
-        draw_article('5', '社員の出資', contribution_lines)
-        draw_article('6', '資本金の額', [f'当会社の資本金の額は、金{capital_str}とする。'])
-
-        draw_chapter('第三章　業務執行及び代表')
-        draw_article('7', '業務執行社員', ['当会社の業務は、社員全員が執行する。', '業務を執行する社員は、当会社を代表する。'])
-        draw_article('8', '代表社員', ['当会社を代表する社員は、次のとおりとする。'] + rep_lines)
-        draw_article('9', '業務執行の決定', ['当会社の業務執行は、社員の過半数をもって決定する。'])
-
-        draw_chapter('第四章　計算')
-        draw_article('10', '事業年度', [f'当会社の事業年度は、毎年{fiscal_start_month}月{fiscal_start_day}日から翌年{fiscal_end_str}までとする。'])
-        draw_article('11', '利益の配当', ['当会社は、毎事業年度終了後、社員の出資の価額に応じて利益の配当を行う。'])
-
-        draw_chapter('第五章　附則')
-        draw_article('12', '設立に際して出資される財産の価額', [f'当会社の設立に際して出資される財産の価額は、金{capital_str}とする。'])
-        draw_article('13', '最初の事業年度', [f'当会社の最初の事業年度は、当会社成立の日から{fiscal_end_str}までとする。'])
-        draw_article('14', '設立時代表社員', ['当会社の設立時の代表社員は、次のとおりとする。'] + rep_lines)
-        draw_article('15', '附則', [f'当会社の定款は、{established_date}に作成した。'])
-
-        check_page_break(60)
-        set_y(get_y() - 20)
-        c.setFont(font_name, 10.5)
-        c.drawString(margin_left, get_y(), '以上、合同会社設立のため、この定款を作成し、社員が記名押印する。')
-        set_y(get_y() - 30)
-        c.drawString(margin_left, get_y(), f'　　　　　　　　　　　　　　　　　　　　{established_date}')
-        set_y(get_y() - 30)
-        for m in members:
-            check_page_break(20)
-            c.drawString(margin_left + 20 * mm, get_y(), f'社員　{m.get("name", "")}　　　　　　　印')
-            set_y(get_y() - 25)
-
-    elif company_type == '株式会社':
-        # ---------- 株式会社 ----------
-        total_shares = data.get('total_shares', '400')
-        draw_chapter('第一章　総則')
-        draw_article('1', '商号', [f'当会社は、株式会社{company_name}と称する。'])
-        purpose_lines = ['当会社は、次の事業を営むことを目的とする。']
-        for i, p in enumerate(purposes, 1):
-            purpose_lines.append(f'　{i}．{p}')
-        draw_article('2', '目的', purpose_lines)
-        draw_article('3', '本店の所在地', [f'当会社は、本店を{address}に置く。'])
-        draw_article('4', '公告方法', ['当会社の公告は、官報に掲載する方法により行う。'])
-
-        draw_chapter('第二章　株式')
-        draw_article('5', '発行可能株式総数', [f'当会社の発行可能株式総数は、{total_shares}株とする。'])
-        draw_article('6', '株券の不発行', ['当会社の株式については、株券を発行しない。'])
-        draw_article('7', '株式の譲渡制限', ['当会社の株式を譲渡するには、取締役会の承認を要する。ただし、当会社の株主に譲渡する場合は、この限りでない。'])
-
-        draw_chapter('第三章　株主総会')
-        draw_article('8', '招集', ['当会社の定時株主総会は、毎事業年度終了後３ヶ月以内に招集し、臨時株主総会は、必要に応じて招集する。'])
-        draw_article('9', '議長', ['株主総会の議長は、代表取締役社長がこれに当たる。'])
-        draw_article('10', '決議', ['株主総会の普通決議は、法令に別段の定めがある場合を除き、議決権を行使することができる株主の議決権の過半数を有する株主が出席し、出席した当該株主の議決権の過半数をもって行う。'])
-
-        draw_chapter('第四章　取締役')
-        draw_article('11', '取締役の員数', ['当会社の取締役は、１名以上とする。'])
-        draw_article('12', '取締役の選任', ['取締役は、株主総会の決議によって選任する。'])
-        draw_article('13', '代表取締役', ['当会社の代表取締役は、取締役の互選によって定める。'])
-        draw_article('14', '取締役の任期', ['取締役の任期は、選任後２年以内に終了する事業年度のうち最終のものに関する定時株主総会の終結の時までとする。ただし、定款変更その他正当な事由がある場合には、株主総会の決議によって短縮することができる。'])
-
-        draw_chapter('第五章　計算')
-        draw_article('15', '事業年度', [f'当会社の事業年度は、毎年{fiscal_start_month}月{fiscal_start_day}日から翌年{fiscal_end_str}までとする。'])
-        draw_article('16', '剰余金の配当', ['当会社の剰余金の配当は、毎事業年度末日の最終の株主名簿に記載された株主又は登録株式質権者に対して行う。'])
-
-        draw_chapter('第六章　附則')
-        draw_article('17', '設立に際して出資される財産の価額', [f'当会社の設立に際して出資される財産の価額は、金{capital_str}とする。'])
-        draw_article('18', '最初の事業年度', [f'当会社の最初の事業年度は、当会社成立の日から{fiscal_end_str}までとする。'])
-        draw_article('19', '設立時取締役', ['当会社の設立時取締役は、次のとおりとする。'] + rep_lines)
-        draw_article('20', '附則', [f'当会社の定款は、{established_date}に作成した。'])
-
-        check_page_break(60)
-        set_y(get_y() - 20)
-        c.setFont(font_name, 10.5)
-        c.drawString(margin_left, get_y(), '以上、株式会社設立のため、この定款を作成し、発起人が記名押印する。')
-        set_y(get_y() - 30)
-        c.drawString(margin_left, get_y(), f'　　　　　　　　　　　　　　　　　　　　{established_date}')
-        set_y(get_y() - 30)
-        for m in members:
-            check_page_break(20)
-            c.drawString(margin_left + 20 * mm, get_y(), f'発起人　{m.get("name", "")}　　　　　　　印')
-            set_y(get_y() - 25)
-
-    elif company_type == '一般社団法人':
-        # ---------- 一般社団法人 ----------
-        draw_chapter('第一章　総則')
-        draw_article('1', '名称', [f'当法人は、一般社団法人{company_name}と称する。'])
-        purpose_lines = ['当法人は、次の事業を行うことを目的とする。']
-        for i, p in enumerate(purposes, 1):
-            purpose_lines.append(f'　{i}．{p}')
-        draw_article('2', '目的', purpose_lines)
-        draw_article('3', '主たる事務所の所在地', [f'当法人は、主たる事務所を{address}に置く。'])
-        draw_article('4', '公告方法', ['当法人の公告は、官報に掲載する方法により行う。'])
-
-        draw_chapter('第二章　会員')
-        draw_article('5', '会員の種別', ['当法人の会員は、次の２種とする。', '　１．正会員　当法人の目的に賛同して入会した個人又は団体', '　２．賛助会員　当法人の事業を賛助するために入会した個人又は団体'])
-        draw_article('6', '入会', ['当法人の会員になろうとする者は、理事会が別に定める入会申込書を提出し、理事会の承認を得なければならない。'])
-        draw_article('7', '会費', ['会員は、社員総会において別に定める会費を納入しなければならない。'])
-
-        draw_chapter('第三章　社員総会')
-        draw_article('8', '社員総会の構成', ['当法人の社員総会は、正会員をもって構成する。'])
-        draw_article('9', '社員総会の開催', ['当法人の定時社員総会は、毎事業年度終了後３ヶ月以内に開催し、臨時社員総会は、必要に応じて開催する。'])
-        draw_article('10', '社員総会の決議', ['社員総会の決議は、法令又はこの定款に別段の定めがある場合を除き、総社員の議決権の過半数を有する社員が出席し、出席した当該社員の議決権の過半数をもって行う。'])
-
-        draw_chapter('第四章　役員')
-        draw_article('11', '役員の設置', ['当法人に、理事１名以上及び監事１名を置く。'])
-        draw_article('12', '役員の選任', ['理事及び監事は、社員総会の決議によって選任する。'])
-        draw_article('13', '代表理事', ['当法人の代表理事は、理事の互選によって定める。'])
-        draw_article('14', '役員の任期', ['理事の任期は、選任後２年以内に終了する事業年度のうち最終のものに関する定時社員総会の終結の時までとする。', '監事の任期は、選任後２年以内に終了する事業年度のうち最終のものに関する定時社員総会の終結の時までとする。'])
-
-        draw_chapter('第五章　計算')
-        draw_article('15', '事業年度', [f'当法人の事業年度は、毎年{fiscal_start_month}月{fiscal_start_day}日から翌年{fiscal_end_str}までとする。'])
-        draw_article('16', '剰余金の分配の禁止', ['当法人は、剰余金の分配を行わない。'])
-
-        draw_chapter('第六章　附則')
-        draw_article('17', '最初の事業年度', [f'当法人の最初の事業年度は、当法人成立の日から{fiscal_end_str}までとする。'])
-        draw_article('18', '設立時役員', ['当法人の設立時理事は、次のとおりとする。'] + rep_lines)
-        draw_article('19', '附則', [f'当法人の定款は、{established_date}に作成した。'])
-
-        check_page_break(60)
-        set_y(get_y() - 20)
-        c.setFont(font_name, 10.5)
-        c.drawString(margin_left, get_y(), '以上、一般社団法人設立のため、この定款を作成し、設立時社員が記名押印する。')
-        set_y(get_y() - 30)
-        c.drawString(margin_left, get_y(), f'　　　　　　　　　　　　　　　　　　　　{established_date}')
-        set_y(get_y() - 30)
-        for m in members:
-            check_page_break(20)
-            c.drawString(margin_left + 20 * mm, get_y(), f'設立時社員　{m.get("name", "")}　　　　　　　印')
-            set_y(get_y() - 25)
+    for block in teikan_document.build(data):
+        doc.add(block)
 
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    doc.render(c)
     c.save()
     buffer.seek(0)
     return buffer.read()
@@ -805,12 +789,15 @@ def download_registration_application():
         flash('最初から入力してください', 'warning')
         return redirect(url_for('teikan.step1'))
     try:
-        pdf_bytes = generate_registration_application_pdf(data)
+        with admission.rendering():
+            pdf_bytes = generate_registration_application_pdf(data)
         company_type = data.get('company_type', '合同会社')
         company_name = data.get('company_name', '会社')
         filename = f"{company_type}{company_name}_設立登記申請書.pdf"
         return send_file(io.BytesIO(pdf_bytes), mimetype='application/pdf',
                          as_attachment=True, download_name=filename)
+    except admission.Rejected as rejected:
+        return admission.too_many_requests(rejected)
     except Exception as e:
         flash(f'PDF生成エラー: {str(e)}', 'error')
         return redirect(url_for('teikan.registration_docs'))
@@ -825,12 +812,15 @@ def download_payment_certificate():
         flash('最初から入力してください', 'warning')
         return redirect(url_for('teikan.step1'))
     try:
-        pdf_bytes = generate_payment_certificate_pdf(data)
+        with admission.rendering():
+            pdf_bytes = generate_payment_certificate_pdf(data)
         company_type = data.get('company_type', '合同会社')
         company_name = data.get('company_name', '会社')
         filename = f"{company_type}{company_name}_払込証明書.pdf"
         return send_file(io.BytesIO(pdf_bytes), mimetype='application/pdf',
                          as_attachment=True, download_name=filename)
+    except admission.Rejected as rejected:
+        return admission.too_many_requests(rejected)
     except Exception as e:
         flash(f'PDF生成エラー: {str(e)}', 'error')
         return redirect(url_for('teikan.registration_docs'))
@@ -856,12 +846,15 @@ def download_capital_certificate():
         flash('最初から入力してください', 'warning')
         return redirect(url_for('teikan.step1'))
     try:
-        pdf_bytes = generate_capital_certificate_pdf(data)
+        with admission.rendering():
+            pdf_bytes = generate_capital_certificate_pdf(data)
         company_type = data.get('company_type', '合同会社')
         company_name = data.get('company_name', '会社')
         filename = f"{company_type}{company_name}_資本金の額の決定を証する書面.pdf"
         return send_file(io.BytesIO(pdf_bytes), mimetype='application/pdf',
                          as_attachment=True, download_name=filename)
+    except admission.Rejected as rejected:
+        return admission.too_many_requests(rejected)
     except Exception as e:
         flash(f'PDF生成エラー: {str(e)}', 'error')
         return redirect(url_for('teikan.registration_docs'))
@@ -876,12 +869,15 @@ def download_office_location():
         flash('最初から入力してください', 'warning')
         return redirect(url_for('teikan.step1'))
     try:
-        pdf_bytes = generate_office_location_pdf(data)
+        with admission.rendering():
+            pdf_bytes = generate_office_location_pdf(data)
         company_type = data.get('company_type', '合同会社')
         company_name = data.get('company_name', '会社')
         filename = f"{company_type}{company_name}_本店所在場所の決定を証する書面.pdf"
         return send_file(io.BytesIO(pdf_bytes), mimetype='application/pdf',
                          as_attachment=True, download_name=filename)
+    except admission.Rejected as rejected:
+        return admission.too_many_requests(rejected)
     except Exception as e:
         flash(f'PDF生成エラー: {str(e)}', 'error')
         return redirect(url_for('teikan.registration_docs'))
@@ -896,12 +892,15 @@ def download_acceptance_letter():
         flash('最初から入力してください', 'warning')
         return redirect(url_for('teikan.step1'))
     try:
-        pdf_bytes = generate_acceptance_letter_pdf(data)
+        with admission.rendering():
+            pdf_bytes = generate_acceptance_letter_pdf(data)
         company_type = data.get('company_type', '合同会社')
         company_name = data.get('company_name', '会社')
         filename = f"{company_type}{company_name}_就任承諾書.pdf"
         return send_file(io.BytesIO(pdf_bytes), mimetype='application/pdf',
                          as_attachment=True, download_name=filename)
+    except admission.Rejected as rejected:
+        return admission.too_many_requests(rejected)
     except Exception as e:
         flash(f'PDF生成エラー: {str(e)}', 'error')
         return redirect(url_for('teikan.registration_docs'))
@@ -916,7 +915,8 @@ def download_founder_resolution():
         flash('最初から入力してください', 'warning')
         return redirect(url_for('teikan.step1'))
     try:
-        pdf_bytes = generate_founder_resolution_pdf(data)
+        with admission.rendering():
+            pdf_bytes = generate_founder_resolution_pdf(data)
         company_type = data.get('company_type', '株式会社')
         company_name = data.get('company_name', '会社')
         if company_type == '一般社団法人':
@@ -926,6 +926,8 @@ def download_founder_resolution():
         filename = f"{company_type}{company_name}_{doc_name}.pdf"
         return send_file(io.BytesIO(pdf_bytes), mimetype='application/pdf',
                          as_attachment=True, download_name=filename)
+    except admission.Rejected as rejected:
+        return admission.too_many_requests(rejected)
     except Exception as e:
         flash(f'PDF生成エラー: {str(e)}', 'error')
         return redirect(url_for('teikan.registration_docs'))
@@ -940,12 +942,15 @@ def download_seal_registration():
         flash('最初から入力してください', 'warning')
         return redirect(url_for('teikan.step1'))
     try:
-        pdf_bytes = generate_seal_registration_pdf(data)
+        with admission.rendering():
+            pdf_bytes = generate_seal_registration_pdf(data)
         company_type = data.get('company_type', '合同会社')
         company_name = data.get('company_name', '会社')
         filename = f"{company_type}{company_name}_印鑑届出書.pdf"
         return send_file(io.BytesIO(pdf_bytes), mimetype='application/pdf',
                          as_attachment=True, download_name=filename)
+    except admission.Rejected as rejected:
+        return admission.too_many_requests(rejected)
     except Exception as e:
         flash(f'PDF生成エラー: {str(e)}', 'error')
         return redirect(url_for('teikan.registration_docs'))
@@ -961,12 +966,15 @@ def download_inkan_card():
         flash('最初から入力してください', 'warning')
         return redirect(url_for('teikan.step1'))
     try:
-        pdf_bytes = generate_inkan_card_pdf(data)
+        with admission.rendering():
+            pdf_bytes = generate_inkan_card_pdf(data)
         company_type = data.get('company_type', '合同会社')
         company_name = data.get('company_name', '会社')
         filename = f"{company_type}{company_name}_印鑑カード交付申請書.pdf"
         return send_file(io.BytesIO(pdf_bytes), mimetype='application/pdf',
                          as_attachment=True, download_name=filename)
+    except admission.Rejected as rejected:
+        return admission.too_many_requests(rejected)
     except Exception as e:
         flash(f'PDF生成エラー: {str(e)}', 'error')
         return redirect(url_for('teikan.registration_docs'))
@@ -981,12 +989,15 @@ def download_stamp_duty_sheet():
         flash('最初から入力してください', 'warning')
         return redirect(url_for('teikan.step1'))
     try:
-        pdf_bytes = generate_stamp_duty_sheet_pdf(data)
+        with admission.rendering():
+            pdf_bytes = generate_stamp_duty_sheet_pdf(data)
         company_type = data.get('company_type', '合同会社')
         company_name = data.get('company_name', '会社')
         full_name = f"{company_type}{company_name}"
         return send_file(io.BytesIO(pdf_bytes), mimetype='application/pdf',
                          as_attachment=True, download_name=f"{full_name}_登録免許税納付用台紙.pdf")
+    except admission.Rejected as rejected:
+        return admission.too_many_requests(rejected)
     except Exception as e:
         flash(f'PDF生成エラー: {str(e)}', 'error')
         return redirect(url_for('teikan.registration_docs'))
@@ -1001,12 +1012,15 @@ def download_registration_items():
         flash('最初から入力してください', 'warning')
         return redirect(url_for('teikan.step1'))
     try:
-        pdf_bytes = generate_registration_items_pdf(data)
+        with admission.rendering():
+            pdf_bytes = generate_registration_items_pdf(data)
         company_type = data.get('company_type', '合同会社')
         company_name = data.get('company_name', '会社')
         full_name = f"{company_type}{company_name}"
         return send_file(io.BytesIO(pdf_bytes), mimetype='application/pdf',
                          as_attachment=True, download_name=f"{full_name}_別紙（登記すべき事項）.pdf")
+    except admission.Rejected as rejected:
+        return admission.too_many_requests(rejected)
     except Exception as e:
         flash(f'PDF生成エラー: {str(e)}', 'error')
         return redirect(url_for('teikan.registration_docs'))
@@ -1026,78 +1040,82 @@ def download_all_docs():
         company_name = data.get('company_name', '会社')
         full_name = f"{company_type}{company_name}"
 
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-            # 定款
-            teikan_pdf = generate_teikan_pdf(data)
-            zf.writestr(f"{full_name}_定款.pdf", teikan_pdf)
-
-            # 設立登記申請書
-            app_pdf = generate_registration_application_pdf(data)
-            zf.writestr(f"{full_name}_設立登記申請書.pdf", app_pdf)
-            # 登録免許税納付用台紙
-            stamp_duty_pdf = generate_stamp_duty_sheet_pdf(data)
-            zf.writestr(f"{full_name}_登録免許税納付用台紙.pdf", stamp_duty_pdf)
-            # 別紙（登記すべき事項）
-            reg_items_pdf = generate_registration_items_pdf(data)
-            zf.writestr(f"{full_name}_別紙（登記すべき事項）.pdf", reg_items_pdf)
-
-            # 印鑑届出書
-            seal_pdf = generate_seal_registration_pdf(data)
-            zf.writestr(f"{full_name}_印鑑届出書.pdf", seal_pdf)
-
-            # 印鑑カード交付申請書
-            inkan_card_pdf = generate_inkan_card_pdf(data)
-            zf.writestr(f"{full_name}_印鑑カード交付申請書.pdf", inkan_card_pdf)
-
-            if company_type != '一般社団法人':
-                # 払込証明書
-                payment_pdf = generate_payment_certificate_pdf(data)
-                zf.writestr(f"{full_name}_払込証明書.pdf", payment_pdf)
-
-                # 資本金の額の決定を証する書面
-                capital_pdf = generate_capital_certificate_pdf(data)
-                zf.writestr(f"{full_name}_資本金の額の決定を証する書面.pdf", capital_pdf)
-
-            if company_type == '合同会社':
-                # 本店所在場所の決定を証する書面
-                office_pdf = generate_office_location_pdf(data)
-                zf.writestr(f"{full_name}_本店所在場所の決定を証する書面.pdf", office_pdf)
-
-                # 就任承諾書
-                accept_pdf = generate_acceptance_letter_pdf(data)
-                zf.writestr(f"{full_name}_就任承諾書.pdf", accept_pdf)
-
-            elif company_type in ['株式会社', '一般社団法人']:
-                # 発起人の決定書 / 設立時社員の決議書
-                resolution_pdf = generate_founder_resolution_pdf(data)
-                doc_name = '設立時社員の決議書' if company_type == '一般社団法人' else '発起人の決定書'
-                zf.writestr(f"{full_name}_{doc_name}.pdf", resolution_pdf)
-
-                # 就任承諾書
-                accept_pdf = generate_acceptance_letter_pdf(data)
-                zf.writestr(f"{full_name}_就任承諾書.pdf", accept_pdf)
-
-            # 綴じ方ガイドPDF
-            import os
-            import sys
-            sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'services'))
-            from generate_guides import generate_kk_guide, generate_gk_guide, generate_ippan_guide
-            if company_type == '株式会社':
-                guide_pdf = generate_kk_guide().read()
-                guide_name = '綴じ方ガイド（株式会社版）.pdf'
-            elif company_type == '合同会社':
-                guide_pdf = generate_gk_guide().read()
-                guide_name = '綴じ方ガイド（合同会社版）.pdf'
-            else:
-                guide_pdf = generate_ippan_guide().read()
-                guide_name = '綴じ方ガイド（一般社団法人版）.pdf'
-            zf.writestr(guide_name, guide_pdf)
+        with admission.rendering(admission.ZIP_COST):
+            zip_buffer = io.BytesIO()
+            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+                # 定款
+                teikan_pdf = generate_teikan_pdf(data)
+                zf.writestr(f"{full_name}_定款.pdf", teikan_pdf)
+
+                # 設立登記申請書
+                app_pdf = generate_registration_application_pdf(data)
+                zf.writestr(f"{full_name}_設立登記申請書.pdf", app_pdf)
+                # 登録免許税納付用台紙
+                stamp_duty_pdf = generate_stamp_duty_sheet_pdf(data)
+                zf.writestr(f"{full_name}_登録免許税納付用台紙.pdf", stamp_duty_pdf)
+                # 別紙（登記すべき事項）
+                reg_items_pdf = generate_registration_items_pdf(data)
+                zf.writestr(f"{full_name}_別紙（登記すべき事項）.pdf", reg_items_pdf)
+
+                # 印鑑届出書
+                seal_pdf = generate_seal_registration_pdf(data)
+                zf.writestr(f"{full_name}_印鑑届出書.pdf", seal_pdf)
+
+                # 印鑑カード交付申請書
+                inkan_card_pdf = generate_inkan_card_pdf(data)
+                zf.writestr(f"{full_name}_印鑑カード交付申請書.pdf", inkan_card_pdf)
+
+                if company_type != '一般社団法人':
+                    # 払込証明書
+                    payment_pdf = generate_payment_certificate_pdf(data)
+                    zf.writestr(f"{full_name}_払込証明書.pdf", payment_pdf)
+
+                    # 資本金の額の決定を証する書面
+                    capital_pdf = generate_capital_certificate_pdf(data)
+                    zf.writestr(f"{full_name}_資本金の額の決定を証する書面.pdf", capital_pdf)
+
+                if company_type == '合同会社':
+                    # 本店所在場所の決定を証する書面
+                    office_pdf = generate_office_location_pdf(data)
+                    zf.writestr(f"{full_name}_本店所在場所の決定を証する書面.pdf", office_pdf)
+
+                    # 就任承諾書
+                    accept_pdf = generate_acceptance_letter_pdf(data)
+                    zf.writestr(f"{full_name}_就任承諾書.pdf", accept_pdf)
+
+                elif company_type in ['株式会社', '一般社団法人']:
+                    # 発起人の決定書 / 設立時社員の決議書
+                    resolution_pdf = generate_founder_resolution_pdf(data)
+                    doc_name = '設立時社員の決議書' if company_type == '一般社団法人' else '発起人の決定書'
+                    zf.writestr(f"{full_name}_{doc_name}.pdf", resolution_pdf)
+
+                    # 就任承諾書
+                    accept_pdf = generate_acceptance_letter_pdf(data)
+                    zf.writestr(f"{full_name}_就任承諾書.pdf", accept_pdf)
+
+                # 綴じ方ガイドPDF
+                import os
+                import sys
+                sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'services'))
+                from generate_guides import generate_kk_guide, generate_gk_guide, generate_ippan_guide
+                if company_type == '株式会社':
+                    guide_pdf = generate_kk_guide().read()
+                    guide_name = '綴じ方ガイド（株式会社版）.pdf'
+                elif company_type == '合同会社':
+                    guide_pdf = generate_gk_guide().read()
+                    guide_name = '綴じ方ガイド（合同会社版）.pdf'
+                else:
+                    guide_pdf = generate_ippan_guide().read()
+                    guide_name = '綴じ方ガイド（一般社団法人版）.pdf'
+                zf.writestr(guide_name, guide_pdf)
 
         zip_buffer.seek(0)
+        metrics.count_zip_bundle()
         return send_file(zip_buffer, mimetype='application/zip',
                          as_attachment=True,
                          download_name=f"{full_name}_登記書類一式.zip")
+    except admission.Rejected as rejected:
+        return admission.too_many_requests(rejected)
     except Exception as e:
         flash(f'ZIP生成エラー: {str(e)}', 'error')
         return redirect(url_for('teikan.registration_docs'))
@@ -1107,6 +1125,7 @@ def download_all_docs():
 # PDF プレビュー API（PDF生成→画像変換→base64返却）
 # ============================================================
 
+@traced("rasterize")
 def _pdf_to_preview_images(pdf_bytes, dpi=120):
     """PDFバイト列を画像のbase64リストに変換する"""
     import base64
@@ -1125,47 +1144,62 @@ def _pdf_to_preview_images(pdf_bytes, dpi=120):
         return {'error': str(e)}
 
 
+# 画像でプレビューする書類（定款は HTML で返す）
+_PREVIEW_TYPES = frozenset([
+    'application', 'payment_certificate', 'capital_certificate', 'office_location',
+    'acceptance_letter', 'founder_resolution', 'seal_registration', 'inkan_card',
+    'stamp_duty_sheet', 'registration_items',
+])
+
+
 @bp.route('/registration_docs/preview_pdf/<doc_type>')
 @require_roles(ROLES["TENANT_ADMIN"], ROLES["SYSTEM_ADMIN"])
 def preview_pdf(doc_type):
-    """書類のPDFを生成して画像プレビューをJSONで返す"""
+    """
+    書類のPDFを生成して画像プレビューをJSONで返す
+    定款は PDF と同じ文書モデルから作った HTML を返す（PDF を画像にしない）
+    """
     from flask import jsonify
     data = get_session_data()
     if not data.get('company_name'):
         return jsonify({'error': '最初から入力してください'}), 400
     try:
         if doc_type == 'teikan':
-            pdf_bytes = generate_teikan_pdf(data)
-        elif doc_type == 'application':
-            pdf_bytes = generate_registration_application_pdf(data)
-        elif doc_type == 'payment_certificate':
-            pdf_bytes = generate_payment_certificate_pdf(data)
-        elif doc_type == 'capital_certificate':
-            pdf_bytes = generate_capital_certificate_pdf(data)
-        elif doc_type == 'office_location':
-            pdf_bytes = generate_office_location_pdf(data)
-        elif doc_type == 'acceptance_letter':
-            pdf_bytes = generate_acceptance_letter_pdf(data)
-        elif doc_type == 'founder_resolution':
-            pdf_bytes = generate_founder_resolution_pdf(data)
-        elif doc_type == 'seal_registration':
-            pdf_bytes = generate_seal_registration_pdf(data)
-        elif doc_type == 'inkan_card':
-            pdf_bytes = generate_inkan_card_pdf(data)
-        elif doc_type == 'stamp_duty_sheet':
-            pdf_bytes = generate_stamp_duty_sheet_pdf(data)
-        elif doc_type == 'registration_items':
-            pdf_bytes = generate_registration_items_pdf(data)
-        else:
+            return jsonify({'html': str(teikan_document.html(data))})
+        if doc_type not in _PREVIEW_TYPES:
             return jsonify({'error': '不明な書類種別です'}), 400
-        if isinstance(pdf_bytes, bytes):
-            pass
-        else:
-            pdf_bytes = bytes(pdf_bytes)
-        images = _pdf_to_preview_images(pdf_bytes)
+        # PDF の生成と画像への変換はどちらも重いので、まとめて1回分として受け付ける
+        with admission.rendering():
+            if doc_type == 'application':
+                pdf_bytes = generate_registration_application_pdf(data)
+            elif doc_type == 'payment_certificate':
+                pdf_bytes = generate_payment_certificate_pdf(data)
+            elif doc_type == 'capital_certificate':
+                pdf_bytes = generate_capital_certificate_pdf(data)
+            elif doc_type == 'office_location':
+                pdf_bytes = generate_office_location_pdf(data)
+            elif doc_type == 'acceptance_letter':
+                pdf_bytes = generate_acceptance_letter_pdf(data)
+            elif doc_type == 'founder_resolution':
+                pdf_bytes = generate_founder_resolution_pdf(data)
+            elif doc_type == 'seal_registration':
+                pdf_bytes = generate_seal_registration_pdf(data)
+            elif doc_type == 'inkan_card':
+                pdf_bytes = generate_inkan_card_pdf(data)
+            elif doc_type == 'stamp_duty_sheet':
+                pdf_bytes = generate_stamp_duty_sheet_pdf(data)
+            elif doc_type == 'registration_items':
+                pdf_bytes = generate_registration_items_pdf(data)
+            if isinstance(pdf_bytes, bytes):
+                pass
+            else:
+                pdf_bytes = bytes(pdf_bytes)
+            images = _pdf_to_preview_images(pdf_bytes)
         if isinstance(images, dict) and 'error' in images:
             return jsonify(images), 500
         return jsonify({'images': images, 'page_count': len(images)})
+    except admission.Rejected as rejected:
+        return admission.too_many_requests(rejected, as_json=True)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1228,6 +1262,7 @@ def _get_full_company_name(data):
         return f"{company_name}{company_type}"
 
 
+@traced("pdf.registration_application")
 def generate_registration_application_pdf(data):  # noqa: C901
     """設立登記申請書PDFを生成する（法務局公式雛形準拠）"""
     from reportlab.lib.pagesizes import A4
@@ -1620,6 +1655,7 @@ def generate_registration_application_pdf(data):  # noqa: C901
     return buffer.read()
 
 
+@traced("pdf.payment_certificate")
 def generate_payment_certificate_pdf(data):
     """払込みがあったことを証する書面（払込証明書）PDFを生成する"""
     c, buffer, width, height, ml, mr, mt, mb, cw, fn, mm = _setup_pdf_canvas()
@@ -1701,6 +1737,7 @@ def generate_payment_certificate_pdf(data):
     return buffer.read()
 
 
+@traced("pdf.capital_certificate")
 def generate_capital_certificate_pdf(data):
     """資本金の額の決定を証する書面PDFを生成する"""
     c, buffer, width, height, ml, mr, mt, mb, cw, fn, mm = _setup_pdf_canvas()
@@ -1761,6 +1798,7 @@ def generate_capital_certificate_pdf(data):
     return buffer.read()
 
 
+@traced("pdf.office_location")
 def generate_office_location_pdf(data):
     """本店所在場所の決定を証する書面PDFを生成する（合同会社用）"""
     c, buffer, width, height, ml, mr, mt, mb, cw, fn, mm = _setup_pdf_canvas()
@@ -1804,6 +1842,7 @@ def generate_office_location_pdf(data):
     return buffer.read()
 
 
+@traced("pdf.acceptance_letter")
 def generate_acceptance_letter_pdf(data):
     """就任承諾書PDFを生成する（全社員分）"""
     c, buffer, width, height, ml, mr, mt, mb, cw, fn, mm = _setup_pdf_canvas()
@@ -1888,6 +1927,7 @@ def generate_acceptance_letter_pdf(data):
     return buffer.read()
 
 
+@traced("pdf.founder_resolution")
 def generate_founder_resolution_pdf(data):
     """発起人の決定書（株式会社）/ 設立時社員の決議書（一般社団法人）PDFを生成する"""
     c, buffer, width, height, ml, mr, mt, mb, cw, fn, mm = _setup_pdf_canvas()
@@ -1971,6 +2011,7 @@ def generate_founder_resolution_pdf(data):
     return buffer.read()
 
 
+@traced("pdf.seal_registration")
 def generate_seal_registration_pdf(data):  # noqa: C901
     """印鑑届出書PDFを生成する（PDFテンプレートオーバーレイ方式）"""
     import io
@@ -2162,6 +2203,7 @@ def generate_seal_registration_pdf(data):  # noqa: C901
     return output_buffer.read()
 
 
+@traced("pdf.inkan_card")
 def generate_inkan_card_pdf(data):  # noqa: C901
     """印鑑カード交付申請書PDFを生成する（PDFテンプレートオーバーレイ方式）"""
     import os
@@ -2329,6 +2371,7 @@ def generate_inkan_card_pdf(data):  # noqa: C901
     return output_buffer.read()
 
 
+@traced("pdf.stamp_duty_sheet")
 def generate_stamp_duty_sheet_pdf(data):
     """登録免許税納付用台紙のPDFを生成する"""
     c, buffer, width, height, margin_left, margin_right, margin_top, margin_bottom, content_width, font_name, mm = _setup_pdf_canvas()
@@ -2374,6 +2417,7 @@ def generate_stamp_duty_sheet_pdf(data):
     return buffer.read()
 
 
+@traced("pdf.registration_items")
 def generate_registration_items_pdf(data):  # noqa: C901
     """別紙（登記すべき事項）のPDFを生成する（正式雛形）"""
     c, buffer, width, height, margin_left, margin_right, margin_top, margin_bottom, content_width, font_name, mm = _setup_pdf_canvas()
@@ -4,12 +4,17 @@
 """
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
 from app.db import SessionLocal
+from app.services.login import hash_password
 from app.models_login import TKanrisha, TJugyoin, TTenant, TTenpo, TKanrishaTenpo, TJugyoinTenpo, TTenantAppSetting, TTenpoAppSetting, TTenantAdminTenant
 from sqlalchemy import func, and_, or_
 from ..utils.decorators import ROLES
 from ..utils.decorators import require_roles
+from app.services import app_settings, directory
+import logging
+
+logger = logging.getLogger(__name__)
 
 bp = Blueprint('tenant_admin', __name__, url_prefix='/tenant_admin')
 
@@ -94,10 +99,11 @@ def mypage():
         }
         
         # テナント名を取得
+        current = directory.get()
         tenant_name = '未選択'
         if tenant_id:
-            tenant_obj = db.query(TTenant).filter(TTenant.id == tenant_id).first()
-            tenant_name = tenant_obj.名称 if tenant_obj else '不明'
+            tenant_entry = current.tenant(tenant_id)
+            tenant_name = tenant_entry['name'] if tenant_entry else '不明'
         
         # テナントリストを取得（テナント管理者が管理するテナント）
         tenant_objs = db.query(TTenant).join(
@@ -109,13 +115,10 @@ def mypage():
         tenant_list = [{'id': t.id, 'name': t.名称} for t in tenant_objs]
         
         # 店舗リストを取得（テナント管理者が管理するテナントの店舗）
-        store_list = []
-        if tenant_list:
-            tenant_ids = [t['id'] for t in tenant_list]
-            store_objs = db.query(TTenpo).filter(
-                TTenpo.tenant_id.in_(tenant_ids)
-            ).order_by(TTenpo.名称).all()
-            store_list = [{'id': s.id, 'name': s.名称, 'tenant_id': s.tenant_id} for s in store_objs]
+        store_list = sorted(
+            (s for t in tenant_list for s in current.stores_of(t['id'], active_only=False)),
+            key=lambda s: s['name'],
+        )
         
         # POSTリクエスト（プロフィール編集またはパスワード変更）
         if request.method == 'POST':
@@ -168,7 +171,7 @@ def mypage():
                     return render_template('tenant_mypage.html', user=user, tenant_name=tenant_name, tenant_list=tenant_list, store_list=store_list)
                 
                 # パスワードを更新
-                user_obj.password_hash = generate_password_hash(new_password)
+                user_obj.password_hash = hash_password(new_password)
                 if hasattr(user_obj, 'updated_at'):
                     user_obj.updated_at = func.now()
                 db.commit()
@@ -657,23 +660,21 @@ def store_delete(store_id):
             flash('店舗が見つかりません', 'error')
             return redirect(url_for('tenant_admin.stores'))
         
-        # トランザクション開始
+        # 削除はバッチごとの短いトランザクションで行うため、ここでセッションを閉じておく
+        from app.services import cascade_delete
+
+        store_name = store_obj.名称
+        db.close()
+
+        if request.form.get('mode') == 'dry_run':
+            counts = [f'{label} {n}件' for label, n in cascade_delete.dry_run(cascade_delete.SCOPE_STORE, store_id) if n]
+            flash(f'店舗「{store_name}」を削除すると次のデータが削除されます: ' + '、'.join(counts), 'success')
+            return redirect(url_for('tenant_admin.stores'))
+
         try:
-            # 1. 店舗に紐づく中間テーブルを削除
-            db.query(TKanrishaTenpo).filter(TKanrishaTenpo.store_id == store_id).delete(synchronize_session=False)
-            db.query(TJugyoinTenpo).filter(TJugyoinTenpo.store_id == store_id).delete(synchronize_session=False)
-            
-            # 2. 店舗アプリ設定を削除
-            db.query(TTenpoAppSetting).filter(TTenpoAppSetting.store_id == store_id).delete(synchronize_session=False)
-            
-            # 3. 店舗を削除
-            db.delete(store_obj)
-            
-            # コミット
-            db.commit()
+            cascade_delete.run(cascade_delete.SCOPE_STORE, store_id)
             flash('店舗と関連データを削除しました', 'success')
         except Exception as e:
-            db.rollback()
             flash(f'店舗削除中にエラーが発生しました: {str(e)}', 'error')
         
         return redirect(url_for('tenant_admin.stores'))
@@ -690,7 +691,6 @@ def store_delete(store_id):
 def tenant_admins():
     """テナント管理者一覧"""
     tenant_id = session.get('tenant_id')
-    print(f"DEBUG: tenant_id = {tenant_id}")
     db = SessionLocal()
     
     try:
@@ -698,9 +698,9 @@ def tenant_admins():
         relations = db.query(TTenantAdminTenant).filter(
             TTenantAdminTenant.tenant_id == tenant_id
         ).all()
-        print(f"DEBUG: relations count = {len(relations)}")
-        for rel in relations:
-            print(f"DEBUG: relation - admin_id={rel.admin_id}, tenant_id={rel.tenant_id}, is_owner={rel.is_owner}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("tenant_admins: tenant_id=%s relations=%s", tenant_id,
+                         [(rel.admin_id, rel.is_owner) for rel in relations])
         
         admins_data = []
         for rel in relations:
@@ -859,7 +859,7 @@ def tenant_admin_new():
                 return render_template('tenant_tenant_admin_new.html', from_tenant_id=tenant_id, tenant=tenant, tenants=tenants, is_system_admin=is_system_admin)
             
             # 管理者作成
-            hashed_password = generate_password_hash(password)
+            hashed_password = hash_password(password)
             new_admin = TKanrisha(
                 login_id=login_id,
                 name=name,
@@ -1068,7 +1068,7 @@ def tenant_admin_edit(admin_id):
                         tenant_admin_relation.can_manage_tenant_admins = 1
             
             if password:
-                admin.password_hash = generate_password_hash(password)
+                admin.password_hash = hash_password(password)
             
             # 役割変更時の処理
             if old_role != new_role:
@@ -1463,7 +1463,7 @@ def store_admin_new():
             
 
             # 管理者作成
-            hashed_password = generate_password_hash(password)
+            hashed_password = hash_password(password)
             new_admin = TKanrisha(
                 login_id=login_id,
                 name=name,
@@ -1848,7 +1848,7 @@ def employee_new():
                 return render_template('tenant_employee_new.html', stores=stores, from_store_id=from_store_id, store=store, tenant=tenant)
             
             # 従業員作成
-            hashed_password = generate_password_hash(password) if password else None
+            hashed_password = hash_password(password) if password else None
             new_employee = TJugyoin(
                 login_id=login_id,
                 name=name,
@@ -1890,6 +1890,95 @@ def employee_new():
         db.close()
 
 
+# ========================================
+# CSV一括登録（従業員・店舗管理者）
+# ========================================
+
+def _bulk_import_users(kind):
+    """従業員／店舗管理者のCSV一括登録の共通処理"""
+    from app.services.bulk_user_import import (
+        KIND_EMPLOYEE, CSV_COLUMNS, BulkImportError, decode_csv, parse_rows, validate, start_job
+    )
+
+    tenant_id = session.get('tenant_id')
+    store_id = session.get('store_id')
+    if kind == KIND_EMPLOYEE:
+        title, back_url = '従業員CSV一括登録', url_for('tenant_admin.employees')
+    else:
+        title, back_url = '店舗管理者CSV一括登録', url_for('tenant_admin.store_admins')
+
+    db = SessionLocal()
+    try:
+        errors = []
+        if request.method == 'POST':
+            upload = request.files.get('csv_file')
+            if not upload or not upload.filename:
+                flash('CSVファイルを選択してください', 'error')
+            else:
+                try:
+                    rows = parse_rows(decode_csv(upload.read()))
+                    validate(db, kind, rows, tenant_id, default_store_id=store_id)
+                    db.rollback()  # 検証の読み取りを終えてから、登録はバックグラウンドで行う
+                    job_id = start_job(kind, rows, tenant_id, from_store_id=store_id)
+                    return redirect(url_for('tenant_admin.bulk_import_job', job_id=job_id))
+                except BulkImportError as e:
+                    db.rollback()
+                    errors = e.errors
+                    flash('CSVにエラーがあるため登録しませんでした', 'error')
+                except Exception as e:
+                    db.rollback()
+                    flash(f'エラー: {str(e)}', 'error')
+
+        tenant = db.query(TTenant).filter(TTenant.id == tenant_id).first()
+        store = db.query(TTenpo).filter(TTenpo.id == store_id).first() if store_id else None
+        stores = db.query(TTenpo).filter(TTenpo.tenant_id == tenant_id).order_by(TTenpo.id).all()
+        return render_template('tenant_bulk_import.html',
+                             title=title,
+                             kind=kind,
+                             columns=CSV_COLUMNS,
+                             errors=errors,
+                             tenant=tenant,
+                             store=store,
+                             stores=stores,
+                             back_url=back_url)
+    finally:
+        db.close()
+
+
+@bp.route('/employees/bulk_import', methods=['GET', 'POST'])
+@require_roles(ROLES["TENANT_ADMIN"], ROLES["SYSTEM_ADMIN"])
+def employee_bulk_import():
+    """従業員CSV一括登録"""
+    return _bulk_import_users('employee')
+
+
+@bp.route('/store_admins/bulk_import', methods=['GET', 'POST'])
+@require_roles(ROLES["TENANT_ADMIN"], ROLES["SYSTEM_ADMIN"])
+def store_admin_bulk_import():
+    """店舗管理者CSV一括登録"""
+    return _bulk_import_users('store_admin')
+
+
+@bp.route('/bulk_import_jobs/<job_id>')
+@require_roles(ROLES["TENANT_ADMIN"], ROLES["SYSTEM_ADMIN"])
+def bulk_import_job(job_id):
+    """CSV一括登録ジョブの進捗"""
+    from app.services.bulk_user_import import KIND_EMPLOYEE, get_job
+
+    job = get_job(job_id, session.get('tenant_id'))
+    if not job:
+        flash('一括登録ジョブが見つかりません', 'error')
+        return redirect(url_for('tenant_admin.employees'))
+    if job['kind'] == KIND_EMPLOYEE:
+        title, back_url = '従業員CSV一括登録', url_for('tenant_admin.employees')
+        retry_url = url_for('tenant_admin.employee_bulk_import')
+    else:
+        title, back_url = '店舗管理者CSV一括登録', url_for('tenant_admin.store_admins')
+        retry_url = url_for('tenant_admin.store_admin_bulk_import')
+    return render_template('tenant_bulk_import_job.html', title=title, job=job,
+                           back_url=back_url, retry_url=retry_url)
+
+
 # ========================================
 # アプリ管理
 # ========================================
@@ -1923,10 +2012,10 @@ def app_management():
         session_tenant_id = session.get('tenant_id')
         
         # テナント管理者が管理できるテナント一覧を取得
+        current = directory.get()
         if user_role == ROLES["SYSTEM_ADMIN"]:
             # システム管理者は全テナントにアクセス可能
-            tenants_list = db.query(TTenant).filter(TTenant.有効 == 1).order_by(TTenant.id).all()
-            tenants = [{'id': t.id, 'name': t.名称} for t in tenants_list]
+            tenants = current.tenants()
         else:
             # テナント管理者は自分が管理するテナントのみ
             tenant_relations = db.query(TTenantAdminTenant).filter(
@@ -1935,11 +2024,9 @@ def app_management():
             
             tenants = []
             for rel in tenant_relations:
-                tenant = db.query(TTenant).filter(
-                    and_(TTenant.id == rel.tenant_id, TTenant.有効 == 1)
-                ).first()
-                if tenant:
-                    tenants.append({'id': tenant.id, 'name': tenant.名称})
+                tenant = current.tenant(rel.tenant_id)
+                if tenant and tenant['active']:
+                    tenants.append(tenant)
         
         # セッションにtenant_idが設定されている場合は、それを使用
         selected_tenant_id = session_tenant_id
@@ -1949,10 +2036,7 @@ def app_management():
         
         # セッションにtenant_idがある場合は、自動的に店舗一覧を取得
         if selected_tenant_id and request.method == 'GET':
-            stores_list = db.query(TTenpo).filter(
-                and_(TTenpo.tenant_id == selected_tenant_id, TTenpo.有効 == 1)
-            ).order_by(TTenpo.id).all()
-            stores = [{'id': s.id, 'name': s.名称} for s in stores_list]
+            stores = current.stores_of(selected_tenant_id)
         
         if request.method == 'POST':
             action = request.form.get('action', '')
@@ -1976,10 +2060,7 @@ def app_management():
                 
                 if selected_tenant_id:
                     # 店舗一覧を取得
-                    stores_list = db.query(TTenpo).filter(
-                        and_(TTenpo.tenant_id == selected_tenant_id, TTenpo.有効 == 1)
-                    ).order_by(TTenpo.id).all()
-                    stores = [{'id': s.id, 'name': s.名称} for s in stores_list]
+                    stores = current.stores_of(selected_tenant_id)
             
             elif action == 'select_store':
                 # 店舗選択
@@ -2000,30 +2081,19 @@ def app_management():
                         return redirect(url_for('tenant_admin.app_management'))
                 
                 if selected_tenant_id:
-                    stores_list = db.query(TTenpo).filter(
-                        and_(TTenpo.tenant_id == selected_tenant_id, TTenpo.有効 == 1)
-                    ).order_by(TTenpo.id).all()
-                    stores = [{'id': s.id, 'name': s.名称} for s in stores_list]
+                    stores = current.stores_of(selected_tenant_id)
                 
                 if selected_store_id:
                     # 店舗がテナントに属しているか確認
-                    store = db.query(TTenpo).filter(TTenpo.id == selected_store_id).first()
-                    if not store or store.tenant_id != selected_tenant_id:
+                    store = current.store(selected_store_id)
+                    if not store or store['tenant_id'] != selected_tenant_id:
                         flash('この店舗を管理する権限がありません', 'error')
                         return redirect(url_for('tenant_admin.app_management'))
                     
                     # 店舗単位のアプリ一覧を取得
-                    store_apps_data = {}
-                    for app in AVAILABLE_APPS:
-                        if app['scope'] == 'store':
-                            app_setting = db.query(TTenpoAppSetting).filter(
-                                and_(
-                                    TTenpoAppSetting.store_id == selected_store_id,
-                                    TTenpoAppSetting.app_name == app['name']
-                                )
-                            ).first()
-                            enabled = app_setting.enabled if app_setting else 1  # デフォルトは有効
-                            store_apps_data[app['name']] = enabled
+                    store_apps_data = app_settings.enabled_map(
+                        app_settings.SCOPE_STORE, selected_store_id, AVAILABLE_APPS
+                    )
                     
                     store_apps = [
                         {
@@ -2053,29 +2123,27 @@ def app_management():
                         return redirect(url_for('tenant_admin.app_management'))
                 
                 if selected_tenant_id:
-                    stores_list = db.query(TTenpo).filter(
-                        and_(TTenpo.tenant_id == selected_tenant_id, TTenpo.有効 == 1)
-                    ).order_by(TTenpo.id).all()
-                    stores = [{'id': s.id, 'name': s.名称} for s in stores_list]
+                    stores = current.stores_of(selected_tenant_id)
                 
                 if selected_store_id:
                     # 店舗がテナントに属しているか確認
-                    store = db.query(TTenpo).filter(TTenpo.id == selected_store_id).first()
-                    if not store or store.tenant_id != selected_tenant_id:
+                    store = current.store(selected_store_id)
+                    if not store or store['tenant_id'] != selected_tenant_id:
                         flash('この店舗を管理する権限がありません', 'error')
                         return redirect(url_for('tenant_admin.app_management'))
                     
+                    # 既存の設定をまとめて取得しておく
+                    existing = {
+                        s.app_name: s for s in db.query(TTenpoAppSetting).filter(
+                            TTenpoAppSetting.store_id == selected_store_id
+                        )
+                    }
                     for app in AVAILABLE_APPS:
                         if app['scope'] == 'store':
                             enabled = 1 if request.form.get(f'app_{app["name"]}') == 'on' else 0
                             
                             # UPSERT処理
-                            app_setting = db.query(TTenpoAppSetting).filter(
-                                and_(
-                                    TTenpoAppSetting.store_id == selected_store_id,
-                                    TTenpoAppSetting.app_name == app['name']
-                                )
-                            ).first()
+                            app_setting = existing.get(app['name'])
                             
                             if app_setting:
                                 # 更新
@@ -2092,18 +2160,11 @@ def app_management():
                     db.commit()
                     flash('店舗のアプリ設定を更新しました', 'success')
                     
-                    # 更新後のデータを再取得
-                    store_apps_data = {}
-                    for app in AVAILABLE_APPS:
-                        if app['scope'] == 'store':
-                            app_setting = db.query(TTenpoAppSetting).filter(
-                                and_(
-                                    TTenpoAppSetting.store_id == selected_store_id,
-                                    TTenpoAppSetting.app_name == app['name']
-                                )
-                            ).first()
-                            enabled = app_setting.enabled if app_setting else 1
-                            store_apps_data[app['name']] = enabled
+                    # 更新後のデータを再取得（このワーカーのキャッシュは捨てる）
+                    app_settings.invalidate(app_settings.SCOPE_STORE, selected_store_id)
+                    store_apps_data = app_settings.enabled_map(
+                        app_settings.SCOPE_STORE, selected_store_id, AVAILABLE_APPS
+                    )
                     
                     store_apps = [
                         {
@@ -2169,22 +2230,7 @@ def tenant_apps():
         }
         
         # テナントレベルで有効なアプリを取得
-        enabled_apps = []
-        
-        for app in AVAILABLE_APPS:
-            if app['scope'] == 'tenant':
-                app_setting = db.query(TTenantAppSetting).filter(
-                    and_(
-                        TTenantAppSetting.tenant_id == tenant_id,
-                        TTenantAppSetting.app_name == app['name']
-                    )
-                ).first()
-                enabled = app_setting.enabled if app_setting else 1
-                
-                if enabled:
-                    enabled_apps.append(app)
-        
-        apps = enabled_apps
+        apps = app_settings.enabled_apps(app_settings.SCOPE_TENANT, tenant_id, AVAILABLE_APPS)
         
         # 店舗情報を取得（現在選択中の店舗）
         store_id = session.get('store_id')
@@ -2456,7 +2502,7 @@ def store_admin_edit(admin_id):
                 admin.can_manage_admins = can_manage_admins
                 
                 if password:
-                    admin.password_hash = generate_password_hash(password)
+                    admin.password_hash = hash_password(password)
                 
                 # 役割変更時の処理
                 if old_role != new_role:
@@ -2812,7 +2858,7 @@ def employee_edit(employee_id):
             employee.role = new_role
             employee.active = active
             if password:
-                employee.password_hash = generate_password_hash(password)
+                employee.password_hash = hash_password(password)
             
             # 役割変更時の処理
             if old_role != new_role:
@@ -2984,22 +3030,7 @@ def store_apps(store_id):
         tenant = db.query(TTenant).filter(TTenant.id == tenant_id).first()
         
         # 店舗レベルで有効なアプリを取得
-        enabled_apps = []
-        
-        for app in AVAILABLE_APPS:
-            if app['scope'] == 'store':
-                app_setting = db.query(TTenpoAppSetting).filter(
-                    and_(
-                        TTenpoAppSetting.store_id == store_id,
-                        TTenpoAppSetting.app_name == app['name']
-                    )
-                ).first()
-                enabled = app_setting.enabled if app_setting else 1
-                
-                if enabled:
-                    enabled_apps.append(app)
-        
-        apps = enabled_apps
+        apps = app_settings.enabled_apps(app_settings.SCOPE_STORE, store_id, AVAILABLE_APPS)
         
         return render_template('tenant_store_apps.html', tenant=tenant, store=store, apps=apps)
     finally:
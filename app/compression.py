@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+レスポンスの圧縮（gzip。brotli パッケージがあれば br を優先）
+
+Heroku のルーターは圧縮しないため、アプリで Content-Encoding を付ける。
+
+- 圧縮するのは HTML・JSON・CSS・JavaScript などのテキストだけ。
+  PDF・ZIP・画像・gzip 済みのエクスポートは、すでに圧縮済みなのでそのまま返す
+- 圧縮レベルは種類とサイズで選ぶ。大きい JSON（preview_pdf の base64 画像）は
+  ほとんど縮まないので、最速のレベルで base64 の冗長分だけを取る
+- ストリーミングのレスポンスは、チャンクごとに圧縮して flush しながら流す
+
+COMPRESS=0 で無効にできる。
+"""
+
+import os
+import zlib
+
+from flask import request
+
+from . import metrics
+
+try:
+    import brotli
+except Exception:
+    brotli = None
+
+ENABLED = os.getenv("COMPRESS", "1") not in ("0", "false", "False")
+
+# これより小さいレスポンスは圧縮しない（ヘッダーと CPU のほうが高くつく）
+MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+
+# これ以上のレスポンスは速さを優先したレベルにする
+LARGE_SIZE = int(os.getenv("COMPRESS_LARGE_SIZE", str(256 * 1024)))
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/x-ndjson",
+    "image/svg+xml",
+)
+
+
+def _levels(mimetype, size):
+    """(gzip のレベル, brotli の quality)"""
+    if size is not None and size >= LARGE_SIZE:
+        if mimetype.endswith("json"):
+            return 1, 1
+        return 4, 4
+    return 6, 5
+
+
+def _choose_encoding():
+    """Accept-Encoding から 'br' / 'gzip' / None を選ぶ"""
+    accept = request.accept_encodings
+    br = accept.quality("br") if brotli is not None else 0
+    gzip = accept.quality("gzip")
+    if br and br >= gzip:
+        return "br"
+    if gzip:
+        return "gzip"
+    return None
+
+
+class _Encoder:
+    """gzip / brotli の圧縮器を同じ形で扱う"""
+
+    def __init__(self, encoding, level):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=level)
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = gzip 形式
+
+    def compress(self, data):
+        return self._compressor.process(data) if self.encoding == "br" else self._compressor.compress(data)
+
+    def flush(self):
+        """ここまでの入力を、受け取った側ですぐに展開できるところまで出す"""
+        if self.encoding == "br":
+            return self._compressor.flush()
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.finish() if self.encoding == "br" else self._compressor.flush()
+
+
+def _compress_stream(chunks, encoder):
+    raw = encoded = 0
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        if not chunk:
+            continue
+        out = encoder.compress(chunk) + encoder.flush()
+        raw += len(chunk)
+        encoded += len(out)
+        if out:
+            yield out
+    out = encoder.finish()
+    encoded += len(out)
+    metrics.observe_compression(encoder.encoding, raw, encoded)
+    yield out
+
+
+def _should_compress(response):
+    if request.method == "HEAD":
+        return False
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if "Content-Encoding" in response.headers:
+        return False
+    if "no-transform" in response.headers.get("Cache-Control", ""):
+        return False
+    mimetype = response.mimetype or ""
+    return mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress_response(response):
+    """条件に合えばレスポンスを圧縮して返す（after_request から呼ぶ）"""
+    if not ENABLED or not _should_compress(response):
+        return response
+    # 圧縮するかどうかで中身が変わるので、キャッシュには Accept-Encoding ごとに分けさせる
+    response.vary.add("Accept-Encoding")
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+
+    streamed = response.is_streamed or response.direct_passthrough
+    size = response.content_length if streamed else len(response.get_data())
+    if size is not None and size < MIN_SIZE:
+        return response
+    gzip_level, brotli_quality = _levels(response.mimetype, size)
+    encoder = _Encoder(encoding, brotli_quality if encoding == "br" else gzip_level)
+
+    if streamed:
+        original = response.response
+        response.response = _compress_stream(original, encoder)
+        response.direct_passthrough = False
+        if hasattr(original, "close"):
+            response.call_on_close(original.close)
+        response.headers.pop("Content-Length", None)
+    else:
+        raw = response.get_data()
+        body = encoder.compress(raw) + encoder.finish()
+        metrics.observe_compression(encoding, len(raw), len(body))
+        response.set_data(body)
+
+    response.headers["Content-Encoding"] = encoding
+    # 強い ETag はバイト列ごとの値なので、圧縮したら弱い ETag にする
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    """
+    after_request フックを登録する
+
+    after_request は登録と逆の順に呼ばれるので、計測（instrumentation）より後に登録すれば
+    リクエストの処理時間に圧縮の時間も含まれる。
+    """
+
+    @app.after_request
+    def _compress(response):
+        return compress_response(response)
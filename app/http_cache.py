@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+条件付き GET（ETag / Last-Modified）と Cache-Control の設定
+
+保存済みの定款のように「検証子（更新日時・内容のハッシュ）は安く取れるが、本文を作るのは高い」
+レスポンスで使う。検証子だけを先に取り出し、ブラウザのキャッシュがまだ有効なら
+本文を作らずに 304 Not Modified を返す。
+
+ログインしているユーザーにしか見せない内容なので、共有キャッシュには保存させない
+（Cache-Control: private）。毎回サーバーに確認させる（no-cache）ことで、更新はすぐに反映される。
+"""
+
+import hashlib
+import os
+from datetime import timezone
+
+from flask import Response, g, request, session
+
+from . import metrics
+
+PRIVATE_REVALIDATE = "private, no-cache"
+
+
+def _build_version():
+    """
+    デプロイごとに変わる値。テンプレートや PDF の描画処理が変わったら ETag も変える。
+    HTTP_CACHE_VERSION / HEROKU_SLUG_COMMIT が無ければ、描画に関わるファイルの更新日時から作る
+    """
+    version = os.getenv("HTTP_CACHE_VERSION") or os.getenv("HEROKU_SLUG_COMMIT")
+    if version:
+        return version
+    root = os.path.dirname(__file__)
+    paths = [os.path.join(root, "blueprints", "teikan.py"),
+             os.path.join(root, "services", "teikan_layout.py"),
+             os.path.join(root, "services", "teikan_document.py")]
+    templates = os.path.join(root, "templates", "teikan")
+    if os.path.isdir(templates):
+        paths.extend(os.path.join(templates, name) for name in sorted(os.listdir(templates)))
+    mtimes = []
+    for path in paths:
+        try:
+            mtimes.append(f"{os.path.getmtime(path):.0f}")
+        except OSError:
+            pass
+    return hashlib.sha1(":".join(mtimes).encode()).hexdigest()[:12]
+
+
+BUILD_VERSION = _build_version()
+
+
+def make_etag(*parts):
+    """
+    parts（リソースの検証子）から ETag を作る
+
+    同じ URL でもユーザーやテナントが変われば画面の内容（ヘッダーの名前や CSRF トークン）が
+    変わるため、セッションのユーザー・テナント・CSRF トークンとデプロイの版も混ぜる。
+    """
+    key = [BUILD_VERSION, session.get("user_id"), session.get("tenant_id"), session.get("csrf_token"), *parts]
+    return hashlib.sha1("\x1f".join(str(p) for p in key).encode("utf-8")).hexdigest()
+
+
+def _as_utc(timestamp):
+    if timestamp is None:
+        return None
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def _apply(response, etag, last_modified, cache_control):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+def not_modified(etag, last_modified=None, cache_control=PRIVATE_REVALIDATE):
+    """
+    ブラウザのキャッシュが有効なら 304 のレスポンスを、そうでなければ None を返す
+
+    If-None-Match があればそれだけで判定し、無ければ If-Modified-Since で判定する（RFC 9110）。
+    表示待ちのフラッシュメッセージがあるときは、それを画面に出すため必ず作り直す。
+    """
+    last_modified = _as_utc(last_modified)
+    g._http_cache_skip = bool(session.get("_flashes"))
+    if g._http_cache_skip:
+        fresh = False
+    elif request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified is not None:
+        fresh = last_modified <= request.if_modified_since
+    else:
+        fresh = False
+
+    if not fresh:
+        metrics.cache_miss("http_conditional")
+        return None
+    metrics.cache_hit("http_conditional")
+    return _apply(Response(status=304), etag, last_modified, cache_control)
+
+
+def set_validators(response, etag, last_modified=None, cache_control=PRIVATE_REVALIDATE):
+    """
+    200 のレスポンスに ETag・Last-Modified・Cache-Control を付ける
+
+    フラッシュメッセージを表示した画面は、次に開いたときに同じメッセージが出ないよう検証子を付けない。
+    """
+    if g.get("_http_cache_skip"):
+        response.headers["Cache-Control"] = cache_control
+        return response
+    return _apply(response, etag, _as_utc(last_modified), cache_control)
+
+
+def mark_private(response):
+    """
+    ファイルのダウンロード（PDF・ZIP）を共有キャッシュに保存させない
+
+    send_file は Cache-Control: no-cache だけを付けるため、private を足す。
+    set_validators() 済みのレスポンスはそのままにする。
+    """
+    if "private" not in response.headers.get("Cache-Control", ""):
+        response.cache_control.public = False
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+リクエスト単位の計測（処理時間・DBクエリ数・PDF描画時間）
+
+- before/after_request フックでリクエスト全体の時間を測る
+- SQLAlchemy（engine のイベント）と get_db() のカーソルでクエリ数と時間を数える
+- generate_*_pdf は span() で描画時間を記録する
+
+集計結果は Server-Timing ヘッダー（ブラウザの開発者ツールで確認できる）と、
+JSON形式のログ1行（logger "app.request"）として出力する。
+"""
+
+import functools
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+from . import metrics
+
+logger = logging.getLogger("app.request")
+
+# この時間（ミリ秒）を超えたリクエストは WARNING で記録する
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+
+# 受け取ったリクエストIDを引き継ぐヘッダー（Heroku のルーターが付ける）
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# 0 にすると Server-Timing ヘッダーを付けない（ログは出力する）
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING", "1") not in ("0", "false", "False")
+
+
+class RequestMetrics:
+    """1リクエスト分の計測値"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_count = 0
+        self.db_ms = 0.0
+        self.spans = {}  # 名前 → [回数, 合計ミリ秒]
+
+    def add_query(self, elapsed_ms):
+        self.db_count += 1
+        self.db_ms += elapsed_ms
+
+    def add_span(self, name, elapsed_ms):
+        entry = self.spans.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed_ms
+
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+
+def current():
+    """処理中のリクエストの計測値（リクエスト外・計測前なら None）"""
+    if has_request_context():
+        return g.get("_request_metrics")
+    return None
+
+
+def record_query(elapsed_ms):
+    req_metrics = current()
+    if req_metrics is not None:
+        req_metrics.add_query(elapsed_ms)
+
+
+@contextmanager
+def span(name):
+    """with span("pdf.teikan"): ... の範囲の時間を記録する"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        req_metrics = current()
+        if req_metrics is not None:
+            req_metrics.add_span(name, (time.perf_counter() - started) * 1000)
+
+
+def traced(name):
+    """
+    関数全体を span(name) で囲むデコレーター
+    name が "pdf.<ジェネレーター名>" のときは生成時間と PDF サイズをメトリクスにも記録する
+    """
+    generator = name[4:] if name.startswith("pdf.") else None
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            with span(name):
+                result = func(*args, **kwargs)
+            if generator:
+                nbytes = len(result) if isinstance(result, (bytes, bytearray)) else None
+                metrics.observe_render(generator, time.perf_counter() - started, nbytes)
+            return result
+        return wrapper
+    return decorator
+
+
+# ========================================
+# SQLAlchemy
+# ========================================
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get("_query_started")
+    if stack:
+        record_query((time.perf_counter() - stack.pop()) * 1000)
+
+
+def instrument_engine(engine):
+    """SQLAlchemy エンジンのクエリを計測対象にする（同じエンジンへの二重登録はしない）"""
+    from sqlalchemy import event
+
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ========================================
+# get_db()（psycopg2 / sqlite3）
+# ========================================
+
+def _timed(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            record_query((time.perf_counter() - started) * 1000)
+    return wrapper
+
+
+class TimedSqliteCursor(sqlite3.Cursor):
+    execute = _timed(sqlite3.Cursor.execute)
+    executemany = _timed(sqlite3.Cursor.executemany)
+
+
+class TimedSqliteConnection(sqlite3.Connection):
+    """cursor() / execute() が TimedSqliteCursor を使う sqlite3 接続"""
+
+    def cursor(self, factory=TimedSqliteCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+
+_pg_cursor_class = None
+
+
+def pg_cursor_factory():
+    """psycopg2.connect(cursor_factory=...) に渡す計測付きカーソルクラス"""
+    global _pg_cursor_class
+    if _pg_cursor_class is None:
+        import psycopg2.extensions
+
+        base = psycopg2.extensions.cursor
+        _pg_cursor_class = type("TimedPgCursor", (base,), {
+            "execute": _timed(base.execute),
+            "executemany": _timed(base.executemany),
+        })
+    return _pg_cursor_class
+
+
+# ========================================
+# Flask
+# ========================================
+
+def server_timing(req_metrics, total_ms):
+    """Server-Timing ヘッダーの値を組み立てる"""
+    parts = [f"total;dur={total_ms:.1f}"]
+    parts.append(f'db;dur={req_metrics.db_ms:.1f};desc="{req_metrics.db_count} queries"')
+    for name, (count, elapsed_ms) in req_metrics.spans.items():
+        desc = f';desc="x{count}"' if count > 1 else ""
+        parts.append(f"{name};dur={elapsed_ms:.1f}{desc}")
+    return ", ".join(parts)
+
+
+def init_app(app):
+    """リクエストフックを登録し、SQLAlchemy エンジンを計測対象にする"""
+    from .db import engine
+
+    instrument_engine(engine)
+    metrics.instrument_pool(engine)
+
+    @app.before_request
+    def _start_request_metrics():
+        g._request_metrics = RequestMetrics()
+        # ログの request_id（app/logging.py の RequestIdFilter が付ける）
+        incoming = request.headers.get(REQUEST_ID_HEADER, "")
+        g.request_id = incoming[:64] if incoming.isprintable() and incoming else uuid.uuid4().hex
+
+    @app.after_request
+    def _finish_request_metrics(response):
+        req_metrics = g.pop("_request_metrics", None)
+        if req_metrics is None:
+            return response
+        response.headers[REQUEST_ID_HEADER] = g.request_id
+        total_ms = req_metrics.total_ms()
+        metrics.observe_request(request.blueprint, request.endpoint, request.method,
+                                response.status_code, total_ms / 1000)
+        if SERVER_TIMING_ENABLED:
+            response.headers["Server-Timing"] = server_timing(req_metrics, total_ms)
+
+        fields = {
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "duration_ms": round(total_ms, 1),
+            "db_queries": req_metrics.db_count,
+            "db_ms": round(req_metrics.db_ms, 1),
+        }
+        if req_metrics.spans:
+            fields["spans"] = {name: round(ms, 1) for name, (_, ms) in req_metrics.spans.items()}
+        level = logging.WARNING if total_ms >= SLOW_REQUEST_MS else logging.INFO
+        logger.log(level, "request", extra={"fields": fields})
+        return response
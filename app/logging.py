@@ -1,6 +1,23 @@
+import atexit
 import json
 import logging
+import os
+import queue
+import random
 import sys
+from logging.handlers import QueueHandler, QueueListener
+
+# キューの上限（書き込みが追いつかない場合は溢れた分を捨て、リクエストを待たせない）
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# 書き込みスレッドが1回にまとめて出力する最大件数
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "256"))
+
+# DEBUG ログを残す割合（0〜1）。ループ内など頻繁に出る DEBUG ログの量を抑える
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1"))
+
+_listener = None
+
 
 class JsonFormatter(logging.Formatter):
     def format(self, record):
@@ -9,17 +26,162 @@ class JsonFormatter(logging.Formatter):
             "message": record.getMessage(),
             "logger": record.name,
         }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            base["request_id"] = request_id
+        # logger.info("...", extra={"fields": {...}}) の項目をそのまま出力に含める
+        fields = getattr(record, "fields", None)
+        if isinstance(fields, dict):
+            base.update(fields)
         if record.exc_info:
             base["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            base["exc_info"] = record.exc_text
         return json.dumps(base, ensure_ascii=False)
 
+
+class RequestIdFilter(logging.Filter):
+    """処理中のリクエストの ID（flask.g.request_id）をレコードに付ける"""
+
+    def filter(self, record):
+        if getattr(record, "request_id", None) is None:
+            try:
+                from flask import g, has_request_context
+                record.request_id = g.get("request_id") if has_request_context() else None
+            except Exception:
+                record.request_id = None
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """DEBUG 以下のレコードだけを rate の割合で通す（INFO 以上は常に通す）"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    呼び出し元のスレッドではレコードをキューに積むだけにする
+    キューが満杯なら待たずに捨て、捨てた件数を数えておく
+    """
+
+    dropped = 0
+
+    def prepare(self, record):
+        # 書き込みスレッドで JSON にできるよう、メッセージと例外だけ文字列化しておく
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+class BatchingQueueListener(QueueListener):
+    """キューに溜まっているレコードをまとめて取り出し、1回の write/flush で出力する"""
+
+    def dequeue(self, block):
+        first = self.queue.get(block)
+        if first is self._sentinel:
+            return first
+        batch = [first]
+        while len(batch) < LOG_BATCH_SIZE:
+            try:
+                record = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            self.queue.task_done()
+            if record is self._sentinel:
+                # 停止の合図は次の dequeue で受け取る
+                self.queue.put(record)
+                break
+            batch.append(record)
+        return batch
+
+    def enqueue_sentinel(self):
+        # キューが満杯でも停止の合図は確実に届ける
+        self.queue.put(self._sentinel)
+
+    def handle(self, batch):
+        for handler in self.handlers:
+            lines = []
+            for record in batch:
+                if record.levelno >= handler.level:
+                    try:
+                        lines.append(handler.format(record))
+                    except Exception:
+                        handler.handleError(record)
+            if not lines:
+                continue
+            handler.acquire()
+            try:
+                handler.stream.write("\n".join(lines) + "\n")
+                handler.flush()
+            except Exception:
+                handler.handleError(batch[-1])
+            finally:
+                handler.release()
+
+
+def stop_logging() -> None:
+    """書き込みスレッドを止め、キューに残ったログを出力し切る"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def restart_after_fork() -> None:
+    """
+    fork した子プロセスで書き込みスレッドを作り直す（スレッドは fork で引き継がれない）
+    gunicorn の preload_app 使用時に post_fork から呼ぶ
+    """
+    global _listener
+    if _listener is None:
+        return
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, NonBlockingQueueHandler):
+            handler.queue = log_queue
+    _listener = BatchingQueueListener(log_queue, *_listener.handlers)
+    _listener.start()
+
+
 def setup_logging(debug: bool = False) -> None:
     """
     ルートロガーを初期化して、標準出力にJSON形式でログを流します。
+    リクエスト処理のスレッドはキューに積むだけで、出力はバックグラウンドのスレッドがまとめて行います。
     """
+    stop_logging()
+
+    stream_handler = logging.StreamHandler(stream=sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(DebugSamplingFilter(LOG_DEBUG_SAMPLE_RATE))
+    handler.addFilter(RequestIdFilter())
+
     root = logging.getLogger()
     root.handlers.clear()
     root.setLevel(logging.DEBUG if debug else logging.INFO)
-    handler = logging.StreamHandler(stream=sys.stdout)
-    handler.setFormatter(JsonFormatter())
     root.addHandler(handler)
+
+    global _listener
+    _listener = BatchingQueueListener(log_queue, stream_handler)
+    _listener.start()
+
+
+atexit.register(stop_logging)
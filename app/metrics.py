@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Prometheus 形式のメトリクス（/metrics で公開）
+
+- リクエスト処理時間（ブループリント・エンドポイント別のヒストグラム）
+- PDF 生成時間とサイズ（ジェネレーター別）
+- テンプレートの描画時間（テンプレート別）
+- DB コネクションプールの使用数
+- キャッシュのヒット／ミス
+- 自動下書き保存・定款の完成保存・ZIP 一式ダウンロードの件数
+- レスポンス圧縮の前後のバイト数（エンコーディング別）
+- 重い処理の受け付け結果・描画スロットの待ち時間と使用数（app/admission.py）
+- ログインの所要時間（ロール・結果別）とパスワードのハッシュ計算時間
+
+gunicorn の複数ワーカーで動かす場合は、環境変数 PROMETHEUS_MULTIPROC_DIR に
+共有ディレクトリを指定する（gunicorn.conf.py が既定値を設定する）。各ワーカーは
+値を mmap ファイルに書き込み、/metrics を受けたワーカーが全ファイルを集計して返す。
+prometheus_client が無い環境では、記録は何もせず /metrics は 503 を返す。
+"""
+
+import os
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Gauge, Histogram
+except Exception:
+    prometheus_client = None
+
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+_RENDER_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_SIZE_BUCKETS = (10_000, 30_000, 100_000, 300_000, 1_000_000, 3_000_000, 10_000_000)
+
+if prometheus_client:
+    REQUEST_DURATION = Histogram(
+        "teikan_request_duration_seconds", "リクエスト処理時間",
+        ["blueprint", "endpoint", "method"], buckets=_LATENCY_BUCKETS,
+    )
+    REQUESTS = Counter(
+        "teikan_requests", "リクエスト数（ステータスコード別）",
+        ["blueprint", "endpoint", "status"],
+    )
+    RENDER_DURATION = Histogram(
+        "teikan_pdf_render_duration_seconds", "PDF 生成時間",
+        ["generator"], buckets=_RENDER_BUCKETS,
+    )
+    RENDER_BYTES = Histogram(
+        "teikan_pdf_render_bytes", "生成した PDF のサイズ",
+        ["generator"], buckets=_SIZE_BUCKETS,
+    )
+    TEMPLATE_DURATION = Histogram(
+        "teikan_template_render_duration_seconds", "テンプレートの描画時間",
+        ["template"], buckets=_LATENCY_BUCKETS,
+    )
+    DB_POOL_CHECKED_OUT = Gauge(
+        "teikan_db_pool_checked_out", "使用中の DB コネクション数（SQLAlchemy）",
+        multiprocess_mode="livesum",
+    )
+    DB_POOL_SIZE = Gauge(
+        "teikan_db_pool_size", "DB コネクションプールのサイズ（SQLAlchemy）",
+        multiprocess_mode="livesum",
+    )
+    CACHE_REQUESTS = Counter(
+        "teikan_cache_requests", "キャッシュ参照数（result=hit/miss）",
+        ["cache", "result"],
+    )
+    AUTOSAVES = Counter("teikan_autosaves", "自動下書き保存の件数")
+    COMPLETED = Counter("teikan_documents_completed", "完成保存された定款の件数")
+    ZIP_BUNDLES = Counter("teikan_zip_bundles", "登記書類一式 ZIP の生成件数")
+    COMPRESSION_BYTES = Counter(
+        "teikan_response_compression_bytes", "圧縮したレスポンスのバイト数（stage=raw/encoded）",
+        ["encoding", "stage"],
+    )
+    ADMISSIONS = Counter(
+        "teikan_admissions", "重い処理の受け付け結果（result=admitted/user/tenant/busy）",
+        ["result"],
+    )
+    RENDER_WAIT = Histogram(
+        "teikan_render_slot_wait_seconds", "描画スロットが空くまでの待ち時間",
+        buckets=_LATENCY_BUCKETS,
+    )
+    LOGIN_DURATION = Histogram(
+        "teikan_login_duration_seconds", "ログインの所要時間（result=ok/failed/throttled/busy）",
+        ["role", "result"], buckets=_LATENCY_BUCKETS,
+    )
+    PASSWORD_HASH_DURATION = Histogram(
+        "teikan_password_hash_duration_seconds", "パスワードのハッシュ計算時間（operation=verify/rehash）",
+        ["operation"], buckets=_LATENCY_BUCKETS,
+    )
+    RENDERS_IN_FLIGHT = Gauge(
+        "teikan_renders_in_flight", "描画スロットを使っている処理の数",
+        multiprocess_mode="livesum",
+    )
+
+
+# ========================================
+# 記録
+# ========================================
+
+def observe_request(blueprint, endpoint, method, status, seconds):
+    if prometheus_client:
+        blueprint, endpoint = blueprint or "", endpoint or "unmatched"
+        REQUEST_DURATION.labels(blueprint, endpoint, method).observe(seconds)
+        REQUESTS.labels(blueprint, endpoint, str(status)).inc()
+
+
+def observe_render(generator, seconds, nbytes=None):
+    if prometheus_client:
+        RENDER_DURATION.labels(generator).observe(seconds)
+        if nbytes is not None:
+            RENDER_BYTES.labels(generator).observe(nbytes)
+
+
+def observe_template(template, seconds):
+    if prometheus_client:
+        TEMPLATE_DURATION.labels(template).observe(seconds)
+
+
+def cache_hit(cache):
+    if prometheus_client:
+        CACHE_REQUESTS.labels(cache, "hit").inc()
+
+
+def cache_miss(cache):
+    if prometheus_client:
+        CACHE_REQUESTS.labels(cache, "miss").inc()
+
+
+def count_autosave():
+    if prometheus_client:
+        AUTOSAVES.inc()
+
+
+def count_completed():
+    if prometheus_client:
+        COMPLETED.inc()
+
+
+def count_zip_bundle():
+    if prometheus_client:
+        ZIP_BUNDLES.inc()
+
+
+def observe_compression(encoding, raw_bytes, encoded_bytes):
+    if prometheus_client:
+        COMPRESSION_BYTES.labels(encoding, "raw").inc(raw_bytes)
+        COMPRESSION_BYTES.labels(encoding, "encoded").inc(encoded_bytes)
+
+
+def count_admission(result):
+    if prometheus_client:
+        ADMISSIONS.labels(result).inc()
+
+
+def observe_render_wait(seconds):
+    if prometheus_client:
+        RENDER_WAIT.observe(seconds)
+
+
+def render_started():
+    if prometheus_client:
+        RENDERS_IN_FLIGHT.inc()
+
+
+def render_finished():
+    if prometheus_client:
+        RENDERS_IN_FLIGHT.dec()
+
+
+def observe_login(role, result, seconds):
+    if prometheus_client:
+        LOGIN_DURATION.labels(role, result).observe(seconds)
+
+
+def observe_password_hash(operation, seconds):
+    if prometheus_client:
+        PASSWORD_HASH_DURATION.labels(operation).observe(seconds)
+
+
+def instrument_pool(engine):
+    """SQLAlchemy のプールのチェックアウト／チェックインを使用数ゲージに反映する"""
+    if not prometheus_client:
+        return
+    from sqlalchemy import event
+
+    size = getattr(engine.pool, "size", None)
+    if callable(size):
+        DB_POOL_SIZE.set(size())
+    if not event.contains(engine, "checkout", _on_checkout):
+        event.listen(engine, "checkout", _on_checkout)
+        event.listen(engine, "checkin", _on_checkin)
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_CHECKED_OUT.inc()
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    DB_POOL_CHECKED_OUT.dec()
+
+
+# ========================================
+# 出力
+# ========================================
+
+def render_latest():
+    """
+    (本文, Content-Type) を返す。prometheus_client が無ければ None
+    マルチプロセスモードでは共有ディレクトリの全ワーカー分を集計する
+    """
+    if not prometheus_client:
+        return None
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest
+
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
@@ -141,7 +141,7 @@ def migrate_store_admins_data(db):
             'SELECT COUNT(*) FROM "T_管理者_店舗"'
         ))
         existing_count = result.scalar()
-        logger.info(f"DEBUG: T_管理者_店舗テーブルの既存データ数: {existing_count}")
+        logger.debug(f"T_管理者_店舗テーブルの既存データ数: {existing_count}")
         
         # 既存データがある場合、直接オーナー設定に進む
         if existing_count > 0:
@@ -158,7 +158,7 @@ def migrate_store_admins_data(db):
             for admin in admins:
                 admin_id = admin[0]
                 tenant_id = admin[1]
-                logger.info(f"DEBUG: 処理中 admin_id={admin_id}, tenant_id={tenant_id}")
+                logger.debug(f"処理中 admin_id={admin_id}, tenant_id={tenant_id}")
                 
                 try:
                     # このテナントの店舗を取得
@@ -166,11 +166,11 @@ def migrate_store_admins_data(db):
                         'SELECT "id" FROM "T_店舗" WHERE "tenant_id" = :tenant_id'
                     ), {"tenant_id": tenant_id})
                     stores = result.fetchall()
-                    logger.info(f"DEBUG: tenant_id={tenant_id} の店舗数: {len(stores)}")
+                    logger.debug(f"tenant_id={tenant_id} の店舗数: {len(stores)}")
                     
                     for store in stores:
                         store_id = store[0]
-                        logger.info(f"DEBUG: 店舗 store_id={store_id} を処理中")
+                        logger.debug(f"店舗 store_id={store_id} を処理中")
                         
                         # 中間テーブルに既に登録されているか確認
                         result = db.execute(text(
@@ -178,7 +178,7 @@ def migrate_store_admins_data(db):
                             'WHERE "admin_id" = :admin_id AND "store_id" = :store_id'
                         ), {"admin_id": admin_id, "store_id": store_id})
                         exists = result.scalar()
-                        logger.info(f"DEBUG: admin_id={admin_id}, store_id={store_id} の存在チェック: exists={exists}")
+                        logger.debug(f"admin_id={admin_id}, store_id={store_id} の存在チェック: exists={exists}")
                         
                         if exists == 0:
                             # 中間テーブルに登録
@@ -188,9 +188,9 @@ def migrate_store_admins_data(db):
                                 'VALUES (:admin_id, :store_id, 0, 0, 1)'
                             ), {"admin_id": admin_id, "store_id": store_id})
                             db.commit()
-                            logger.info(f"DEBUG: 登録完了 admin_id={admin_id}, store_id={store_id}")
+                            logger.debug(f"登録完了 admin_id={admin_id}, store_id={store_id}")
                         else:
-                            logger.info(f"DEBUG: スキップ (既に登録済み) admin_id={admin_id}, store_id={store_id}")
+                            logger.debug(f"スキップ (既に登録済み) admin_id={admin_id}, store_id={store_id}")
                 except Exception as e:
                     logger.error(f"ERROR: admin_id={admin_id} の処理中にエラー: {e}")
                     db.rollback()
@@ -211,7 +211,7 @@ def migrate_store_admins_data(db):
             store_ids = [row[0] for row in result.fetchall()]
             
             for store_id in store_ids:
-                logger.info(f"DEBUG: 店舗ID {store_id} のオーナーチェック開始")
+                logger.debug(f"店舗ID {store_id} のオーナーチェック開始")
                 
                 try:
                     # この店舗にオーナーがいるか確認
@@ -220,7 +220,7 @@ def migrate_store_admins_data(db):
                         'WHERE "store_id" = :store_id AND "is_owner" = 1'
                     ), {"store_id": store_id})
                     owner_count = result.scalar()
-                    logger.info(f"DEBUG: 店舗ID {store_id} のオーナー数: {owner_count}")
+                    logger.debug(f"店舗ID {store_id} のオーナー数: {owner_count}")
                     
                     if owner_count == 0:
                         # オーナーがいない場合、最初の管理者をオーナーに設定
@@ -232,7 +232,7 @@ def migrate_store_admins_data(db):
                             'WHERE "store_id" = :store_id'
                         ), {"store_id": store_id})
                         first_admin_id = result.scalar()
-                        logger.info(f"DEBUG: 店舗ID {store_id} の最初の管理者ID: {first_admin_id}")
+                        logger.debug(f"店舗ID {store_id} の最初の管理者ID: {first_admin_id}")
                         
                         if first_admin_id:
                             db.execute(text(
@@ -245,7 +245,7 @@ def migrate_store_admins_data(db):
                         else:
                             logger.warning(f"WARNING: 店舗ID {store_id} に管理者がいません")
                     else:
-                        logger.info(f"DEBUG: 店舗ID {store_id} には既にオーナーがいます")
+                        logger.debug(f"店舗ID {store_id} には既にオーナーがいます")
                 except Exception as e:
                     logger.error(f"ERROR: 店舗ID {store_id} のオーナー設定中にエラー: {e}")
                     db.rollback()
@@ -1,7 +1,7 @@
 """
 login-system-app用のSQLAlchemyモデル
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, ForeignKey, Boolean, LargeBinary, UniqueConstraint
 from sqlalchemy.sql import func
 from app.db import Base
 
@@ -150,3 +150,86 @@ class TeikanDocument(Base):
     data_json = Column(Text, nullable=False)   # 全入力データをJSON文字列で保存
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class TeikanStatusRollup(Base):
+    """T_定款集計（テナント×法人形態×状態ごとの現在の定款数。app/services/rollups.py が更新する）"""
+    __tablename__ = 'T_定款集計'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    tenant_id = Column(Integer, nullable=False, default=0)  # 0 = テナント未選択で作成された定款
+    company_type = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False)
+    documents = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (UniqueConstraint('tenant_id', 'company_type', 'status'),)
+
+
+class TeikanDailyRollup(Base):
+    """T_定款集計_日次（テナント×日ごとの作成・完成・削除・ダウンロード数）"""
+    __tablename__ = 'T_定款集計_日次'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    tenant_id = Column(Integer, nullable=False, default=0)
+    day = Column(Date, nullable=False)
+    documents_created = Column(Integer, nullable=False, default=0)
+    documents_completed = Column(Integer, nullable=False, default=0)
+    documents_deleted = Column(Integer, nullable=False, default=0)
+    pdf_downloads = Column(Integer, nullable=False, default=0)
+    zip_downloads = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (UniqueConstraint('tenant_id', 'day'),)
+
+
+class TeikanRevision(Base):
+    """T_定款履歴（定款ごとの版。スナップショットと差分の連なりで保存する。app/services/revisions.py）"""
+    __tablename__ = 'T_定款履歴'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    document_id = Column(Integer, nullable=False, index=True)  # 定款の削除時は revisions.forget で消す
+    tenant_id = Column(Integer, nullable=True)
+    revision = Column(Integer, nullable=False)
+    kind = Column(String(10), nullable=False)  # 'snapshot'=全体, 'delta'=直前の版からの差分
+    base_revision = Column(Integer, nullable=False)  # 復元の起点になるスナップショットの版
+    payload = Column(LargeBinary, nullable=False)  # zlib 圧縮した JSON
+    data_hash = Column(String(64), nullable=False)
+    data_size = Column(Integer, nullable=False, default=0)  # 圧縮前の JSON のバイト数
+    status = Column(String(20), nullable=False, default='draft')
+    created_by = Column(Integer, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (UniqueConstraint('document_id', 'revision'),)
+
+
+class TDeleteJob(Base):
+    """T_削除ジョブ（テナント／店舗のカスケード削除の進捗。app/services/cascade_delete.py）"""
+    __tablename__ = 'T_削除ジョブ'
+
+    id = Column(String(32), primary_key=True)
+    scope = Column(String(10), nullable=False)  # 'tenant' / 'store'
+    target_id = Column(Integer, nullable=False)
+    batch_size = Column(Integer, nullable=False)
+    status = Column(String(10), nullable=False, default='running')  # 'running' / 'done' / 'error'
+    current_step = Column(String(100), nullable=True)
+    deleted_json = Column(Text, nullable=False, default='{}')  # {ラベル: 件数}
+    error = Column(Text, nullable=True)
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=False)  # 実行中のスレッドがバッチごとに更新する
+
+
+class TBulkImportJob(Base):
+    """T_一括登録ジョブ（従業員／店舗管理者のCSV一括登録の進捗。app/services/bulk_user_import.py）"""
+    __tablename__ = 'T_一括登録ジョブ'
+
+    id = Column(String(32), primary_key=True)
+    tenant_id = Column(Integer, nullable=True)
+    kind = Column(String(20), nullable=False)  # 'employee' / 'store_admin'
+    status = Column(String(10), nullable=False, default='running')  # 'running' / 'done' / 'error'
+    total = Column(Integer, nullable=False, default=0)
+    hashed = Column(Integer, nullable=False, default=0)  # パスワードのハッシュ化が済んだ件数
+    created = Column(Integer, nullable=False, default=0)  # 登録した件数（完了時）
+    error = Column(Text, nullable=True)
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=False)  # 実行中のスレッドがハッシュ化の区切りごとに更新する
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+遅いリクエストのプロファイル取得
+
+次のどちらかのとき、リクエストの処理中のスタックを記録してファイルに保存する。
+
+- システム管理者が X-Profile: 1 ヘッダーまたは ?_profile=1 を付けてアクセスしたとき
+  （cProfile による関数ごとの集計も取る）
+- 環境変数 PROFILE_SLOW_MS を設定し、処理時間がその値を超えたとき
+  （常時サンプリングし、閾値を超えたリクエストだけ保存する）
+
+スタックはサンプリングスレッドが一定間隔で sys._current_frames() から採取し、
+flamegraph.pl や speedscope でそのまま読める collapsed 形式（.folded）で保存する。
+generate_*_pdf や _pdf_to_preview_images の内部もリクエストのスレッド上で動くため、
+そのまま記録される。保存したプロファイルはシステム管理者画面から一覧・ダウンロードできる。
+"""
+
+import cProfile
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import g, request, session
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# 0 のときは閾値による自動取得を行わない
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+
+# 保存しておくプロファイルの上限（古いものから削除）
+MAX_PROFILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+REQUEST_HEADER = "X-Profile"
+QUERY_FLAG = "_profile"
+
+# ダウンロードできる種類 → (拡張子, MIMEタイプ)
+KINDS = {
+    "folded": (".folded", "text/plain"),
+    "prof": (".prof", "application/octet-stream"),
+}
+
+_ID_RE = re.compile(r"^[0-9A-Za-z_-]+$")
+_seq = itertools.count(1)
+
+
+# ========================================
+# サンプリング
+# ========================================
+
+def _collapse(frame):
+    """フレームを呼び出し元から順に ; で連結した1行にする"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    names.reverse()
+    return ";".join(names)
+
+
+class StackSampler:
+    """登録されたスレッドのスタックを一定間隔で採取する（対象がいない間は停止して待つ）"""
+
+    def __init__(self, interval):
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._targets = {}  # スレッドID → Counter(スタック → サンプル数)
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self, ident):
+        with self._lock:
+            self._targets[ident] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+            self._wakeup.set()
+
+    def stop(self, ident):
+        """採取を終えて、そのスレッドのサンプルを返す"""
+        with self._lock:
+            return self._targets.pop(ident, None)
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            self._wakeup.wait()
+            with self._lock:
+                if not self._targets:
+                    self._wakeup.clear()
+                    continue
+                frames = sys._current_frames()
+                for ident, samples in self._targets.items():
+                    frame = frames.get(ident)
+                    if frame is not None and ident != me:
+                        samples[_collapse(frame)] += 1
+            del frames
+            time.sleep(self._interval)
+
+
+_sampler = StackSampler(SAMPLE_INTERVAL)
+
+
+# ========================================
+# 保存・一覧
+# ========================================
+
+def _prune():
+    metas = sorted(f for f in os.listdir(PROFILE_DIR) if f.endswith(".json"))
+    for name in metas[:max(0, len(metas) - MAX_PROFILES)]:
+        profile_id = name[:-5]
+        for ext in [".json"] + [ext for ext, _ in KINDS.values()]:
+            try:
+                os.remove(os.path.join(PROFILE_DIR, profile_id + ext))
+            except OSError:
+                pass
+
+
+def save_profile(meta, samples, profiler=None):
+    """プロファイルを保存して ID を返す"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile_id = f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}-{next(_seq)}"
+    base = os.path.join(PROFILE_DIR, profile_id)
+
+    with open(base + ".folded", "w", encoding="utf-8") as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+    kinds = ["folded"]
+    if profiler is not None:
+        profiler.dump_stats(base + ".prof")
+        kinds.append("prof")
+
+    meta = dict(meta, id=profile_id, samples=sum(samples.values()), kinds=kinds,
+                created_at=datetime.now().isoformat(timespec="seconds"))
+    # メタ情報は最後に書く（一覧に出るのは中身が揃ってから）
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    _prune()
+    return profile_id
+
+
+def list_profiles():
+    """保存済みプロファイルのメタ情報（新しい順）"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name), encoding="utf-8") as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def profile_path(profile_id, kind):
+    """ダウンロード用のファイルパス（不正なIDや存在しなければ None）"""
+    if kind not in KINDS or not _ID_RE.match(profile_id or ""):
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id + KINDS[kind][0])
+    return path if os.path.exists(path) else None
+
+
+# ========================================
+# Flask
+# ========================================
+
+def _requested():
+    flag = request.headers.get(REQUEST_HEADER) or request.args.get(QUERY_FLAG)
+    return flag in ("1", "true") and session.get("role") == "system_admin"
+
+
+def init_app(app):
+    """リクエストフックを登録する"""
+
+    @app.before_request
+    def _start_profile():
+        explicit = _requested()
+        if not explicit and PROFILE_SLOW_MS <= 0:
+            return
+        state = {"started": time.perf_counter(), "explicit": explicit, "profiler": None}
+        if explicit:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                state["profiler"] = profiler
+            except ValueError:
+                # 他のプロファイラが動作中（デバッガ等）ならサンプリングだけ行う
+                pass
+        _sampler.start(threading.get_ident())
+        g._profile = state
+
+    @app.after_request
+    def _finish_profile(response):
+        state = g.pop("_profile", None)
+        if state is None:
+            return response
+        elapsed_ms = (time.perf_counter() - state["started"]) * 1000
+        profiler = state["profiler"]
+        if profiler is not None:
+            profiler.disable()
+        samples = _sampler.stop(threading.get_ident())
+        if samples is None or not (state["explicit"] or elapsed_ms >= PROFILE_SLOW_MS):
+            return response
+        try:
+            profile_id = save_profile({
+                "method": request.method,
+                "path": request.full_path.rstrip("?"),
+                "endpoint": request.endpoint,
+                "status": response.status_code,
+                "duration_ms": round(elapsed_ms, 1),
+                "trigger": "request" if state["explicit"] else "slow",
+                "tenant_id": session.get("tenant_id"),
+            }, samples, profiler)
+            response.headers["X-Profile-Id"] = profile_id
+        except Exception as e:
+            print(f"⚠️ プロファイル保存エラー: {e}")
+        return response
+
+    @app.teardown_request
+    def _cleanup_profile(exc):
+        # 例外で after_request が呼ばれなかった場合の後始末
+        state = g.pop("_profile", None)
+        if state is not None:
+            if state["profiler"] is not None:
+                state["profiler"].disable()
+            _sampler.stop(threading.get_ident())
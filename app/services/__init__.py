@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""
+サービスモジュール
+Blueprint から利用する業務ロジック（一括処理・インデックス等）をまとめる
+"""
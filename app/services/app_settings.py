@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+アプリの有効／無効（T_テナントアプリ設定・T_店舗アプリ設定）の解決
+
+テナントまたは店舗ごとの設定を1回のクエリでまとめて読み込み、AVAILABLE_APPS の
+既定値（設定が無いアプリは有効）とメモリ上で突き合わせる。
+
+- 同じリクエスト内では flask.g に保持した結果を使う
+- リクエストをまたいでプロセス内に CACHE_SECONDS 秒保持する
+- 設定を更新したワーカーでは invalidate() で即座に捨てる
+  （他のワーカーには CACHE_SECONDS 秒以内に反映される）
+"""
+
+import os
+import threading
+import time
+
+from sqlalchemy import select
+
+from app import metrics
+from app.db import SessionLocal
+from app.models_login import TTenantAppSetting, TTenpoAppSetting
+
+CACHE_SECONDS = float(os.getenv("APP_SETTINGS_CACHE_SECONDS", "30"))
+
+SCOPE_TENANT = 'tenant'
+SCOPE_STORE = 'store'
+
+# スコープ → (設定のモデル, 対象IDの列)
+_MODELS = {
+    SCOPE_TENANT: (TTenantAppSetting, TTenantAppSetting.tenant_id),
+    SCOPE_STORE: (TTenpoAppSetting, TTenpoAppSetting.store_id),
+}
+
+# (スコープ, 対象ID) → (有効期限, {アプリ名: enabled})
+_cache = {}
+_lock = threading.Lock()
+
+
+def _request_memo():
+    """リクエスト中ならそのリクエスト用の dict、そうでなければ None"""
+    from flask import g, has_request_context
+
+    if not has_request_context():
+        return None
+    memo = g.get('_app_settings')
+    if memo is None:
+        memo = g._app_settings = {}
+    return memo
+
+
+def load(scope, owner_ids):
+    """
+    対象（テナントまたは店舗）ごとの設定を {対象ID: {アプリ名: enabled}} で返す
+    キャッシュに無い対象の分だけを1回のクエリでまとめて読み込む
+    """
+    memo = _request_memo()
+    result = {}
+    missing = []
+    now = time.monotonic()
+    with _lock:
+        for owner_id in dict.fromkeys(owner_ids):
+            key = (scope, owner_id)
+            if memo is not None and key in memo:
+                result[owner_id] = memo[key]
+                continue
+            cached = _cache.get(key)
+            if cached and cached[0] > now:
+                result[owner_id] = cached[1]
+            else:
+                missing.append(owner_id)
+
+    if missing:
+        metrics.cache_miss('app_settings')
+        model, owner_col = _MODELS[scope]
+        loaded = {owner_id: {} for owner_id in missing}
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                select(owner_col, model.app_name, model.enabled).where(owner_col.in_(missing))
+            ).all()
+        finally:
+            db.close()
+        for owner_id, app_name, enabled in rows:
+            loaded[owner_id][app_name] = enabled
+        expires = time.monotonic() + CACHE_SECONDS
+        with _lock:
+            for owner_id, settings in loaded.items():
+                _cache[(scope, owner_id)] = (expires, settings)
+        result.update(loaded)
+    elif result:
+        metrics.cache_hit('app_settings')
+
+    if memo is not None:
+        for owner_id, settings in result.items():
+            memo[(scope, owner_id)] = settings
+    return result
+
+
+def enabled_map(scope, owner_id, apps):
+    """apps のうち scope のアプリについて {アプリ名: enabled} を返す（設定が無ければ 1）"""
+    scoped = [app for app in apps if app['scope'] == scope]
+    if not scoped or not owner_id:
+        return {app['name']: 1 for app in scoped}
+    settings = load(scope, [owner_id])[owner_id]
+    return {app['name']: settings.get(app['name'], 1) for app in scoped}
+
+
+def enabled_apps(scope, owner_id, apps):
+    """apps のうち scope のアプリで、対象に対して有効なものを返す"""
+    enabled = enabled_map(scope, owner_id, apps)
+    return [app for app in apps if app['scope'] == scope and enabled[app['name']]]
+
+
+def invalidate(scope=None, owner_id=None):
+    """キャッシュを捨てる（引数なしなら全部、scope のみならそのスコープの全対象）"""
+    memo = _request_memo()
+    with _lock:
+        for store in (_cache, memo or {}):
+            for key in list(store):
+                if (scope is None or key[0] == scope) and (owner_id is None or key[1] == owner_id):
+                    del store[key]
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""
+従業員／店舗管理者のCSV一括登録
+
+1. CSVを読み込み、全行を先にバリデーションする（1件でもエラーがあれば登録しない）
+2. 既存ログインIDの重複を1回のクエリで検出する
+3. パスワードをハッシュ化する（ログインと同じハッシュ計算用のスレッドを少しずつ使う）
+4. ユーザーと店舗との紐付けを一定件数ごとにまとめて INSERT する
+
+1〜2 はリクエスト内で行い、3〜4 は start_job でバックグラウンドのスレッドに回す
+（ハッシュ化は1件あたり 0.1 秒ほどかかり、数百件でルーターのタイムアウトを超えるため）。
+進捗は T_一括登録ジョブ に保存する。登録は最後に1回だけコミットするので、ワーカーの再起動などで
+止まったジョブは何も登録されていない。JOB_STALE_SECONDS 以上進捗が途絶えたジョブは get_job で
+エラーにする（パスワードを DB に残さないため、引き継いでの再開はしない）。
+
+CSVの列（1行目はヘッダー）:
+    login_id, name, email, password, stores
+    stores は店舗のID・slug・名称のいずれかを「;」区切りで指定（空なら作成元の店舗）
+"""
+
+import csv
+import io
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, insert, update, func, or_
+
+from app.db import SessionLocal, engine
+from app.models_login import (
+    TKanrisha, TJugyoin, TTenpo, TKanrishaTenpo, TJugyoinTenpo, TBulkImportJob,
+)
+from app.services import login
+from app.utils.decorators import ROLES
+
+# 1回の INSERT にまとめる行数
+CHUNK_SIZE = 200
+
+# 1ファイルで登録できる最大行数
+MAX_ROWS = 5000
+
+JOB_STALE_SECONDS = int(os.getenv("BULK_IMPORT_JOB_STALE_SECONDS", "120"))
+
+logger = logging.getLogger("app.bulk_import")
+
+KIND_EMPLOYEE = 'employee'
+KIND_STORE_ADMIN = 'store_admin'
+
+CSV_COLUMNS = ['login_id', 'name', 'email', 'password', 'stores']
+
+
+class BulkImportError(Exception):
+    """バリデーションエラー（errors に行番号付きのメッセージを保持する）"""
+
+    def __init__(self, errors):
+        super().__init__(f'{len(errors)}件のエラーがあります')
+        self.errors = errors
+
+
+def decode_csv(raw):
+    """アップロードされたCSVのバイト列を文字列にする（UTF-8(BOM可) → Shift_JIS の順に試す）"""
+    for encoding in ('utf-8-sig', 'cp932'):
+        try:
+            return raw.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    raise BulkImportError(['CSVの文字コードを判別できません（UTF-8 または Shift_JIS で保存してください）'])
+
+
+def parse_rows(text):
+    """CSV文字列を行（dict）のリストにする。行番号は2行目（ヘッダーの次）から数える"""
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames:
+        raise BulkImportError(['CSVが空です'])
+    fields = [f.strip() for f in reader.fieldnames]
+    missing = [c for c in ('login_id', 'name') if c not in fields]
+    if missing:
+        raise BulkImportError([f'ヘッダーに必須列がありません: {", ".join(missing)}'])
+    reader.fieldnames = fields
+
+    rows = []
+    for line_no, raw in enumerate(reader, start=2):
+        if not any((v or '').strip() for v in raw.values() if isinstance(v, str)):
+            continue  # 空行
+        rows.append({
+            'line': line_no,
+            'login_id': (raw.get('login_id') or '').strip(),
+            'name': (raw.get('name') or '').strip(),
+            'email': (raw.get('email') or '').strip(),
+            'password': raw.get('password') or '',
+            'stores': (raw.get('stores') or '').strip(),
+        })
+        if len(rows) > MAX_ROWS:
+            raise BulkImportError([f'一度に登録できるのは{MAX_ROWS}件までです'])
+    if not rows:
+        raise BulkImportError(['登録するデータがありません'])
+    return rows
+
+
+def _store_lookup(db, tenant_id):
+    """テナントの店舗を ID・slug・名称 のいずれからも引ける辞書にする"""
+    lookup = {}
+    for store_id, slug, name in db.execute(
+        select(TTenpo.id, TTenpo.slug, TTenpo.名称).where(TTenpo.tenant_id == tenant_id)
+    ):
+        lookup[str(store_id)] = store_id
+        lookup[slug] = store_id
+        lookup.setdefault(name, store_id)
+    return lookup
+
+
+def validate(db, kind, rows, tenant_id, default_store_id=None):
+    """
+    全行をまとめて検証し、各行に store_ids を設定する
+    エラーがあれば BulkImportError を送出する
+    """
+    errors = []
+    stores = _store_lookup(db, tenant_id)
+    seen_login = {}
+    seen_email = {}
+
+    for row in rows:
+        line = row['line']
+        if not row['login_id'] or not row['name']:
+            errors.append(f'{line}行目: ログインIDと氏名は必須です')
+        if kind == KIND_EMPLOYEE and not row['email']:
+            errors.append(f'{line}行目: メールアドレスは必須です')
+        password = row['password']
+        if kind == KIND_STORE_ADMIN and not password:
+            errors.append(f'{line}行目: パスワードは必須です')
+        if password and len(password) < 8:
+            errors.append(f'{line}行目: パスワードは8文字以上にしてください')
+
+        if row['login_id']:
+            if row['login_id'] in seen_login:
+                errors.append(f'{line}行目: ログインID "{row["login_id"]}" が{seen_login[row["login_id"]]}行目と重複しています')
+            seen_login.setdefault(row['login_id'], line)
+        if kind == KIND_EMPLOYEE and row['email']:
+            if row['email'] in seen_email:
+                errors.append(f'{line}行目: メールアドレス "{row["email"]}" が{seen_email[row["email"]]}行目と重複しています')
+            seen_email.setdefault(row['email'], line)
+
+        store_ids = []
+        for key in [s.strip() for s in row['stores'].split(';') if s.strip()]:
+            if key not in stores:
+                errors.append(f'{line}行目: 店舗 "{key}" が見つかりません')
+            elif stores[key] not in store_ids:
+                store_ids.append(stores[key])
+        if not store_ids and default_store_id:
+            store_ids.append(default_store_id)
+        if not store_ids:
+            errors.append(f'{line}行目: 店舗を少なくとも1つ指定してください')
+        row['store_ids'] = store_ids
+
+    # 既存データとの重複を1回のクエリで検出
+    login_ids = list(seen_login)
+    if kind == KIND_EMPLOYEE:
+        emails = list(seen_email)
+        conds = [TJugyoin.login_id.in_(login_ids)] if login_ids else []
+        if emails:
+            conds.append(TJugyoin.email.in_(emails))
+        existing = db.execute(select(TJugyoin.login_id, TJugyoin.email).where(or_(*conds))).all() if conds else []
+        for login_id, email in existing:
+            if login_id in seen_login:
+                errors.append(f'{seen_login[login_id]}行目: ログインID "{login_id}" は既に使用されています')
+            if email in seen_email:
+                errors.append(f'{seen_email[email]}行目: メールアドレス "{email}" は既に使用されています')
+    elif login_ids:
+        for (login_id,) in db.execute(select(TKanrisha.login_id).where(TKanrisha.login_id.in_(login_ids))):
+            errors.append(f'{seen_login[login_id]}行目: ログインID "{login_id}" は既に使用されています')
+
+    if errors:
+        raise BulkImportError(errors)
+    return rows
+
+
+def hash_passwords(passwords):
+    """
+    パスワードのリストをハッシュ化する（空文字はNone）
+    ワーカー内でプロセスを fork せず、ログインと共有するハッシュ計算用のスレッドで行う
+    （login.hash_passwords）。一括登録の最中でもログインの照合は待たされすぎない
+    """
+    targets = [(i, p) for i, p in enumerate(passwords) if p]
+    hashes = [None] * len(passwords)
+    if not targets:
+        return hashes
+    hashed = login.hash_passwords([p for _, p in targets])
+    for (i, _), h in zip(targets, hashed):
+        hashes[i] = h
+    return hashes
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def import_users(db, kind, rows, tenant_id, from_store_id=None, progress=None):
+    """
+    検証済みの行をまとめて登録する（呼び出し側で commit する）
+    progress(ハッシュ化が済んだ件数) は CHUNK_SIZE 件ごとに呼ばれる
+
+    Returns:
+        int: 登録した件数
+    """
+    # ハッシュ化をすべて済ませてから INSERT する（SQLite で書き込みロックを長く持たないため）
+    hashes = []
+    for chunk in _chunks([row['password'] for row in rows], CHUNK_SIZE):
+        hashes.extend(hash_passwords(chunk))
+        if progress:
+            progress(len(hashes))
+
+    if kind == KIND_EMPLOYEE:
+        user_model, link_model, link_key = TJugyoin, TJugyoinTenpo, 'employee_id'
+    else:
+        user_model, link_model, link_key = TKanrisha, TKanrishaTenpo, 'admin_id'
+
+    # 店舗管理者: 管理者がまだいない店舗では、最初に紐付く管理者をオーナーにする
+    owner_pending = set()
+    if kind == KIND_STORE_ADMIN:
+        store_ids = {sid for row in rows for sid in row['store_ids']}
+        staffed = set(db.execute(
+            select(TKanrishaTenpo.store_id)
+            .where(TKanrishaTenpo.store_id.in_(store_ids))
+            .group_by(TKanrishaTenpo.store_id)
+            .having(func.count() > 0)
+        ).scalars())
+        owner_pending = store_ids - staffed
+        # 既存の1件登録と同様、作成元の店舗以外はオーナーにしない
+        if from_store_id:
+            owner_pending &= {from_store_id}
+
+    role = ROLES["EMPLOYEE"] if kind == KIND_EMPLOYEE else ROLES["ADMIN"]
+    created = 0
+    for chunk in _chunks(list(zip(rows, hashes)), CHUNK_SIZE):
+        user_rows = [{
+            'login_id': row['login_id'],
+            'name': row['name'],
+            'email': row['email'],
+            'password_hash': password_hash,
+            'role': role,
+            'tenant_id': tenant_id,
+            'active': 1,
+        } for row, password_hash in chunk]
+        db.execute(insert(user_model), user_rows)
+
+        # 採番されたIDをログインIDから1回のクエリで引き直す
+        ids = dict(db.execute(
+            select(user_model.login_id, user_model.id)
+            .where(user_model.login_id.in_([r['login_id'] for r, _ in chunk]))
+        ).all())
+
+        link_rows = []
+        for row, _ in chunk:
+            for sid in row['store_ids']:
+                link = {link_key: ids[row['login_id']], 'store_id': sid}
+                if kind == KIND_STORE_ADMIN:
+                    is_owner = 1 if sid in owner_pending else 0
+                    owner_pending.discard(sid)
+                    link['is_owner'] = is_owner
+                    link['can_manage_admins'] = is_owner
+                link_rows.append(link)
+        if link_rows:
+            db.execute(insert(link_model), link_rows)
+        created += len(chunk)
+    return created
+
+
+# ========================================
+# バックグラウンドジョブ
+# ========================================
+
+_job_table = TBulkImportJob.__table__
+
+
+def _update_job(job_id, **fields):
+    with engine.begin() as conn:
+        conn.execute(update(_job_table).where(_job_table.c.id == job_id).values(**fields))
+
+
+def _run_job(job_id, kind, rows, tenant_id, from_store_id):
+    def progress(hashed):
+        _update_job(job_id, hashed=hashed, heartbeat_at=datetime.now())
+
+    db = SessionLocal()
+    try:
+        created = import_users(db, kind, rows, tenant_id, from_store_id=from_store_id, progress=progress)
+        db.commit()
+        _update_job(job_id, status='done', created=created, finished_at=datetime.now())
+    except Exception as e:
+        db.rollback()
+        logger.exception("CSV一括登録に失敗しました（job=%s）", job_id)
+        _update_job(job_id, status='error', error=str(e), finished_at=datetime.now())
+    finally:
+        db.close()
+
+
+def start_job(kind, rows, tenant_id, from_store_id=None):
+    """検証済みの行の登録をバックグラウンドで開始し、ジョブIDを返す"""
+    job_id = uuid.uuid4().hex
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(_job_table.insert().values(
+            id=job_id, tenant_id=tenant_id, kind=kind, status='running', total=len(rows),
+            hashed=0, created=0, started_at=now, heartbeat_at=now,
+        ))
+    thread = threading.Thread(
+        target=_run_job, args=(job_id, kind, rows, tenant_id, from_store_id),
+        name=f'bulk-import-{kind}-{tenant_id}', daemon=True,
+    )
+    thread.start()
+    return job_id
+
+
+def get_job(job_id, tenant_id):
+    """テナントのジョブの進捗を返す。存在しなければNone"""
+    with engine.connect() as conn:
+        row = conn.execute(
+            select(_job_table).where(_job_table.c.id == job_id, _job_table.c.tenant_id == tenant_id)
+        ).first()
+    if row is None:
+        return None
+    job = dict(row._mapping)
+    if job['status'] == 'running' and datetime.now() - job['heartbeat_at'] > timedelta(seconds=JOB_STALE_SECONDS):
+        # 実行していたワーカーが止まった（コミット前なので何も登録されていない）
+        job.update(status='error', finished_at=datetime.now(),
+                   error='処理が中断されました。登録は行われていないので、もう一度アップロードしてください')
+        with engine.begin() as conn:
+            conn.execute(
+                update(_job_table)
+                .where(_job_table.c.id == job_id, _job_table.c.status == 'running',
+                       _job_table.c.heartbeat_at == row.heartbeat_at)
+                .values(status=job['status'], error=job['error'], finished_at=job['finished_at'])
+            )
+    return job
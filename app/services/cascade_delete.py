@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+テナント／店舗のカスケード削除
+
+削除対象を「子テーブル → 親テーブル」の順に宣言しておき、
+各ステップを ID の集合単位（バッチ）で DELETE する。
+1バッチごとにコミットするため、大きなテナントでも長時間テーブルをロックしない。
+
+- dry_run: 各ステップの削除件数だけを数える
+- start_job: バックグラウンドのスレッドで実行し、進捗を get_job で参照できる
+  （進捗は T_削除ジョブ に保存し、止まったジョブは get_job のときに引き継いで再開する）
+"""
+
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete, update, func, and_, or_
+
+from app.db import engine
+from app.services import app_settings
+from app.models_login import (
+    TKanrisha, TJugyoin, TTenant, TTenpo, TKanrishaTenpo, TJugyoinTenpo,
+    TTenantAppSetting, TTenpoAppSetting, TTenantAdminTenant, TeikanDocument,
+    TeikanStatusRollup, TeikanDailyRollup, TeikanRevision, TDeleteJob,
+)
+from app.utils.decorators import ROLES
+
+# 1回の DELETE で消す行数
+DEFAULT_BATCH_SIZE = 1000
+
+SCOPE_TENANT = 'tenant'
+SCOPE_STORE = 'store'
+
+
+class Step:
+    """
+    削除ステップ
+
+    where(target_id) は対象行を絞り込む条件を返す。
+    action が 'nullify' の場合は削除せず columns を NULL に更新する（他テナントからの参照を外す）。
+    """
+
+    def __init__(self, label, model, where, action='delete', columns=()):
+        self.label = label
+        self.table = model.__table__
+        self.where = where
+        self.action = action
+        self.columns = columns
+
+
+def _tenant_store_ids(tid):
+    return select(TTenpo.id).where(TTenpo.tenant_id == tid)
+
+
+def _tenant_admin_ids(tid):
+    # システム管理者はテナントに紐付いていても削除しない
+    return select(TKanrisha.id).where(
+        TKanrisha.tenant_id == tid,
+        TKanrisha.role.in_([ROLES["TENANT_ADMIN"], ROLES["ADMIN"]]),
+    )
+
+
+def _tenant_employee_ids(tid):
+    return select(TJugyoin.id).where(TJugyoin.tenant_id == tid)
+
+
+# 依存関係の順（先に参照している側を消す）
+TENANT_STEPS = [
+    Step('定款', TeikanDocument, lambda tid: TeikanDocument.tenant_id == tid),
+    Step('定款の集計', TeikanStatusRollup, lambda tid: TeikanStatusRollup.tenant_id == tid),
+    Step('定款の日次集計', TeikanDailyRollup, lambda tid: TeikanDailyRollup.tenant_id == tid),
+    Step('定款の履歴', TeikanRevision, lambda tid: TeikanRevision.tenant_id == tid),
+    Step('他テナントの定款の作成者参照', TeikanDocument, lambda tid: and_(
+        TeikanDocument.created_by.in_(_tenant_admin_ids(tid)),
+        or_(TeikanDocument.tenant_id != tid, TeikanDocument.tenant_id.is_(None)),
+    ), action='nullify', columns=('created_by',)),
+    Step('管理者と店舗の紐付け', TKanrishaTenpo, lambda tid: or_(
+        TKanrishaTenpo.store_id.in_(_tenant_store_ids(tid)),
+        TKanrishaTenpo.admin_id.in_(_tenant_admin_ids(tid)),
+    )),
+    Step('従業員と店舗の紐付け', TJugyoinTenpo, lambda tid: or_(
+        TJugyoinTenpo.store_id.in_(_tenant_store_ids(tid)),
+        TJugyoinTenpo.employee_id.in_(_tenant_employee_ids(tid)),
+    )),
+    Step('店舗アプリ設定', TTenpoAppSetting,
+         lambda tid: TTenpoAppSetting.store_id.in_(_tenant_store_ids(tid))),
+    Step('店舗', TTenpo, lambda tid: TTenpo.tenant_id == tid),
+    Step('テナント管理者とテナントの紐付け', TTenantAdminTenant, lambda tid: or_(
+        TTenantAdminTenant.tenant_id == tid,
+        TTenantAdminTenant.admin_id.in_(_tenant_admin_ids(tid)),
+    )),
+    Step('管理者', TKanrisha, lambda tid: TKanrisha.id.in_(_tenant_admin_ids(tid))),
+    Step('従業員', TJugyoin, lambda tid: TJugyoin.tenant_id == tid),
+    Step('テナントアプリ設定', TTenantAppSetting, lambda tid: TTenantAppSetting.tenant_id == tid),
+    # 削除しないシステム管理者のテナント参照を外す（残すと T_管理者.tenant_id の外部キーでテナントを消せない）
+    Step('システム管理者のテナント参照', TKanrisha, lambda tid: TKanrisha.tenant_id == tid,
+         action='nullify', columns=('tenant_id',)),
+    Step('テナント', TTenant, lambda tid: TTenant.id == tid),
+]
+
+STORE_STEPS = [
+    Step('管理者と店舗の紐付け', TKanrishaTenpo, lambda sid: TKanrishaTenpo.store_id == sid),
+    Step('従業員と店舗の紐付け', TJugyoinTenpo, lambda sid: TJugyoinTenpo.store_id == sid),
+    Step('店舗アプリ設定', TTenpoAppSetting, lambda sid: TTenpoAppSetting.store_id == sid),
+    Step('店舗', TTenpo, lambda sid: TTenpo.id == sid),
+]
+
+_STEPS = {SCOPE_TENANT: TENANT_STEPS, SCOPE_STORE: STORE_STEPS}
+
+_job_table = TDeleteJob.__table__
+
+
+def dry_run(scope, target_id):
+    """
+    削除した場合の件数をステップごとに数える
+
+    Returns:
+        list: [(ラベル, 件数), ...]（件数0のステップも含む）
+    """
+    counts = []
+    with engine.connect() as conn:
+        for step in _STEPS[scope]:
+            n = conn.execute(
+                select(func.count()).select_from(step.table).where(step.where(target_id))
+            ).scalar() or 0
+            counts.append((step.label, n))
+    return counts
+
+
+def _disable_target(scope, target_id):
+    """削除中に画面やログインから使われないよう、先に無効化しておく"""
+    model = TTenant if scope == SCOPE_TENANT else TTenpo
+    with engine.begin() as conn:
+        conn.execute(update(model).where(model.id == target_id).values(有効=0))
+
+
+def run(scope, target_id, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """
+    カスケード削除を実行する
+
+    各ステップで対象IDを batch_size 件ずつ取り出し、その集合を1トランザクションで削除する。
+    progress(label, 件数) はバッチごとに呼ばれる。
+
+    Returns:
+        dict: {ラベル: 削除（更新）件数}
+    """
+    _disable_target(scope, target_id)
+    result = {}
+    for step in _STEPS[scope]:
+        pk = step.table.c.id
+        total = 0
+        while True:
+            with engine.begin() as conn:
+                ids = conn.execute(
+                    select(pk).where(step.where(target_id)).order_by(pk).limit(batch_size)
+                ).scalars().all()
+                if not ids:
+                    break
+                if step.action == 'nullify':
+                    conn.execute(
+                        update(step.table).where(pk.in_(ids)).values({c: None for c in step.columns})
+                    )
+                else:
+                    conn.execute(delete(step.table).where(pk.in_(ids)))
+            total += len(ids)
+            if progress:
+                progress(step.label, total)
+            if len(ids) < batch_size:
+                break
+        result[step.label] = total
+    # 削除した店舗のアプリ設定がこのワーカーのキャッシュに残らないようにする
+    app_settings.invalidate()
+    return result
+
+
+# ========================================
+# バックグラウンドジョブ
+# ========================================
+# 進捗は T_削除ジョブ に保存する（どのワーカーからでも参照できる）。
+# 実行中のスレッドはバッチごとに heartbeat_at を更新する。ワーカーの再起動などでスレッドが
+# 止まり JOB_STALE_SECONDS 以上更新が途絶えたジョブは、get_job を呼んだワーカーが引き継いで
+# 残りを実行し直す（run は条件で絞って消すので、途中から実行し直しても結果は同じ）。
+
+JOB_STALE_SECONDS = int(os.getenv("DELETE_JOB_STALE_SECONDS", "120"))
+
+
+def _update_job(job_id, **fields):
+    with engine.begin() as conn:
+        conn.execute(update(_job_table).where(_job_table.c.id == job_id).values(**fields))
+
+
+def _run_job(job_id, scope, target_id, batch_size, base=None):
+    """base: 引き継いだジョブで、前回までに削除した件数"""
+    base = dict(base or {})
+    deleted = dict(base)
+
+    def progress(label, count):
+        deleted[label] = base.get(label, 0) + count
+        _update_job(job_id, current_step=label, deleted_json=json.dumps(deleted, ensure_ascii=False),
+                    heartbeat_at=datetime.now())
+
+    try:
+        run(scope, target_id, batch_size=batch_size, progress=progress)
+        _update_job(job_id, status='done', current_step=None, finished_at=datetime.now())
+    except Exception as e:
+        _update_job(job_id, status='error', error=str(e), finished_at=datetime.now())
+
+
+def _start_thread(job_id, scope, target_id, batch_size, base=None):
+    thread = threading.Thread(
+        target=_run_job, args=(job_id, scope, target_id, batch_size, base),
+        name=f'cascade-delete-{scope}-{target_id}', daemon=True,
+    )
+    thread.start()
+
+
+def start_job(scope, target_id, batch_size=DEFAULT_BATCH_SIZE):
+    """カスケード削除をバックグラウンドで開始し、ジョブIDを返す"""
+    job_id = uuid.uuid4().hex
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(_job_table.insert().values(
+            id=job_id, scope=scope, target_id=target_id, batch_size=batch_size,
+            status='running', deleted_json='{}', started_at=now, heartbeat_at=now,
+        ))
+    _start_thread(job_id, scope, target_id, batch_size)
+    return job_id
+
+
+def _resume_if_stale(row):
+    """止まったジョブを引き継ぐ。他のワーカーが先に引き継いだ場合は何もしない"""
+    if row.status != 'running' or datetime.now() - row.heartbeat_at < timedelta(seconds=JOB_STALE_SECONDS):
+        return
+    with engine.begin() as conn:
+        claimed = conn.execute(
+            update(_job_table)
+            .where(_job_table.c.id == row.id, _job_table.c.status == 'running',
+                   _job_table.c.heartbeat_at == row.heartbeat_at)
+            .values(heartbeat_at=datetime.now())
+        ).rowcount
+    if claimed == 1:
+        _start_thread(row.id, row.scope, row.target_id, row.batch_size, json.loads(row.deleted_json or '{}'))
+
+
+def get_job(job_id):
+    """ジョブの進捗を返す。存在しなければNone"""
+    with engine.connect() as conn:
+        row = conn.execute(select(_job_table).where(_job_table.c.id == job_id)).first()
+    if row is None:
+        return None
+    _resume_if_stale(row)
+    return {
+        'id': row.id,
+        'scope': row.scope,
+        'target_id': row.target_id,
+        'status': row.status,
+        'current_step': row.current_step,
+        'steps': [step.label for step in _STEPS[row.scope]],
+        'deleted': json.loads(row.deleted_json or '{}'),
+        'error': row.error,
+        'started_at': row.started_at,
+        'finished_at': row.finished_at,
+    }
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+テナント／店舗のディレクトリ（一覧と名前の索引）
+
+マイページやテナント・店舗の選択画面で使う「テナント → 店舗」「店舗 → テナント名」を、
+T_テナントと T_店舗を結合した1回のクエリで組み立ててプロセス内に保持する。
+
+作り直すタイミング:
+- このプロセスで TTenant / TTenpo を ORM で追加・更新・削除したとき（即時）
+- 版数（両テーブルの件数・最大ID・最大更新日時）が変わったとき。
+  他のワーカーでの変更を拾うため、版数は CHECK_SECONDS 秒に1回だけ確認する
+
+返す dict は全リクエストで共有しているため、呼び出し側で書き換えないこと。
+"""
+
+import os
+import threading
+import time
+
+from sqlalchemy import event, func, select
+
+from app import metrics
+from app.db import engine
+from app.models_login import TTenant, TTenpo
+
+CHECK_SECONDS = float(os.getenv("DIRECTORY_CHECK_SECONDS", "2"))
+
+
+class Directory:
+    """ある時点のテナント・店舗の一覧"""
+
+    def __init__(self, tenant_rows, store_rows):
+        self._tenants = {}
+        self._stores = {}
+        self._stores_by_tenant = {}
+        for tid, name, slug, active in tenant_rows:
+            self._tenants[tid] = {'id': tid, 'name': name, 'slug': slug, 'active': active == 1}
+            self._stores_by_tenant[tid] = []
+        for sid, tid, name, slug, active in store_rows:
+            tenant = self._tenants.get(tid)
+            store = {
+                'id': sid,
+                'name': name,
+                'slug': slug,
+                'tenant_id': tid,
+                'tenant_name': tenant['name'] if tenant else '',
+                'active': active == 1,
+            }
+            self._stores[sid] = store
+            self._stores_by_tenant.setdefault(tid, []).append(store)
+
+    def tenant(self, tenant_id):
+        return self._tenants.get(tenant_id)
+
+    def store(self, store_id):
+        return self._stores.get(store_id)
+
+    def tenants(self, active_only=True):
+        """テナントの一覧（ID順）"""
+        return [t for t in self._tenants.values() if t['active'] or not active_only]
+
+    def stores(self, active_only=True):
+        """全店舗の一覧（テナントID・店舗ID順）"""
+        return [s for tid in sorted(self._stores_by_tenant) for s in self._stores_by_tenant[tid]
+                if s['active'] or not active_only]
+
+    def stores_of(self, tenant_id, active_only=True):
+        """テナントの店舗の一覧（ID順）"""
+        return [s for s in self._stores_by_tenant.get(tenant_id, []) if s['active'] or not active_only]
+
+
+_directory = None
+_version = None
+_checked_at = 0.0
+_stale = True
+_lock = threading.Lock()
+
+
+def _current_version(conn):
+    """両テーブルの (件数, 最大ID, 最大更新日時) — どれかが変われば作り直す"""
+    return tuple(
+        conn.execute(select(func.count(), func.max(model.id), func.max(model.updated_at))).one()
+        for model in (TTenant, TTenpo)
+    )
+
+
+def _load(conn):
+    rows = conn.execute(
+        select(
+            TTenant.id, TTenant.名称, TTenant.slug, TTenant.有効,
+            TTenpo.id, TTenpo.名称, TTenpo.slug, TTenpo.有効,
+        )
+        .select_from(TTenant)
+        .outerjoin(TTenpo, TTenpo.tenant_id == TTenant.id)
+        .order_by(TTenant.id, TTenpo.id)
+    ).all()
+    tenant_rows = list(dict.fromkeys((r[0], r[1], r[2], r[3]) for r in rows))
+    store_rows = [(r[4], r[0], r[5], r[6], r[7]) for r in rows if r[4] is not None]
+    return Directory(tenant_rows, store_rows)
+
+
+def get():
+    """最新のディレクトリを返す（必要な場合だけ作り直す）"""
+    global _directory, _version, _checked_at, _stale
+    with _lock:
+        now = time.monotonic()
+        if _directory is not None and not _stale and now - _checked_at < CHECK_SECONDS:
+            metrics.cache_hit('directory')
+            return _directory
+
+        with engine.connect() as conn:
+            version = _current_version(conn)
+            _checked_at = now
+            if _directory is not None and not _stale and version == _version:
+                metrics.cache_hit('directory')
+                return _directory
+            metrics.cache_miss('directory')
+            _stale = False
+            _directory = _load(conn)
+            _version = version
+        return _directory
+
+
+def invalidate():
+    """次の get() で作り直す"""
+    global _stale
+    _stale = True
+
+
+def _on_change(mapper, connection, target):
+    invalidate()
+
+
+for _model in (TTenant, TTenpo):
+    for _name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _name, _on_change)
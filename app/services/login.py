@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+ログイン（パスワードの照合・再ハッシュ・試行回数の制限・所要時間の計測）
+
+朝の始業時刻にログインが集中すると、パスワードのハッシュ計算（scrypt / pbkdf2）で
+CPU が埋まり、他の画面まで遅くなる。そこで次のようにする。
+
+- ユーザーの読み込みは get_pooled_db() の接続を使い回す（ログインのたびに接続・スキーマ確認をしない）
+- ハッシュ計算はワーカーごとに HASH_WORKERS 本のスレッドで行う。hashlib は計算中に GIL を
+  手放すので、同時に CPU を使うログインの数がこの本数に抑えられる。
+  待ちが HASH_QUEUE 件を超えたとき、または BUDGET_MS 以内に終わらないときは「混雑」として断る
+- 保存されているハッシュの方式・コストが PASSWORD_HASH_METHOD と違えば、ログインに成功したときに
+  入力されたパスワードで作り直す（ログインの応答は待たせずに、ハッシュ計算用のスレッドで後から行う）
+- 試行回数の制限はログインIDごと・接続元ごとのトークンバケット（app/admission.py）で行う。
+  失敗したときだけトークンを引くので、ログインのたびに DB へ書き込むことはない
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from flask import request
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from app import admission, metrics
+from app.instrumentation import span
+from app.utils.db import _is_pg, _sql, get_pooled_db
+
+logger = logging.getLogger("app.login")
+
+# werkzeug の method 指定（例: "scrypt", "scrypt:32768:8:1", "pbkdf2:sha256:600000"）
+HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+
+HASH_WORKERS = max(1, int(os.getenv("LOGIN_HASH_WORKERS", "2")))
+HASH_QUEUE = max(0, int(os.getenv("LOGIN_HASH_QUEUE", "16")))
+
+# ログイン1回にかけてよい時間（ミリ秒）。超えそうなら混雑として断り、超えたものはログに残す
+BUDGET_MS = float(os.getenv("LOGIN_BUDGET_MS", "2000"))
+
+# ログインIDごと: 続けて LOGIN_ID_BURST 回まで失敗でき、LOGIN_ID_RATE 回／秒で回復する
+LOGIN_ID_BURST = float(os.getenv("LOGIN_ID_BURST", "10"))
+LOGIN_ID_RATE = float(os.getenv("LOGIN_ID_RATE", str(1 / 60)))
+# 接続元ごと（同じ事務所の複数人を考えてログインIDより多めにする）
+LOGIN_IP_BURST = float(os.getenv("LOGIN_IP_BURST", "50"))
+LOGIN_IP_RATE = float(os.getenv("LOGIN_IP_RATE", "0.5"))
+
+ADMIN = 'admin'
+EMPLOYEE = 'employee'
+
+# 種類 → (テーブル, ユーザーを引く SQL)
+_QUERIES = {
+    ADMIN: ('T_管理者', 'SELECT id, name, password_hash, tenant_id, is_owner '
+                        'FROM "T_管理者" WHERE login_id=%s AND role=%s'),
+    EMPLOYEE: ('T_従業員', 'SELECT id, name, password_hash, tenant_id, 0 '
+                          'FROM "T_従業員" WHERE login_id=%s OR email=%s'),
+}
+
+# 従業員の初期パスワード（パスワード未設定のときだけ使える）
+EMPLOYEE_INITIAL_PASSWORD = '123456'
+
+INVALID_MESSAGE = "ログインIDまたはパスワードが違います"
+BUSY_MESSAGE = "ログインが混み合っています。少し待ってからもう一度お試しください。"
+
+
+class LoginError(Exception):
+    """ログインできなかった理由（画面に表示する文言と、返す HTTP ステータス）"""
+
+    def __init__(self, message, status=200, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = {'Retry-After': str(retry_after)} if retry_after else {}
+
+
+class _Busy(Exception):
+    pass
+
+
+# ========================================
+# ハッシュ
+# ========================================
+
+def hash_password(password):
+    """PASSWORD_HASH_METHOD でハッシュ化する（パスワードを保存するときは必ずこれを使う）"""
+    return generate_password_hash(password, HASH_METHOD)
+
+
+_current_method = None
+
+
+def needs_rehash(pwhash):
+    """保存されたハッシュの方式・コストが今の設定と違えば True"""
+    global _current_method
+    if not pwhash:
+        return False
+    if _current_method is None:
+        # 保存されたハッシュの先頭（"scrypt:32768:8:1" など）と比べるため、既定値を補った方式名にする
+        _current_method = hash_password('').split('$', 1)[0]
+    return pwhash.split('$', 1)[0] != _current_method
+
+
+_dummy_hash = None
+
+
+def _dummy():
+    """存在しないユーザーでも同じだけ時間をかけるための照合相手"""
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password(os.urandom(16).hex())
+    return _dummy_hash
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE)
+
+
+def _get_executor():
+    """ハッシュ計算用のスレッドプール（fork した子プロセスでは作り直す）"""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='login-hash')
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def _submit(func, *args, wait=False):
+    """ハッシュ計算用のスレッドに渡す。待ちがいっぱいなら _Busy（wait=True なら空くまで待つ）"""
+    if not _pending.acquire(blocking=wait):
+        raise _Busy()
+    try:
+        future = _get_executor().submit(func, *args)
+    except Exception:
+        _pending.release()
+        raise
+    future.add_done_callback(lambda _f: _pending.release())
+    return future
+
+
+def hash_passwords(passwords):
+    """
+    パスワードのリストをまとめてハッシュ化する（CSV 一括登録用）
+
+    ログインと同じハッシュ計算用のスレッドを使う。同時に渡すのは HASH_WORKERS - 1 件まで
+    （1本のときは1件）にして、先に渡した分が終わるのを待ってから次を渡すので、
+    大きな CSV の途中でもログインの照合は1件分の計算時間以内に順番が回ってくる。
+    """
+    in_flight = max(1, HASH_WORKERS - 1)
+    futures = []
+    for i, password in enumerate(passwords):
+        if i >= in_flight:
+            futures[i - in_flight].result()
+        futures.append(_submit(hash_password, password, wait=True))
+    return [f.result() for f in futures]
+
+
+def _timed_check(pwhash, password):
+    started = time.perf_counter()
+    try:
+        return check_password_hash(pwhash, password)
+    finally:
+        metrics.observe_password_hash('verify', time.perf_counter() - started)
+
+
+def _verify(pwhash, password, deadline):
+    """ハッシュ計算用のスレッドで照合する。deadline までに終わらなければ _Busy"""
+    future = _submit(_timed_check, pwhash, password)
+    try:
+        return future.result(timeout=max(0.0, deadline - time.perf_counter()))
+    except FutureTimeout:
+        future.cancel()
+        raise _Busy()
+
+
+def _rehash(kind, user_id, password, old_hash):
+    started = time.perf_counter()
+    new_hash = hash_password(password)
+    metrics.observe_password_hash('rehash', time.perf_counter() - started)
+    table = _QUERIES[kind][0]
+    conn = get_pooled_db()
+    try:
+        cur = conn.cursor()
+        # 照合してから今までにパスワードが変更されていたら上書きしない
+        cur.execute(_sql(conn, f'UPDATE "{table}" SET password_hash=%s WHERE id=%s AND password_hash=%s'),
+                    (new_hash, user_id, old_hash))
+        if not _is_pg(conn):
+            conn.commit()
+    except Exception as e:
+        logger.warning("パスワードの再ハッシュに失敗しました（%s id=%s）: %s", table, user_id, e)
+    finally:
+        conn.close()
+
+
+def _schedule_rehash(kind, user_id, password, old_hash):
+    try:
+        _submit(_rehash, kind, user_id, password, old_hash)
+    except _Busy:
+        pass  # 混んでいるときは次のログインに回す
+
+
+# ========================================
+# ログイン
+# ========================================
+
+def _client_ip():
+    """
+    接続元の IP アドレス
+    Heroku のルーターは接続元を X-Forwarded-For の末尾に足す（先頭側は利用者が偽装できる）
+    """
+    route = request.access_route
+    return route[-1] if request.headers.get('X-Forwarded-For') and route else request.remote_addr
+
+
+def _limits(kind, login_id):
+    digest = hashlib.sha1(f"{kind}:{login_id.lower()}".encode('utf-8')).hexdigest()[:16]
+    return [
+        (f"login:id:{digest}", LOGIN_ID_BURST, LOGIN_ID_RATE, "login_id"),
+        (f"login:ip:{_client_ip()}", LOGIN_IP_BURST, LOGIN_IP_RATE, "ip"),
+    ]
+
+
+def _load_user(kind, login_id, role):
+    """(id, name, password_hash, tenant_id, is_owner) か None"""
+    sql = _QUERIES[kind][1]
+    params = (login_id, role) if kind == ADMIN else (login_id, login_id)
+    for attempt in (0, 1):
+        conn = get_pooled_db()
+        try:
+            cur = conn.cursor()
+            cur.execute(_sql(conn, sql), params)
+            row = cur.fetchone()
+            return tuple(row) if row else None
+        except Exception:
+            if attempt:
+                raise
+            # DB 側で切られた接続だった場合に備えて、捨てて新しい接続でもう一度
+            conn.invalidate()
+        finally:
+            conn.close()
+
+
+def authenticate(kind, login_id, password, role=None):
+    """
+    ログインIDとパスワードを照合する
+
+    kind: ADMIN（T_管理者。role で絞る）/ EMPLOYEE（T_従業員。ログインIDかメールアドレス）
+    照合できたらユーザーの dict（id, name, tenant_id, is_owner）を返し、
+    できなければ LoginError を送出する。
+    """
+    started = time.perf_counter()
+    deadline = started + BUDGET_MS / 1000
+    label = role or kind
+    limits = _limits(kind, login_id)
+
+    def finish(result):
+        elapsed = time.perf_counter() - started
+        metrics.observe_login(label, result, elapsed)
+        if elapsed * 1000 > BUDGET_MS:
+            logger.warning("ログインが目標時間を超えました（%s %s %.0fms）", label, result, elapsed * 1000)
+
+    rejected = admission.check(limits)
+    if rejected is not None:
+        finish('throttled')
+        raise LoginError(f"ログインの試行回数が多すぎます。{rejected.retry_after}秒ほど待ってからもう一度お試しください。",
+                         status=429, retry_after=rejected.retry_after)
+
+    row = _load_user(kind, login_id, role)
+    pwhash = row[2] if row else None
+    try:
+        with span("login.verify"):
+            if row and not pwhash:
+                # パスワード未設定の従業員は初期パスワードだけを受け付ける
+                ok = kind == EMPLOYEE and password == EMPLOYEE_INITIAL_PASSWORD
+            else:
+                ok = _verify(pwhash or _dummy(), password, deadline) and row is not None
+    except _Busy:
+        finish('busy')
+        raise LoginError(BUSY_MESSAGE, status=503, retry_after=5)
+
+    if not ok:
+        admission.charge(limits)
+        finish('failed')
+        raise LoginError(INVALID_MESSAGE)
+
+    if needs_rehash(pwhash):
+        _schedule_rehash(kind, row[0], password, pwhash)
+    finish('ok')
+    return {'id': row[0], 'name': row[1], 'tenant_id': row[3], 'is_owner': row[4] == 1}
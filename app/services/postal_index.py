@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+郵便番号 → 住所のローカル索引
+
+日本郵便の KEN_ALL.CSV（読み仮名データの促音・拗音を小書きで表記するもの）から
+郵便番号を主キーとした SQLite ファイル（WITHOUT ROWID）を作成し、
+外部API（zipcloud 等）を使わずに住所を引く。
+
+- 索引は読み取り専用・immutable で開くため、ロックやジャーナルの処理が入らない
+- 接続はスレッドごとに1本だけ開いて使い回す（索引の置き換えは更新日時で検知する）
+- 索引ファイルの場所は環境変数 POSTAL_INDEX_PATH で変更できる
+- 索引が作成されていない環境では、7桁の検索だけ従来どおり zipcloud に問い合わせる（lookup_remote）
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import urllib.parse
+import urllib.request
+import zipfile
+
+logger = logging.getLogger("app.postal")
+
+DEFAULT_INDEX_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'postal_codes.sqlite'
+)
+
+# 日本郵便の配布URL（索引の再構築時のみ使用。アプリ実行時には参照しない）
+KEN_ALL_URL = 'https://www.post.japanpost.jp/zipcode/dl/kogaki/zip/ken_all.zip'
+
+# 索引が無いときの問い合わせ先（空にすると問い合わせない）
+ZIPCLOUD_URL = os.getenv('POSTAL_FALLBACK_URL', 'https://zipcloud.ibsnet.co.jp/api/search')
+ZIPCLOUD_TIMEOUT = float(os.getenv('POSTAL_FALLBACK_TIMEOUT', '3'))
+
+# 前方一致検索で返す最大件数
+MAX_SUGGESTIONS = 20
+
+_local = threading.local()
+
+
+def index_path():
+    return os.environ.get('POSTAL_INDEX_PATH') or DEFAULT_INDEX_PATH
+
+
+def _connect():
+    """
+    読み取り専用の接続をスレッドごとにキャッシュして返す。索引が無ければNone
+    索引ファイルが置き換えられた（更新日時が変わった）場合は開き直す
+    """
+    path = index_path()
+    try:
+        stamp = (path, os.stat(path).st_mtime_ns)
+    except OSError:
+        return None
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and getattr(_local, 'stamp', None) == stamp:
+        return conn
+    if conn is not None:
+        conn.close()
+    conn = sqlite3.connect(f'file:{path}?mode=ro&immutable=1', uri=True, check_same_thread=False)
+    _local.conn, _local.stamp = conn, stamp
+    return conn
+
+
+def reset():
+    """このスレッドでキャッシュしている接続を閉じる"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+    _local.conn = None
+
+
+def normalize(code):
+    """全角数字やハイフンを含む入力を数字だけの文字列にする"""
+    if not code:
+        return ''
+    code = code.translate(str.maketrans('０１２３４５６７８９', '0123456789'))
+    return re.sub(r'[^0-9]', '', code)[:7]
+
+
+def _to_result(row):
+    zipcode, pref, city, town, pref_kana, city_kana, town_kana = row
+    return {
+        'zipcode': zipcode,
+        'address1': pref,
+        'address2': city,
+        'address3': town,
+        'kana1': pref_kana,
+        'kana2': city_kana,
+        'kana3': town_kana,
+    }
+
+
+def lookup(code):
+    """
+    7桁の郵便番号に一致する住所のリストを返す
+    索引が作成されていない場合は None を返す
+    """
+    conn = _connect()
+    if conn is None:
+        return None
+    code = normalize(code)
+    if len(code) != 7:
+        return []
+    rows = conn.execute(
+        'SELECT zipcode, pref, city, town, pref_kana, city_kana, town_kana '
+        'FROM postal WHERE zipcode = ? ORDER BY seq', (code,)
+    ).fetchall()
+    return [_to_result(r) for r in rows]
+
+
+def lookup_remote(code):
+    """
+    索引が無いときの代わりに zipcloud で7桁の郵便番号を引く（lookup と同じ形のリストを返す）
+    問い合わせ先が設定されていない、または問い合わせに失敗した場合は None を返す
+    """
+    code = normalize(code)
+    if len(code) != 7:
+        return []
+    if not ZIPCLOUD_URL:
+        return None
+    url = f"{ZIPCLOUD_URL}?{urllib.parse.urlencode({'zipcode': code})}"
+    try:
+        with urllib.request.urlopen(url, timeout=ZIPCLOUD_TIMEOUT) as res:
+            body = json.loads(res.read().decode('utf-8'))
+    except Exception as e:
+        logger.warning("zipcloud への問い合わせに失敗しました（%s）: %s", code, e)
+        return None
+    return [
+        {key: r.get(key, '') for key in
+         ('zipcode', 'address1', 'address2', 'address3', 'kana1', 'kana2', 'kana3')}
+        for r in body.get('results') or []
+    ]
+
+
+def suggest(prefix, limit=MAX_SUGGESTIONS):
+    """
+    郵便番号の前方一致で候補を返す（入力途中の補完用）
+    主キーの範囲検索になるため、件数に関わらず索引を数ページ読むだけで済む
+    """
+    conn = _connect()
+    if conn is None:
+        return None
+    prefix = normalize(prefix)
+    if len(prefix) < 3:
+        return []
+    upper = prefix + ':'  # ':' は '9' の次の文字
+    rows = conn.execute(
+        'SELECT zipcode, pref, city, town, pref_kana, city_kana, town_kana '
+        'FROM postal WHERE zipcode >= ? AND zipcode < ? ORDER BY zipcode, seq LIMIT ?',
+        (prefix, upper, limit)
+    ).fetchall()
+    return [_to_result(r) for r in rows]
+
+
+# ========================================
+# 索引の作成
+# ========================================
+
+# 町域名として表示しない定型文
+_TOWN_BLANK_PATTERNS = (
+    re.compile(r'^以下に掲載がない場合$'),
+    re.compile(r'の次に番地がくる場合$'),
+    re.compile(r'^.+一円$'),
+)
+
+
+def _clean_town(town):
+    """KEN_ALL の町域名から括弧書き（「（次のビルを除く）」等）や定型文を取り除く"""
+    town = re.sub(r'（.*）$', '', town)
+    for pattern in _TOWN_BLANK_PATTERNS:
+        if pattern.search(town):
+            return ''
+    return town
+
+
+def iter_ken_all(lines):
+    """
+    KEN_ALL のCSV行から (郵便番号, 都道府県, 市区町村, 町域, 各カナ) を順に返す
+    町域名が長く複数行に分割されたレコード（括弧が閉じていない行）は結合する
+    """
+    pending = None
+    for row in csv.reader(lines):
+        if len(row) < 9:
+            continue
+        if pending is not None:
+            pending[8] += row[8]
+            if row[5] != pending[5]:
+                pending[5] += row[5]
+            if '）' not in row[8]:
+                continue
+            row, pending = pending, None
+        elif '（' in row[8] and '）' not in row[8]:
+            pending = list(row)
+            continue
+        town = _clean_town(row[8])
+        town_kana = re.sub(r'\(.*\)$', '', row[5]) if town else ''
+        yield (row[2], row[6], row[7], town, row[3], row[4], town_kana)
+
+
+def _open_ken_all(path):
+    """KEN_ALL（CSV または ZIP、Shift_JIS または UTF-8）をテキストとして開く"""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            name = next(n for n in zf.namelist() if n.lower().endswith('.csv'))
+            raw = zf.read(name)
+    else:
+        with open(path, 'rb') as f:
+            raw = f.read()
+    for encoding in ('cp932', 'utf-8-sig'):
+        try:
+            return io.StringIO(raw.decode(encoding), newline='')
+        except UnicodeDecodeError:
+            continue
+    raise ValueError('KEN_ALL の文字コードを判別できません')
+
+
+def build_index(source_path, output_path=None):
+    """
+    KEN_ALL から索引ファイルを作成する
+
+    一時ファイルに書き込んでから置き換えるため、稼働中のプロセスは
+    置き換えの瞬間まで古い索引を読み続け、次の検索から新しい索引を開く。
+
+    Returns:
+        int: 登録した件数
+    """
+    output_path = output_path or index_path()
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = output_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    seen = set()
+    rows = []
+    for rec in iter_ken_all(_open_ken_all(source_path)):
+        # 同じ郵便番号・同じ住所の重複行（町域の括弧書き違いなど）は1件にまとめる
+        key = rec[:4]
+        if key in seen:
+            continue
+        seen.add(key)
+        # seq はファイル内の出現順。郵便番号ごとの並びを元データどおりに保つ
+        rows.append((rec[0], len(rows)) + rec[1:])
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute(
+            'CREATE TABLE postal ('
+            ' zipcode TEXT NOT NULL, seq INTEGER NOT NULL,'
+            ' pref TEXT, city TEXT, town TEXT,'
+            ' pref_kana TEXT, city_kana TEXT, town_kana TEXT,'
+            ' PRIMARY KEY (zipcode, seq)) WITHOUT ROWID'
+        )
+        rows.sort()
+        conn.executemany('INSERT INTO postal VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        conn.commit()
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
+    os.replace(tmp_path, output_path)
+    reset()
+    return len(rows)
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+事業目的（目的条項）の入力候補インデックス
+
+同梱の定型文（app/data/purpose_phrases.json）と、全テナントの完成済み定款で
+実際に使われた事業目的をコーパスとし、文字 n-gram（1〜2文字）の転置インデックスで
+部分一致検索する。インデックスはプロセス内のメモリに保持し、
+
+- 定款の完成保存時に add_document() で即時に反映する
+- 他のワーカーで保存された分は、一定間隔で更新日時の新しい定款だけを読み直して反映する
+  （DB の読み込みはロックの外で行い、読み込み中も検索は取り込み済みの内容で応答する）
+- 削除された定款・完成済みでなくなった定款は remove_document() と、同じ間隔での
+  完成済み定款のID照合で外す
+"""
+
+import json
+import os
+import threading
+import time
+import unicodedata
+
+from sqlalchemy import select
+
+from app.db import engine
+from app.models_login import TeikanDocument
+
+PHRASES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'purpose_phrases.json'
+)
+
+# 目的条項の最終項目（自動付与されるため候補には出さない）
+LAST_ITEM = '前（各）号に附帯関連する一切の事業'
+
+# 他ワーカーで保存された定款を取り込む間隔（秒）
+REFRESH_INTERVAL = 60
+
+DEFAULT_LIMIT = 10
+
+# 読み込んだ定款を反映するとき、検索を待たせないよう一度にロックを持つ件数
+_APPLY_BATCH = 500
+
+# 同梱の定型文は、実績のある文言より少しだけ優先する
+_BUNDLED_WEIGHT = 2
+
+
+def load_bundled_phrases():
+    """同梱の業種別定型文を {業種: [事業目的, ...]} で返す"""
+    with open(PHRASES_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def normalize(text):
+    """全角英数・空白の揺れを吸収した検索用の文字列にする"""
+    return unicodedata.normalize('NFKC', text or '').replace(' ', '').replace('　', '').lower()
+
+
+def _grams(text):
+    """1文字と2文字の n-gram の集合"""
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+class PurposeIndex:
+    """事業目的の n-gram 転置インデックス"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()  # DB からの読み込みは同時に1スレッドだけ
+        self._texts = []        # 表示用の文言（ID = リストの位置）
+        self._norms = []        # 検索用に正規化した文言
+        self._weights = []      # 使用実績（多いほど上位）
+        self._ids = {}          # 正規化した文言 → ID
+        self._postings = {}     # n-gram → ID の集合
+        self._doc_phrases = {}  # 定款ID → 取り込み済みの文言ID（再保存時の差分計算用）
+        self._watermark = None  # 取り込み済みの最終更新日時
+        self._synced_at = 0.0
+        self._loaded = False
+
+    # ---------- 登録 ----------
+
+    def _add_phrase(self, text, weight):
+        text = (text or '').strip()
+        norm = normalize(text)
+        if not norm or text == LAST_ITEM:
+            return None
+        pid = self._ids.get(norm)
+        if pid is None:
+            pid = len(self._texts)
+            self._ids[norm] = pid
+            self._texts.append(text)
+            self._norms.append(norm)
+            self._weights.append(0)
+            for gram in _grams(norm):
+                self._postings.setdefault(gram, set()).add(pid)
+        self._weights[pid] += weight
+        return pid
+
+    def _apply_document(self, doc_id, purposes):
+        """定款1件分の事業目的を反映する（同じ定款の再保存は差分だけ数え直す）"""
+        self._remove_document(doc_id)
+        pids = set()
+        for text in purposes or []:
+            if isinstance(text, str):
+                pid = self._add_phrase(text, 1)
+                if pid is not None:
+                    if pid in pids:
+                        self._weights[pid] -= 1  # 同じ定款内の重複は1回と数える
+                    pids.add(pid)
+        self._doc_phrases[doc_id] = pids
+
+    def _remove_document(self, doc_id):
+        for pid in self._doc_phrases.pop(doc_id, ()):
+            self._weights[pid] -= 1
+
+    def add_document(self, doc_id, purposes):
+        """完成保存された定款の事業目的を即時に取り込む"""
+        with self._lock:
+            if self._loaded:
+                self._apply_document(doc_id, purposes)
+
+    def remove_document(self, doc_id):
+        """削除された定款の事業目的を即時に外す（使用実績が0になった文言は候補に出ない）"""
+        with self._lock:
+            self._remove_document(doc_id)
+
+    # ---------- 読み込み ----------
+
+    def _load_changes(self, watermark):
+        """
+        watermark 以降に更新された完成済み定款と、今ある完成済み定款のID集合を読む
+        （ロックの外で実行する。検索はこの間も取り込み済みの内容で応答する）
+        """
+        table = TeikanDocument.__table__
+        stmt = select(table.c.id, table.c.data_json, table.c.updated_at).where(table.c.status == 'completed')
+        if watermark is not None:
+            stmt = stmt.where(table.c.updated_at >= watermark)
+        docs = []
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=500).execute(stmt)
+            for doc_id, data_json, updated_at in result:
+                try:
+                    purposes = json.loads(data_json or '{}').get('purposes', [])
+                except (ValueError, AttributeError):
+                    purposes = []
+                docs.append((doc_id, purposes, updated_at))
+            completed = set(conn.execute(select(table.c.id).where(table.c.status == 'completed')).scalars())
+        return docs, completed
+
+    def _sync(self):
+        """前回以降に更新された完成済み定款を取り込み、削除・下書きに戻された定款を外す"""
+        docs, completed = self._load_changes(self._watermark)
+        for start in range(0, len(docs), _APPLY_BATCH):
+            with self._lock:
+                for doc_id, purposes, updated_at in docs[start:start + _APPLY_BATCH]:
+                    self._apply_document(doc_id, purposes)
+                    if updated_at and (self._watermark is None or updated_at > self._watermark):
+                        self._watermark = updated_at
+        with self._lock:
+            for doc_id in set(self._doc_phrases) - completed:
+                self._remove_document(doc_id)
+        self._synced_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        if self._loaded and time.monotonic() - self._synced_at < REFRESH_INTERVAL:
+            return
+        with self._lock:
+            if not self._loaded:
+                for phrases in load_bundled_phrases().values():
+                    for text in phrases:
+                        self._add_phrase(text, _BUNDLED_WEIGHT)
+                self._loaded = True
+        # DB の読み込みは1スレッドだけが行い、他のスレッドは待たずに今の内容で検索する
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() - self._synced_at < REFRESH_INTERVAL:
+                return
+            self._sync()
+        except Exception as e:
+            # DBが使えなくても同梱の定型文だけで候補を返す
+            self._synced_at = time.monotonic()
+            print(f"⚠️ 事業目的インデックスの更新エラー: {e}")
+        finally:
+            self._sync_lock.release()
+
+    # ---------- 検索 ----------
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """
+        入力文字列を含む事業目的を返す
+
+        前方一致 → 使用実績の多い順 → 短い順に並べる。
+        n-gram の転置リストを小さい順に積集合し、最後に部分一致を確認する。
+        """
+        self._ensure_fresh()
+        q = normalize(query)
+        if not q:
+            return []
+        grams = {q[i:i + 2] for i in range(len(q) - 1)} or {q}
+        with self._lock:
+            postings = []
+            for gram in grams:
+                ids = self._postings.get(gram)
+                if not ids:
+                    return []
+                postings.append(ids)
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for ids in postings[1:]:
+                candidates &= ids
+                if not candidates:
+                    return []
+
+            norms, weights, texts = self._norms, self._weights, self._texts
+            hits = [pid for pid in candidates if q in norms[pid] and weights[pid] > 0]
+            hits.sort(key=lambda pid: (not norms[pid].startswith(q), -weights[pid], len(norms[pid])))
+            return [{'text': texts[pid], 'score': weights[pid]} for pid in hits[:limit]]
+
+
+_index = PurposeIndex()
+
+
+def search(query, limit=DEFAULT_LIMIT):
+    return _index.search(query, limit=limit)
+
+
+def add_document(doc_id, purposes):
+    _index.add_document(doc_id, purposes)
+
+
+def remove_document(doc_id):
+    _index.remove_document(doc_id)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+/readyz 用の依存先チェック
+
+- db: SQLAlchemy のプールから接続を借りて SELECT 1 を実行できるか
+- fonts: 日本語フォントが見つかり、reportlab に登録済み（未登録ならここで登録）か
+- templates: 書類生成で使う雛形PDF・綴じ方ガイドPDFが読めるか
+- rasterizer: PDFプレビューに使う pdf2image と poppler（pdftoppm）があるか
+
+ロードバランサーから頻繁に呼ばれても負荷にならないよう、結果は CACHE_SECONDS 秒だけ
+プロセス内に保持する。同時に呼ばれた場合も実際のチェックは1回だけ行う。
+"""
+
+import os
+import shutil
+import threading
+import time
+
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CACHE_SECONDS = float(os.getenv("READINESS_CACHE_SECONDS", "5"))
+
+# teikan.py の各ジェネレーターと同じ探索順
+FONT_CANDIDATES = [
+    os.path.join(_APP_DIR, 'fonts', 'ipag.ttf'),
+    '/usr/share/fonts/opentype/ipafont-gothic/ipag.ttf',
+    '/usr/share/fonts/truetype/fonts-japanese-gothic.ttf',
+]
+FONT_NAMES = ('JapaneseGothic', 'IPAGothic')
+
+TEMPLATE_PDFS = [
+    os.path.join(_APP_DIR, 'templates', 'teikan', 'inkan_todokede_template.pdf'),
+    os.path.join(_APP_DIR, 'templates', 'teikan', 'inkan_card_template.pdf'),
+    os.path.join(_APP_DIR, 'services', 'guide_kk.pdf'),
+    os.path.join(_APP_DIR, 'services', 'guide_gk.pdf'),
+    os.path.join(_APP_DIR, 'services', 'guide_ippan.pdf'),
+]
+
+
+# ========================================
+# 個別チェック（(ok, 詳細) を返す）
+# ========================================
+
+def check_db():
+    from sqlalchemy import text
+    from app.db import engine
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    pool = engine.pool
+    status = pool.status() if hasattr(pool, "status") else type(pool).__name__
+    return True, status
+
+
+def check_fonts():
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    path = next((p for p in FONT_CANDIDATES if os.path.exists(p)), None)
+    if not path:
+        return False, "日本語フォントが見つかりません"
+    registered = set(pdfmetrics.getRegisteredFontNames())
+    for name in FONT_NAMES:
+        if name not in registered:
+            pdfmetrics.registerFont(TTFont(name, path))
+    return True, path
+
+
+def check_templates():
+    missing = []
+    for path in TEMPLATE_PDFS:
+        try:
+            with open(path, 'rb') as f:
+                if f.read(5) != b'%PDF-':
+                    missing.append(os.path.basename(path))
+        except OSError:
+            missing.append(os.path.basename(path))
+    if missing:
+        return False, "読めない雛形: " + ", ".join(missing)
+    return True, f"{len(TEMPLATE_PDFS)} files"
+
+
+def check_rasterizer():
+    try:
+        import pdf2image  # noqa: F401
+    except ImportError:
+        return False, "pdf2image がインストールされていません"
+    pdftoppm = shutil.which("pdftoppm")
+    if not pdftoppm:
+        return False, "poppler（pdftoppm）が見つかりません"
+    return True, pdftoppm
+
+
+CHECKS = [
+    ("db", check_db),
+    ("fonts", check_fonts),
+    ("templates", check_templates),
+    ("rasterizer", check_rasterizer),
+]
+
+
+# ========================================
+# 実行・キャッシュ
+# ========================================
+
+_lock = threading.Lock()
+_cached = None
+_cached_at = 0.0
+
+
+def _run_checks():
+    results = {}
+    for name, check in CHECKS:
+        started = time.perf_counter()
+        try:
+            ok, detail = check()
+        except Exception as e:
+            ok, detail = False, f"{type(e).__name__}: {e}"
+        results[name] = {
+            "ok": ok,
+            "detail": detail,
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+    return results
+
+
+def readiness():
+    """
+    全チェックの結果を (全て正常か, {名前: 結果}, キャッシュからの応答か) で返す
+    """
+    global _cached, _cached_at
+    if _cached is not None and time.monotonic() - _cached_at < CACHE_SECONDS:
+        return all(r["ok"] for r in _cached.values()), _cached, True
+    with _lock:
+        # 待っている間に他のスレッドが更新していればそれを使う
+        if _cached is not None and time.monotonic() - _cached_at < CACHE_SECONDS:
+            return all(r["ok"] for r in _cached.values()), _cached, True
+        _cached = _run_checks()
+        _cached_at = time.monotonic()
+        return all(r["ok"] for r in _cached.values()), _cached, False
@@ -0,0 +1,438 @@
+# -*- coding: utf-8 -*-
+"""
+定款の版の履歴（T_定款履歴）
+
+autosave_draft / save は T_定款 の data_json を上書きするため、過去の内容はここに残す。
+毎回の全文を保存すると大きくなるので、定款ごとに次のような連なりで保存する。
+
+- snapshot: 版の JSON 全体を zlib で圧縮したもの
+- delta:    直前の版からの差分（JSON Patch の add / remove / replace）を zlib で圧縮したもの
+
+SNAPSHOT_EVERY 版ごと（または差分の方が大きくなったとき）にスナップショットを置くので、
+どの版も「直近のスナップショット + 最大 SNAPSHOT_EVERY-1 個の差分」を1回のクエリで読めば復元できる。
+内容も状態も前の版と同じ保存は記録しない。
+
+古い版は compact()（teikan_revisions.py compact）で間引く。KEEP_DAYS 日より新しい版はすべて残し、
+それより古い版は「最初の版・最新の版・日ごとの最後の版・状態が変わった版」だけを残す。
+定款を削除したときは、その定款の履歴も消す（forget）。SQLite では削除した最新の定款の ID が
+次に作る定款で再利用されることがあり、残しておくと別の定款の版として続きに記録されてしまうため。
+"""
+
+import hashlib
+import json
+import os
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from app.db import engine
+from app.models_login import TeikanRevision
+from app.services.rollups import JST
+
+SNAPSHOT_EVERY = int(os.getenv("REVISION_SNAPSHOT_EVERY", "20"))
+KEEP_DAYS = int(os.getenv("REVISION_KEEP_DAYS", "30"))
+
+TABLE = TeikanRevision.__table__
+
+SNAPSHOT = 'snapshot'
+DELTA = 'delta'
+
+# 差分画面で使う項目名（data_json のキー → 表示名）
+FIELD_LABELS = {
+    'company_type': '法人形態',
+    'company_name': '商号',
+    'company_name_kana': '商号（フリガナ）',
+    'company_type_position': '法人形態の位置',
+    'registration_method': '登記の申請方法',
+    'postal_code': '郵便番号',
+    'address': '本店所在地',
+    'address_detail': '本店所在地（番地以降）',
+    'capital': '資本金',
+    'capital_amount': '資本金の額',
+    'total_shares': '発行可能株式総数',
+    'phone': '電話番号',
+    'has_board_of_directors': '取締役会の設置',
+    'members': '社員・発起人',
+    'purposes': '目的',
+    'fiscal_start_month': '事業年度の開始月',
+    'fiscal_start_day': '事業年度の開始日',
+    'fiscal_end_month': '事業年度の終了月',
+    'fiscal_end_day': '事業年度の終了日',
+    'established_date': '設立日',
+    'name': '氏名',
+    'name_kana': '氏名（フリガナ）',
+    'is_representative': '代表者',
+    'contribution': '出資額',
+    'birth_era': '生年月日（元号）',
+    'birth_year': '生年月日（年）',
+    'birth_month': '生年月日（月）',
+    'birth_day': '生年月日（日）',
+}
+
+
+def _canonical(data):
+    """キーを並べ替えた JSON（ハッシュと保存に使う）"""
+    return json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def data_hash(data):
+    return hashlib.sha256(_canonical(data)).hexdigest()
+
+
+# ========================================
+# JSON Patch（RFC 6902 の add / remove / replace のみ）
+# ========================================
+
+def _escape(token):
+    return str(token).replace('~', '~0').replace('/', '~1')
+
+
+def _unescape(token):
+    return token.replace('~1', '/').replace('~0', '~')
+
+
+def _same(a, b):
+    # True == 1 のように型が違っても等しくなる値を別物として扱う
+    return type(a) is type(b) and a == b
+
+
+def make_patch(old, new, path=''):
+    """old を new にする操作の一覧を返す"""
+    if _same(old, new):
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({'op': 'remove', 'path': f'{path}/{_escape(key)}'})
+        for key, value in new.items():
+            child = f'{path}/{_escape(key)}'
+            if key not in old:
+                ops.append({'op': 'add', 'path': child, 'value': value})
+            else:
+                ops.extend(make_patch(old[key], value, child))
+        return ops
+    if isinstance(old, list) and isinstance(new, list):
+        ops = []
+        for i in range(min(len(old), len(new))):
+            ops.extend(make_patch(old[i], new[i], f'{path}/{i}'))
+        for i in range(len(old), len(new)):
+            ops.append({'op': 'add', 'path': f'{path}/{i}', 'value': new[i]})
+        # 後ろから消すと、残りの要素の位置がずれない
+        for i in range(len(old) - 1, len(new) - 1, -1):
+            ops.append({'op': 'remove', 'path': f'{path}/{i}'})
+        return ops
+    return [{'op': 'replace', 'path': path, 'value': new}]
+
+
+def apply_patch(doc, ops):
+    """doc に操作を順に適用した結果を返す（doc はその場で書き換える）"""
+    for op in ops:
+        if op['path'] == '':
+            doc = op['value']
+            continue
+        tokens = [_unescape(t) for t in op['path'].split('/')[1:]]
+        parent = doc
+        for token in tokens[:-1]:
+            parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+        last = tokens[-1]
+        if isinstance(parent, list):
+            index = len(parent) if last == '-' else int(last)
+            if op['op'] == 'add':
+                parent.insert(index, op['value'])
+            elif op['op'] == 'remove':
+                del parent[index]
+            else:
+                parent[index] = op['value']
+        elif op['op'] == 'remove':
+            del parent[last]
+        else:
+            parent[last] = op['value']
+    return doc
+
+
+# ========================================
+# 記録と復元
+# ========================================
+
+def _latest(conn, doc_id):
+    return conn.execute(
+        select(TABLE.c.revision, TABLE.c.base_revision, TABLE.c.data_hash, TABLE.c.status)
+        .where(TABLE.c.document_id == doc_id)
+        .order_by(TABLE.c.revision.desc())
+        .limit(1)
+    ).first()
+
+
+def _encode(doc_id, revision, base_revision, data, previous, status, data_hash_, force_snapshot):
+    """版1つ分の行を作る（previous が無いか force_snapshot ならスナップショット）"""
+    raw = _canonical(data)
+    payload = zlib.compress(raw, 9)
+    kind = SNAPSHOT
+    if previous is not None and not force_snapshot:
+        delta = zlib.compress(_canonical(make_patch(previous, data)), 9)
+        if len(delta) < len(payload):
+            kind, payload = DELTA, delta
+    return {
+        'document_id': doc_id,
+        'revision': revision,
+        'kind': kind,
+        'base_revision': revision if kind == SNAPSHOT else base_revision,
+        'payload': payload,
+        'data_hash': data_hash_,
+        'data_size': len(raw),
+        'status': status,
+    }
+
+
+def record(conn, doc_id, tenant_id, data, status, created_by=None, previous=None):
+    """
+    定款の新しい版を記録する（呼び出し側のトランザクション内で実行する）
+
+    previous には上書き前の data（分かっていれば）を渡す。最新の版と一致すれば復元を省ける。
+    conn は Session でも Connection でもよい。
+
+    Returns:
+        int | None: 記録した版番号（前の版と同じ内容・状態なら記録せず None）
+    """
+    digest = data_hash(data)
+    latest = _latest(conn, doc_id)
+    if latest is not None and latest.data_hash == digest and latest.status == status:
+        return None
+
+    if latest is None:
+        row = _encode(doc_id, 1, 1, data, None, status, digest, True)
+    else:
+        revision = latest.revision + 1
+        force_snapshot = revision - latest.base_revision >= SNAPSHOT_EVERY
+        if previous is None or data_hash(previous) != latest.data_hash:
+            previous = None if force_snapshot else reconstruct(conn, doc_id, latest.revision)
+        row = _encode(doc_id, revision, latest.base_revision, data, previous, status, digest, force_snapshot)
+
+    row.update(tenant_id=tenant_id, created_by=created_by)
+    try:
+        with conn.begin_nested():
+            conn.execute(insert(TABLE).values(row))
+    except IntegrityError:
+        # 同じ定款を同時に保存した別のリクエストが先に同じ版番号を使った。
+        # 定款自体の保存は続け、この版は次の保存に含まれる
+        return None
+    return row['revision']
+
+
+def forget(conn, doc_id):
+    """定款の履歴をすべて削除する（定款の削除と同じトランザクション内で実行する）"""
+    conn.execute(delete(TABLE).where(TABLE.c.document_id == doc_id))
+
+
+def reconstruct(conn, doc_id, revision):
+    """指定した版の data を復元する（無ければ None）"""
+    base = (
+        select(TABLE.c.base_revision)
+        .where(TABLE.c.document_id == doc_id, TABLE.c.revision == revision)
+        .scalar_subquery()
+    )
+    rows = conn.execute(
+        select(TABLE.c.kind, TABLE.c.payload, TABLE.c.data_hash)
+        .where(TABLE.c.document_id == doc_id, TABLE.c.revision >= base, TABLE.c.revision <= revision)
+        .order_by(TABLE.c.revision)
+    ).all()
+    if not rows:
+        return None
+    if rows[0].kind != SNAPSHOT:
+        raise ValueError(f'定款 {doc_id} の版 {revision} の起点がスナップショットではありません')
+
+    data = None
+    for kind, payload, _ in rows:
+        decoded = json.loads(zlib.decompress(payload))
+        data = decoded if kind == SNAPSHOT else apply_patch(data, decoded)
+    if data_hash(data) != rows[-1].data_hash:
+        raise ValueError(f'定款 {doc_id} の版 {revision} を正しく復元できませんでした')
+    return data
+
+
+def load(doc_id, revision):
+    """reconstruct() を自前の接続で呼ぶ"""
+    with engine.connect() as conn:
+        return reconstruct(conn, doc_id, revision)
+
+
+def list_revisions(doc_id):
+    """定款の版の一覧（新しい順）"""
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(TABLE.c.revision, TABLE.c.kind, TABLE.c.status, TABLE.c.tenant_id,
+                   TABLE.c.created_by, TABLE.c.created_at, TABLE.c.data_size,
+                   func.length(TABLE.c.payload).label('stored_size'))
+            .where(TABLE.c.document_id == doc_id)
+            .order_by(TABLE.c.revision.desc())
+        ).all()
+    return [dict(row._mapping) for row in rows]
+
+
+# ========================================
+# 差分表示
+# ========================================
+
+def _flatten(value, path=(), out=None):
+    """入れ子の data を {(キー, 添字, ...): 値} にする"""
+    if out is None:
+        out = {}
+    if isinstance(value, dict) and value:
+        for key, child in value.items():
+            _flatten(child, path + (key,), out)
+    elif isinstance(value, list) and value:
+        for i, child in enumerate(value):
+            _flatten(child, path + (i,), out)
+    else:
+        out[path] = value
+    return out
+
+
+def _label(path):
+    parts = []
+    for token in path:
+        if isinstance(token, int):
+            parts.append(f'{token + 1}')
+        else:
+            parts.append(FIELD_LABELS.get(token, token))
+    return ' ／ '.join(parts) or '（全体）'
+
+
+def _display(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'はい' if value else 'いいえ'
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def diff(old, new):
+    """
+    2つの版の違いを表示用の行にする
+
+    Returns:
+        list: [{'field': 項目名, 'change': 'added' | 'removed' | 'changed', 'old': 文字列, 'new': 文字列}]
+    """
+    before = _flatten(old or {})
+    after = _flatten(new or {})
+    rows = []
+    for path in list(before) + [p for p in after if p not in before]:
+        if path not in after:
+            change = 'removed'
+        elif path not in before:
+            change = 'added'
+        elif _same(before[path], after[path]):
+            continue
+        else:
+            change = 'changed'
+        rows.append({
+            'field': _label(path),
+            'change': change,
+            'old': _display(before.get(path)),
+            'new': _display(after.get(path)),
+        })
+    return rows
+
+
+# ========================================
+# 保持期間による間引き
+# ========================================
+
+def _day_of(timestamp):
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(JST).date()
+
+
+def _revisions_to_keep(rows, cutoff):
+    """rows（古い順）のうち残す版番号"""
+    keep = {rows[0].revision, rows[-1].revision}
+    last_of_day = {}
+    previous_status = None
+    for row in rows:
+        if row.created_at is None or row.created_at >= cutoff:
+            keep.add(row.revision)
+        else:
+            last_of_day[_day_of(row.created_at)] = row.revision
+        if row.status != previous_status:
+            keep.add(row.revision)
+        previous_status = row.status
+    keep.update(last_of_day.values())
+    return keep
+
+
+def _compact_document(conn, doc_id, cutoff):
+    """1つの定款の履歴を間引いて組み直す。(残した版数, 消した版数) を返す"""
+    rows = conn.execute(
+        select(TABLE).where(TABLE.c.document_id == doc_id).order_by(TABLE.c.revision)
+    ).all()
+    keep = _revisions_to_keep(rows, cutoff)
+    if len(keep) == len(rows):
+        return len(rows), 0
+
+    # すべての版を古い順に復元しながら、残す版だけを連なりとして組み直す
+    rebuilt = []
+    data = None
+    kept_data = None
+    base_revision = None
+    chain = 0  # 直近のスナップショットから数えた行数
+    for row in rows:
+        decoded = json.loads(zlib.decompress(row.payload))
+        data = decoded if row.kind == SNAPSHOT else apply_patch(data, decoded)
+        if row.revision not in keep:
+            continue
+        new_row = _encode(doc_id, row.revision, base_revision, data, kept_data, row.status,
+                          row.data_hash, chain == 0 or chain >= SNAPSHOT_EVERY)
+        new_row.update(tenant_id=row.tenant_id, created_by=row.created_by, created_at=row.created_at)
+        rebuilt.append(new_row)
+        base_revision = new_row['base_revision']
+        chain = 1 if new_row['kind'] == SNAPSHOT else chain + 1
+        # 次の版の差分の起点にするため、書き換えられない複製を持っておく
+        kept_data = json.loads(_canonical(data))
+
+    conn.execute(delete(TABLE).where(TABLE.c.document_id == doc_id))
+    conn.execute(insert(TABLE), rebuilt)
+    return len(rebuilt), len(rows) - len(rebuilt)
+
+
+def compact(keep_days=None, doc_id=None):
+    """
+    保持期間より古い版を間引く（doc_id を省略するとすべての定款）
+
+    定款ごとに1トランザクションで組み直すので、途中で止めても履歴は壊れない。
+
+    Returns:
+        dict: {'documents': 間引いた定款数, 'kept': 残した版数, 'removed': 消した版数,
+               'bytes_before': 間引く前の保存サイズ, 'bytes_after': 間引いた後の保存サイズ}
+    """
+    keep_days = KEEP_DAYS if keep_days is None else keep_days
+    cutoff = datetime.utcnow() - timedelta(days=keep_days)
+    size = select(func.coalesce(func.sum(func.length(TABLE.c.payload)), 0))
+    if doc_id is not None:
+        size = size.where(TABLE.c.document_id == doc_id)
+
+    with engine.connect() as conn:
+        bytes_before = conn.execute(size).scalar()
+        query = select(TABLE.c.document_id).where(TABLE.c.created_at < cutoff).distinct()
+        if doc_id is not None:
+            query = query.where(TABLE.c.document_id == doc_id)
+        doc_ids = conn.execute(query).scalars().all()
+
+    stats = {'documents': 0, 'kept': 0, 'removed': 0}
+    for target in doc_ids:
+        with engine.begin() as conn:
+            kept, removed = _compact_document(conn, target, cutoff)
+        if removed:
+            stats['documents'] += 1
+            stats['kept'] += kept
+            stats['removed'] += removed
+
+    with engine.connect() as conn:
+        stats['bytes_before'] = bytes_before
+        stats['bytes_after'] = conn.execute(size).scalar()
+    return stats
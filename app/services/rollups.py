@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+定款の利用状況の集計（システム管理者向け分析ダッシュボード用）
+
+T_定款 を毎回集計し直す（data_json を含む全件スキャン）代わりに、次の2つの集計テーブルを
+定款の保存・削除・ダウンロードのたびに差分で更新する。
+
+- T_定款集計: テナント×法人形態×状態（下書き／完成）ごとの現在の定款数
+- T_定款集計_日次: テナント×日ごとの作成・完成・削除・ダウンロード数
+
+定款の更新と同じトランザクションで集計も更新するため、保存が失敗すれば集計も戻る。
+既存データの取り込みや、ずれた集計の作り直しは rebuild()（teikan_rollups.py backfill）で行う。
+日付は日本時間で区切る（DB の日時は UTC として扱う）。
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.db import engine
+from app.models_login import TeikanDocument, TeikanStatusRollup, TeikanDailyRollup
+
+JST = timezone(timedelta(hours=9))
+
+STATUS_TABLE = TeikanStatusRollup.__table__
+DAILY_TABLE = TeikanDailyRollup.__table__
+
+# ダウンロードの種類 → 日次集計の列
+DOWNLOAD_COLUMNS = {'pdf': 'pdf_downloads', 'zip': 'zip_downloads'}
+
+DAILY_COLUMNS = ('documents_created', 'documents_completed', 'documents_deleted',
+                 'pdf_downloads', 'zip_downloads')
+
+
+def today():
+    return datetime.now(JST).date()
+
+
+def _day_of(timestamp):
+    """DB の日時（タイムゾーン無しは UTC）を日本時間の日付にする"""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(JST).date()
+
+
+def _increment(conn, table, keys, deltas):
+    """keys の行の列を deltas だけ増やす（行が無ければ作る）"""
+    deltas = {column: n for column, n in deltas.items() if n}
+    if not deltas:
+        return
+    where = and_(*(table.c[k] == v for k, v in keys.items()))
+    values = {column: table.c[column] + n for column, n in deltas.items()}
+    if conn.execute(update(table).where(where).values(values)).rowcount:
+        return
+    try:
+        with conn.begin_nested():
+            conn.execute(insert(table).values({**keys, **deltas}))
+    except IntegrityError:
+        # 同時に別のリクエストが行を作った
+        conn.execute(update(table).where(where).values(values))
+
+
+def document_changed(conn, tenant_id, before, after):
+    """
+    定款1件の変更を集計に反映する（呼び出し側のトランザクション内で実行する）
+
+    before / after は変更前後の (法人形態, 状態)。新規作成なら before、削除なら after が None。
+    conn は Session でも Connection でもよい。
+    """
+    tenant_id = tenant_id or 0
+    if before != after:
+        for state, delta in ((before, -1), (after, 1)):
+            if state:
+                company_type, status = state
+                _increment(conn, STATUS_TABLE,
+                           {'tenant_id': tenant_id, 'company_type': company_type, 'status': status},
+                           {'documents': delta})
+
+    completed_now = after is not None and after[1] == 'completed' and (before is None or before[1] != 'completed')
+    _increment(conn, DAILY_TABLE, {'tenant_id': tenant_id, 'day': today()}, {
+        'documents_created': 1 if before is None else 0,
+        'documents_completed': 1 if completed_now else 0,
+        'documents_deleted': 1 if after is None else 0,
+    })
+
+
+def count_download(tenant_id, kind):
+    """PDF（kind='pdf'）または ZIP 一式（kind='zip'）のダウンロードを1件数える"""
+    with engine.begin() as conn:
+        _increment(conn, DAILY_TABLE, {'tenant_id': tenant_id or 0, 'day': today()},
+                   {DOWNLOAD_COLUMNS[kind]: 1})
+
+
+# ========================================
+# 作り直し（バックフィル）
+# ========================================
+
+def rebuild(tenant_id=None, daily=True, batch_size=1000):
+    """
+    T_定款 から集計を作り直す（tenant_id を省略すると全テナント）
+
+    現在の定款数はそのまま数え直す。日次の作成数・完成数は作成日時・更新日時から推定し直す
+    （削除数・ダウンロード数は T_定款 に残らないため、記録済みの値をそのまま残す）。
+    data_json は読まない。
+
+    Returns:
+        dict: {'documents': 数えた定款数, 'status_rows': 集計行数, 'daily_rows': 日次の行数}
+    """
+    doc = TeikanDocument.__table__
+    doc_tenant = func.coalesce(doc.c.tenant_id, 0)
+    scope = (doc_tenant == tenant_id) if tenant_id is not None else True
+
+    with engine.begin() as conn:
+        status_rows = conn.execute(
+            select(doc_tenant, func.coalesce(doc.c.company_type, '合同会社'),
+                   func.coalesce(doc.c.status, 'draft'), func.count())
+            .where(scope)
+            .group_by(doc_tenant, doc.c.company_type, doc.c.status)
+        ).all()
+
+        # 同じ (テナント, 法人形態, 状態) が coalesce でまとまる場合に備えて足し合わせる
+        counts = defaultdict(int)
+        for tid, company_type, status, n in status_rows:
+            counts[(tid, company_type, status)] += n
+        status_where = (STATUS_TABLE.c.tenant_id == tenant_id) if tenant_id is not None else True
+        conn.execute(delete(STATUS_TABLE).where(status_where))
+        if counts:
+            conn.execute(insert(STATUS_TABLE), [
+                {'tenant_id': tid, 'company_type': company_type, 'status': status, 'documents': n}
+                for (tid, company_type, status), n in counts.items()
+            ])
+
+        daily_counts = defaultdict(lambda: [0, 0])
+        documents = 0
+        if daily:
+            result = conn.execution_options(yield_per=batch_size).execute(
+                select(doc_tenant, doc.c.created_at, doc.c.updated_at, doc.c.status).where(scope)
+            )
+            for tid, created_at, updated_at, status in result:
+                documents += 1
+                if created_at:
+                    daily_counts[(tid, _day_of(created_at))][0] += 1
+                if status == 'completed' and (updated_at or created_at):
+                    daily_counts[(tid, _day_of(updated_at or created_at))][1] += 1
+
+            daily_where = (DAILY_TABLE.c.tenant_id == tenant_id) if tenant_id is not None else True
+            conn.execute(update(DAILY_TABLE).where(daily_where)
+                         .values(documents_created=0, documents_completed=0))
+            for (tid, day), (created, completed) in daily_counts.items():
+                keys = {'tenant_id': tid, 'day': day}
+                where = and_(DAILY_TABLE.c.tenant_id == tid, DAILY_TABLE.c.day == day)
+                if not conn.execute(update(DAILY_TABLE).where(where).values(
+                        documents_created=created, documents_completed=completed)).rowcount:
+                    conn.execute(insert(DAILY_TABLE).values(
+                        **keys, documents_created=created, documents_completed=completed))
+        else:
+            documents = sum(counts.values())
+
+    return {'documents': documents, 'status_rows': len(counts), 'daily_rows': len(daily_counts)}
+
+
+# ========================================
+# ダッシュボード用の読み出し（集計テーブルだけを読む）
+# ========================================
+
+def documents_by_tenant():
+    """{テナントID: {'draft': 件数, 'completed': 件数}}"""
+    result = defaultdict(lambda: {'draft': 0, 'completed': 0})
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(STATUS_TABLE.c.tenant_id, STATUS_TABLE.c.status, func.sum(STATUS_TABLE.c.documents))
+            .group_by(STATUS_TABLE.c.tenant_id, STATUS_TABLE.c.status)
+        ).all()
+    for tid, status, n in rows:
+        result[tid][status] = int(n or 0)
+    return dict(result)
+
+
+def company_type_mix(tenant_id=None):
+    """[(法人形態, 下書き数, 完成数)]（定款数の多い順）"""
+    query = select(STATUS_TABLE.c.company_type, STATUS_TABLE.c.status, func.sum(STATUS_TABLE.c.documents))
+    if tenant_id is not None:
+        query = query.where(STATUS_TABLE.c.tenant_id == tenant_id)
+    with engine.connect() as conn:
+        rows = conn.execute(query.group_by(STATUS_TABLE.c.company_type, STATUS_TABLE.c.status)).all()
+    mix = defaultdict(lambda: [0, 0])
+    for company_type, status, n in rows:
+        mix[company_type][0 if status == 'draft' else 1] += int(n or 0)
+    return sorted(((t, d, c) for t, (d, c) in mix.items()), key=lambda r: -(r[1] + r[2]))
+
+
+def daily_totals(days=30, tenant_id=None):
+    """直近 days 日分の日次集計を古い順に返す（記録の無い日も0で埋める）"""
+    since = today() - timedelta(days=days - 1)
+    query = (
+        select(DAILY_TABLE.c.day, *(func.sum(DAILY_TABLE.c[c]) for c in DAILY_COLUMNS))
+        .where(DAILY_TABLE.c.day >= since)
+        .group_by(DAILY_TABLE.c.day)
+    )
+    if tenant_id is not None:
+        query = query.where(DAILY_TABLE.c.tenant_id == tenant_id)
+    with engine.connect() as conn:
+        rows = {row[0]: row[1:] for row in conn.execute(query)}
+    series = []
+    for i in range(days):
+        day = since + timedelta(days=i)
+        values = rows.get(day, (0,) * len(DAILY_COLUMNS))
+        series.append({'day': day, **{c: int(v or 0) for c, v in zip(DAILY_COLUMNS, values)}})
+    return series
+
+
+def window_totals_by_tenant(days=30):
+    """直近 days 日分のテナントごとの合計 {テナントID: {列: 件数}}"""
+    since = today() - timedelta(days=days - 1)
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(DAILY_TABLE.c.tenant_id, *(func.sum(DAILY_TABLE.c[c]) for c in DAILY_COLUMNS))
+            .where(DAILY_TABLE.c.day >= since)
+            .group_by(DAILY_TABLE.c.tenant_id)
+        ).all()
+    return {row[0]: {c: int(v or 0) for c, v in zip(DAILY_COLUMNS, row[1:])} for row in rows}
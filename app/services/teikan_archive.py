@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+定款アーカイブ（T_定款）のNDJSON一括エクスポート／インポート
+
+- エクスポート: サーバーサイドカーソルで行を少しずつ読み出し、
+  1行1件のNDJSONをgzip圧縮しながらストリームで返す
+- インポート: NDJSON（gzip可）を1行ずつ読み、一定件数ごとにまとめてUPSERTする
+どちらもアーカイブの件数に関わらず一定のメモリで動作する
+"""
+
+import gzip
+import io
+import json
+import zlib
+from datetime import datetime
+
+from sqlalchemy import select, bindparam
+
+from app.db import engine
+from app.models_login import TeikanDocument
+from app.services import rollups
+
+# 1回のDB往復で処理する件数
+DEFAULT_BATCH_SIZE = 500
+
+# アーカイブ1行に含めるカラム
+_EXPORT_COLUMNS = ('id', 'tenant_id', 'created_by', 'company_name', 'company_type', 'status')
+
+_table = TeikanDocument.__table__
+
+
+def _isoformat(value):
+    """日時をISO形式の文字列にする（Noneはそのまま）"""
+    return value.isoformat() if value else None
+
+
+def _parse_datetime(value):
+    """ISO形式の文字列を日時に戻す（不正な値はNone）"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def iter_export_lines(tenant_id, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    テナントの定款を1件ずつNDJSONの行（bytes）として返すジェネレータ
+
+    stream_results によりPostgreSQLではサーバーサイドカーソルを使用し、
+    batch_size 件ずつしかメモリに載せない。
+    """
+    stmt = (
+        select(_table)
+        .where(_table.c.tenant_id == tenant_id)
+        .order_by(_table.c.id)
+    )
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(stmt)
+        for partition in result.partitions():
+            for row in partition:
+                record = {col: row._mapping[col] for col in _EXPORT_COLUMNS}
+                try:
+                    record['data'] = json.loads(row.data_json) if row.data_json else {}
+                except ValueError:
+                    record['data'] = {}
+                record['created_at'] = _isoformat(row.created_at)
+                record['updated_at'] = _isoformat(row.updated_at)
+                yield (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def iter_gzip(chunks, level=6):
+    """bytes のイテラブルを gzip 圧縮しながら順次返すジェネレータ"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: gzipヘッダ付き
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def iter_export_gzip(tenant_id, batch_size=DEFAULT_BATCH_SIZE):
+    """テナントの定款アーカイブを gzip 圧縮済みNDJSONとしてストリームで返す"""
+    return iter_gzip(iter_export_lines(tenant_id, batch_size=batch_size))
+
+
+def open_archive_text(fileobj):
+    """
+    バイナリのファイルオブジェクトをテキストとして1行ずつ読めるように開く
+    先頭2バイトが gzip のマジックナンバーなら自動的に展開する
+    """
+    head = fileobj.read(2)
+    try:
+        fileobj.seek(0)
+    except (AttributeError, io.UnsupportedOperation):
+        # シークできないストリームは読み出した2バイトを戻して連結する
+        fileobj = io.BufferedReader(_PrefixedStream(head, fileobj))
+    if head == b'\x1f\x8b':
+        fileobj = gzip.GzipFile(fileobj=fileobj, mode='rb')
+    return io.TextIOWrapper(fileobj, encoding='utf-8')
+
+
+class _PrefixedStream(io.RawIOBase):
+    """先読みしたバイト列をストリームの先頭に戻すラッパー"""
+
+    def __init__(self, prefix, stream):
+        self._prefix = prefix
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if self._prefix:
+            n = min(len(b), len(self._prefix))
+            b[:n] = self._prefix[:n]
+            self._prefix = self._prefix[n:]
+            return n
+        data = self._stream.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+def _record_to_row(record, tenant_id, created_by):
+    """アーカイブの1レコードを T_定款 の行（dict）に変換する。不正なレコードはNone"""
+    if not isinstance(record, dict):
+        return None
+    data = record.get('data')
+    if data is None and record.get('data_json'):
+        # data_json 文字列形式のアーカイブにも対応
+        try:
+            data = json.loads(record['data_json'])
+        except ValueError:
+            return None
+    if not isinstance(data, dict):
+        return None
+    try:
+        doc_id = int(record['id']) if record.get('id') is not None else None
+    except (TypeError, ValueError):
+        doc_id = None
+    status = record.get('status') if record.get('status') in ('draft', 'completed') else 'completed'
+    return {
+        'id': doc_id,
+        'tenant_id': tenant_id,  # インポート先テナントに強制的に付け替える
+        # 作成者はインポートしたユーザーにする（アーカイブの ID は別環境・別テナントの管理者を指しうる）
+        'created_by': created_by,
+        'company_name': record.get('company_name') or data.get('company_name', ''),
+        'company_type': record.get('company_type') or data.get('company_type', '合同会社'),
+        'status': status,
+        'data_json': json.dumps(data, ensure_ascii=False),
+        'created_at': _parse_datetime(record.get('created_at')),
+        'updated_at': _parse_datetime(record.get('updated_at')),
+    }
+
+
+def _flush_batch(conn, batch, tenant_id, stats):
+    """
+    1バッチ分をUPSERTする
+    同じテナント内に同じIDの定款があれば更新、なければ新規IDで挿入する
+    """
+    ids = [row['id'] for row in batch if row['id'] is not None]
+    existing = set()
+    if ids:
+        existing = set(conn.execute(
+            select(_table.c.id).where(_table.c.tenant_id == tenant_id, _table.c.id.in_(ids))
+        ).scalars())
+
+    updates = []
+    inserts = []
+    for row in batch:
+        if row['id'] in existing:
+            updates.append({
+                'b_id': row['id'],
+                'b_company_name': row['company_name'],
+                'b_company_type': row['company_type'],
+                'b_status': row['status'],
+                'b_data_json': row['data_json'],
+                'b_updated_at': row['updated_at'] or datetime.now(),
+            })
+        else:
+            values = {k: v for k, v in row.items() if k != 'id' and v is not None}
+            inserts.append(values)
+
+    if updates:
+        conn.execute(
+            _table.update()
+            .where(_table.c.id == bindparam('b_id'))
+            .values(
+                company_name=bindparam('b_company_name'),
+                company_type=bindparam('b_company_type'),
+                status=bindparam('b_status'),
+                data_json=bindparam('b_data_json'),
+                updated_at=bindparam('b_updated_at'),
+            ),
+            updates,
+        )
+    # executemany はキーが揃っている必要があるので、キー集合ごとにまとめて挿入する
+    groups = {}
+    for values in inserts:
+        groups.setdefault(tuple(sorted(values)), []).append(values)
+    for rows in groups.values():
+        conn.execute(_table.insert(), rows)
+
+    stats['updated'] += len(updates)
+    stats['inserted'] += len(inserts)
+
+
+def import_lines(lines, tenant_id, created_by=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    NDJSONの行イテラブルをテナントの定款としてインポートする
+
+    batch_size 件ごとに1トランザクションでコミットするため、
+    途中で失敗しても直前のバッチまでは反映される。
+
+    Returns:
+        dict: {'inserted': 件数, 'updated': 件数, 'skipped': 件数}
+    """
+    stats = {'inserted': 0, 'updated': 0, 'skipped': 0}
+    batch = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            stats['skipped'] += 1
+            continue
+        row = _record_to_row(record, tenant_id, created_by)
+        if row is None:
+            stats['skipped'] += 1
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            with engine.begin() as conn:
+                _flush_batch(conn, batch, tenant_id, stats)
+            batch = []
+    if batch:
+        with engine.begin() as conn:
+            _flush_batch(conn, batch, tenant_id, stats)
+    # 取り込んだ分の定款数を集計に反映する（日次の件数は変えない）
+    rollups.rebuild(tenant_id or 0, daily=False)
+    return stats
+
+
+def import_archive(fileobj, tenant_id, created_by=None, batch_size=DEFAULT_BATCH_SIZE):
+    """NDJSON（gzip可）のファイルオブジェクトからテナントの定款をインポートする"""
+    return import_lines(open_archive_text(fileobj), tenant_id,
+                        created_by=created_by, batch_size=batch_size)
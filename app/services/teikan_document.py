@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+定款の文書モデル
+
+入力データ（セッションの teikan_data／T_定款.data_json）から、定款を
+「表紙・章見出し・条文・末尾の記名押印欄」のブロックの並びとして組み立てる。
+PDF（generate_teikan_pdf → teikan_layout）と画面のプレビュー（html()）は、どちらもこのブロックから作るので、
+文言は1か所で管理され、プレビューとダウンロードした PDF の内容は必ず一致する。
+
+ブロックは次のタプル（teikan_layout のキャッシュのキーにもなる）:
+    ('title', 表題, 商号)
+    ('chapter', 章見出し)
+    ('article', 条番号, 見出し, (本文の行, ...))      本文の空行は段落の区切り
+    ('closing', 結びの文, 作成日, (記名者, ...))
+
+html() の結果は入力内容のハッシュごとにプロセス内に保持するので、同じ版のプレビューは描画し直さない。
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from app import metrics
+
+# 入力内容ごとの HTML を保持する件数
+HTML_CACHE_SIZE = int(os.getenv("TEIKAN_HTML_CACHE_SIZE", "256"))
+
+_FULL_WIDTH_DIGITS = str.maketrans('0123456789', '０１２３４５６７８９')
+
+_html_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _full_company_name(data):
+    """法人形態を前後どちらに付けるか（company_type_position）を反映した商号"""
+    company_type = data.get('company_type', '合同会社')
+    company_name = data.get('company_name', '')
+    if data.get('company_type_position', 'before') == 'before':
+        return f'{company_type}{company_name}'
+    return f'{company_name}{company_type}'
+
+
+class _Builder:
+    """ブロックを順に積み上げる"""
+
+    def __init__(self):
+        self.blocks = []
+
+    def title(self, title, company_line):
+        self.blocks.append(('title', title, company_line))
+
+    def chapter(self, title):
+        self.blocks.append(('chapter', title))
+
+    def article(self, article_num, title, content_lines):
+        self.blocks.append(('article', str(article_num).translate(_FULL_WIDTH_DIGITS), title, tuple(content_lines)))
+
+    def closing(self, statement, date, signers):
+        self.blocks.append(('closing', statement, date, tuple(signers)))
+
+
+def build(data):
+    """定款のブロックのタプルを返す"""
+    doc = _Builder()
+
+    # ===== 共通データ取得 =====
+    company_type = data.get('company_type', '合同会社')
+    full_company_name = _full_company_name(data)
+    purposes = data.get('purposes', [])
+    address = data.get('address', '') + data.get('address_detail', '')
+    capital = data.get('capital', '0')
+    try:
+        capital_int = int(str(capital).replace(',', '').replace('円', ''))
+        capital_str = f'{capital_int:,}円'
+    except Exception:
+        capital_str = f'{capital}円'
+    members = data.get('members', [])
+    fiscal_start_month = data.get('fiscal_start_month', '3')
+    fiscal_start_day = data.get('fiscal_start_day', '1')
+    fiscal_end_month = data.get('fiscal_end_month', '2')
+    fiscal_end_day = data.get('fiscal_end_day', '末日')
+    if fiscal_end_day == '末日':
+        fiscal_end_str = f'{fiscal_end_month}月末日'
+    else:
+        fiscal_end_str = f'{fiscal_end_month}月{fiscal_end_day}日'
+    established_date = data.get('established_date', '') or '令和　　年　　月　　日'
+    rep_members = [m for m in members if m.get('is_representative')]
+    if not rep_members and members:
+        rep_members = [members[0]]
+    rep_lines = [f'　{m.get("name", "")}' for m in rep_members] or ['　（代表者氏名）']
+
+    # ===== 表紙 =====
+    doc.title('定　　款', full_company_name)
+
+    # ===== 法人形態別テンプレート =====
+    if company_type == '合同会社':
+        # ---------- 合同会社 ----------
+        doc.chapter('第一章　総則')
+        doc.article('1', '商号', [f'当会社は、{full_company_name}と称する。'])
+        purpose_lines = ['当会社は、次の事業を営むことを目的とする。']
+        for i, p in enumerate(purposes, 1):
+            purpose_lines.append(f'　{i}．{p}')
+        doc.article('2', '目的', purpose_lines)
+        doc.article('3', '本店の所在地', [f'当会社は、本店を{address}に置く。'])
+        doc.article('4', '公告方法', ['当会社の公告は、官報に掲載する方法により行う。'])
+
+        doc.chapter('第二章　社員及び出資')
+        contribution_lines = ['社員の氏名、住所及び出資の目的並びにその価額は、次のとおりである。']
+        for m in members:
+            contrib = m.get('contribution', '0')
+            try:
+                contrib_str = f"{int(str(contrib).replace(',','').replace('円','')):,}円"
+            except Exception:
+                contrib_str = f'{contrib}円'
+            contribution_lines += [f'　氏名：{m.get("name","")}', f'　住所：{m.get("address","")}', f'　出資の価額：金{contrib_str}', '']
+        doc.article('5', '社員の出資', contribution_lines)
+        doc.article('6', '資本金の額', [f'当会社の資本金の額は、金{capital_str}とする。'])
+
+        doc.chapter('第三章　業務執行及び代表')
+        doc.article('7', '業務執行社員', ['当会社の業務は、社員全員が執行する。', '業務を執行する社員は、当会社を代表する。'])
+        doc.article('8', '代表社員', ['当会社を代表する社員は、次のとおりとする。'] + rep_lines)
+        doc.article('9', '業務執行の決定', ['当会社の業務執行は、社員の過半数をもって決定する。'])
+
+        doc.chapter('第四章　計算')
+        doc.article('10', '事業年度', [f'当会社の事業年度は、毎年{fiscal_start_month}月{fiscal_start_day}日から翌年{fiscal_end_str}までとする。'])
+        doc.article('11', '利益の配当', ['当会社は、毎事業年度終了後、社員の出資の価額に応じて利益の配当を行う。'])
+
+        doc.chapter('第五章　附則')
+        doc.article('12', '設立に際して出資される財産の価額', [f'当会社の設立に際して出資される財産の価額は、金{capital_str}とする。'])
+        doc.article('13', '最初の事業年度', [f'当会社の最初の事業年度は、当会社成立の日から{fiscal_end_str}までとする。'])
+        doc.article('14', '設立時代表社員', ['当会社の設立時の代表社員は、次のとおりとする。'] + rep_lines)
+        doc.article('15', '附則', [f'当会社の定款は、{established_date}に作成した。'])
+
+        doc.closing(
+            '以上、合同会社設立のため、この定款を作成し、社員が記名押印する。',
+            established_date,
+            [f'社員　{m.get("name", "")}' for m in members],
+        )
+
+    elif company_type == '株式会社':
+        # ---------- 株式会社 ----------
+        total_shares = data.get('total_shares', '400')
+        doc.chapter('第一章　総則')
+        doc.article('1', '商号', [f'当会社は、{full_company_name}と称する。'])
+        purpose_lines = ['当会社は、次の事業を営むことを目的とする。']
+        for i, p in enumerate(purposes, 1):
+            purpose_lines.append(f'　{i}．{p}')
+        doc.article('2', '目的', purpose_lines)
+        doc.article('3', '本店の所在地', [f'当会社は、本店を{address}に置く。'])
+        doc.article('4', '公告方法', ['当会社の公告は、官報に掲載する方法により行う。'])
+
+        doc.chapter('第二章　株式')
+        doc.article('5', '発行可能株式総数', [f'当会社の発行可能株式総数は、{total_shares}株とする。'])
+        doc.article('6', '株券の不発行', ['当会社の株式については、株券を発行しない。'])
+        doc.article('7', '株式の譲渡制限', ['当会社の株式を譲渡するには、取締役会の承認を要する。ただし、当会社の株主に譲渡する場合は、この限りでない。'])
+
+        doc.chapter('第三章　株主総会')
+        doc.article('8', '招集', ['当会社の定時株主総会は、毎事業年度終了後３ヶ月以内に招集し、臨時株主総会は、必要に応じて招集する。'])
+        doc.article('9', '議長', ['株主総会の議長は、代表取締役社長がこれに当たる。'])
+        doc.article('10', '決議', ['株主総会の普通決議は、法令に別段の定めがある場合を除き、議決権を行使することができる株主の議決権の過半数を有する株主が出席し、出席した当該株主の議決権の過半数をもって行う。'])
+
+        doc.chapter('第四章　取締役')
+        doc.article('11', '取締役の員数', ['当会社の取締役は、１名以上とする。'])
+        doc.article('12', '取締役の選任', ['取締役は、株主総会の決議によって選任する。'])
+        doc.article('13', '代表取締役', ['当会社の代表取締役は、取締役の互選によって定める。'])
+        doc.article('14', '取締役の任期', ['取締役の任期は、選任後２年以内に終了する事業年度のうち最終のものに関する定時株主総会の終結の時までとする。ただし、定款変更その他正当な事由がある場合には、株主総会の決議によって短縮することができる。'])
+
+        doc.chapter('第五章　計算')
+        doc.article('15', '事業年度', [f'当会社の事業年度は、毎年{fiscal_start_month}月{fiscal_start_day}日から翌年{fiscal_end_str}までとする。'])
+        doc.article('16', '剰余金の配当', ['当会社の剰余金の配当は、毎事業年度末日の最終の株主名簿に記載された株主又は登録株式質権者に対して行う。'])
+
+        doc.chapter('第六章　附則')
+        doc.article('17', '設立に際して出資される財産の価額', [f'当会社の設立に際して出資される財産の価額は、金{capital_str}とする。'])
+        doc.article('18', '最初の事業年度', [f'当会社の最初の事業年度は、当会社成立の日から{fiscal_end_str}までとする。'])
+        doc.article('19', '設立時取締役', ['当会社の設立時取締役は、次のとおりとする。'] + rep_lines)
+        doc.article('20', '附則', [f'当会社の定款は、{established_date}に作成した。'])
+
+        doc.closing(
+            '以上、株式会社設立のため、この定款を作成し、発起人が記名押印する。',
+            established_date,
+            [f'発起人　{m.get("name", "")}' for m in members],
+        )
+
+    elif company_type == '一般社団法人':
+        # ---------- 一般社団法人 ----------
+        doc.chapter('第一章　総則')
+        doc.article('1', '名称', [f'当法人は、{full_company_name}と称する。'])
+        purpose_lines = ['当法人は、次の事業を行うことを目的とする。']
+        for i, p in enumerate(purposes, 1):
+            purpose_lines.append(f'　{i}．{p}')
+        doc.article('2', '目的', purpose_lines)
+        doc.article('3', '主たる事務所の所在地', [f'当法人は、主たる事務所を{address}に置く。'])
+        doc.article('4', '公告方法', ['当法人の公告は、官報に掲載する方法により行う。'])
+
+        doc.chapter('第二章　会員')
+        doc.article('5', '会員の種別', ['当法人の会員は、次の２種とする。', '　１．正会員　当法人の目的に賛同して入会した個人又は団体', '　２．賛助会員　当法人の事業を賛助するために入会した個人又は団体'])
+        doc.article('6', '入会', ['当法人の会員になろうとする者は、理事会が別に定める入会申込書を提出し、理事会の承認を得なければならない。'])
+        doc.article('7', '会費', ['会員は、社員総会において別に定める会費を納入しなければならない。'])
+
+        doc.chapter('第三章　社員総会')
+        doc.article('8', '社員総会の構成', ['当法人の社員総会は、正会員をもって構成する。'])
+        doc.article('9', '社員総会の開催', ['当法人の定時社員総会は、毎事業年度終了後３ヶ月以内に開催し、臨時社員総会は、必要に応じて開催する。'])
+        doc.article('10', '社員総会の決議', ['社員総会の決議は、法令又はこの定款に別段の定めがある場合を除き、総社員の議決権の過半数を有する社員が出席し、出席した当該社員の議決権の過半数をもって行う。'])
+
+        doc.chapter('第四章　役員')
+        doc.article('11', '役員の設置', ['当法人に、理事１名以上及び監事１名を置く。'])
+        doc.article('12', '役員の選任', ['理事及び監事は、社員総会の決議によって選任する。'])
+        doc.article('13', '代表理事', ['当法人の代表理事は、理事の互選によって定める。'])
+        doc.article('14', '役員の任期', ['理事の任期は、選任後２年以内に終了する事業年度のうち最終のものに関する定時社員総会の終結の時までとする。', '監事の任期は、選任後２年以内に終了する事業年度のうち最終のものに関する定時社員総会の終結の時までとする。'])
+
+        doc.chapter('第五章　計算')
+        doc.article('15', '事業年度', [f'当法人の事業年度は、毎年{fiscal_start_month}月{fiscal_start_day}日から翌年{fiscal_end_str}までとする。'])
+        doc.article('16', '剰余金の分配の禁止', ['当法人は、剰余金の分配を行わない。'])
+
+        doc.chapter('第六章　附則')
+        doc.article('17', '最初の事業年度', [f'当法人の最初の事業年度は、当法人成立の日から{fiscal_end_str}までとする。'])
+        doc.article('18', '設立時役員', ['当法人の設立時理事は、次のとおりとする。'] + rep_lines)
+        doc.article('19', '附則', [f'当法人の定款は、{established_date}に作成した。'])
+
+        doc.closing(
+            '以上、一般社団法人設立のため、この定款を作成し、設立時社員が記名押印する。',
+            established_date,
+            [f'設立時社員　{m.get("name", "")}' for m in members],
+        )
+
+    return tuple(doc.blocks)
+
+
+def html(data):
+    """定款本文の HTML（teikan/_document.html）。入力内容が同じなら前回の結果を返す"""
+    from flask import render_template
+    from markupsafe import Markup
+    from app.services.revisions import data_hash
+
+    key = data_hash(data)
+    with _lock:
+        cached = _html_cache.get(key)
+        if cached is not None:
+            _html_cache.move_to_end(key)
+    if cached is not None:
+        metrics.cache_hit('teikan_html')
+        return cached
+
+    metrics.cache_miss('teikan_html')
+    rendered = Markup(render_template('teikan/_document.html', blocks=build(data)))
+    with _lock:
+        _html_cache[key] = rendered
+        while len(_html_cache) > HTML_CACHE_SIZE:
+            _html_cache.popitem(last=False)
+    return rendered
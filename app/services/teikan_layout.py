@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+定款PDF（generate_teikan_pdf）のレイアウトキャッシュ
+
+定款は「表紙・章見出し・条文・末尾の記名押印欄」のブロックを上から順に並べたもので、
+ブロックごとに「開始位置（y 座標）と入力内容が同じなら、改行位置・改ページ・描画位置も同じ」になる。
+そこでブロック単位で配置結果（canvas への描画命令の列と終了位置）をキャッシュし、
+
+- 内容が変わったブロックだけ配置し直す
+- その後ろのブロックは開始位置がずれた場合だけ配置し直す（改ページで位置が揃えば再びキャッシュが効く）
+- 1段落の折り返し（1文字ずつ幅を測る、定款生成で一番重い処理）は位置に依存しないので、
+  配置し直す場合も文章が同じなら折り返し結果を使い回す
+
+ReportLab は出来上がったページを差し替えられないため、canvas への描画命令の実行は毎回行う。
+step3 で目的を1つ直してプレビュー／確認画面を開き直すような、少しずつ変わる生成が速くなる。
+"""
+
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+
+from reportlab.lib.units import mm
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from app import metrics
+
+# ブロックの配置結果を保持する件数（1件は数十〜数百の描画命令）
+BLOCK_CACHE_SIZE = int(os.getenv("TEIKAN_LAYOUT_CACHE_SIZE", "4096"))
+
+# 段落の折り返し結果を保持する件数
+WRAP_CACHE_SIZE = 8192
+
+# 用紙サイズ・余白・フォント（キャッシュのキーに含める）
+Page = namedtuple('Page', 'width height margin_left margin_right margin_top margin_bottom font_name font_bold')
+
+_blocks = OrderedDict()
+_lock = threading.Lock()
+
+
+@lru_cache(maxsize=WRAP_CACHE_SIZE)
+def wrap_text(text, font, size, max_width):
+    """text を max_width に収まるよう1文字単位で折り返し、行のタプルを返す"""
+    line = ''
+    lines = []
+    for char in text:
+        test_line = line + char
+        if stringWidth(test_line, font, size) <= max_width:
+            line = test_line
+        else:
+            if line:
+                lines.append(line)
+            line = char
+    if line:
+        lines.append(line)
+    return tuple(lines)
+
+
+class _Cursor:
+    """1ブロック分の描画命令を記録しながら、現在の y 座標と改ページを管理する"""
+
+    def __init__(self, page, y):
+        self.page = page
+        self.y = y
+        self.ops = []
+
+    def top(self):
+        return self.page.height - self.page.margin_top
+
+    def set_font(self, font, size):
+        self.ops.append(('font', font, size))
+
+    def draw(self, x, text):
+        self.ops.append(('text', x, self.y, text))
+
+    def draw_centered(self, text, font, size):
+        self.draw((self.page.width - stringWidth(text, font, size)) / 2, text)
+
+    def new_page(self):
+        self.ops.append(('page',))
+        self.y = self.top()
+
+    def check_page_break(self, needed_mm=25):
+        if self.y < self.page.margin_bottom + needed_mm * mm:
+            self.new_page()
+
+    def draw_wrapped(self, text, x, max_width, font, size=10.5, line_height=16):
+        self.set_font(font, size)
+        for ln in wrap_text(text, font, size, max_width):
+            if self.y < self.page.margin_bottom + 10 * mm:
+                self.new_page()
+            self.draw(x, ln)
+            self.y -= line_height
+
+
+def _layout_title(cur, title, company_line):
+    bold = cur.page.font_bold
+    cur.set_font(bold, 18)
+    cur.draw_centered(title, bold, 18)
+    cur.y -= 40
+    cur.set_font(bold, 14)
+    cur.draw_centered(company_line, bold, 14)
+    cur.y -= 60
+
+
+def _layout_chapter(cur, title):
+    cur.check_page_break(30)
+    cur.set_font(cur.page.font_bold, 12)
+    cur.draw_centered(title, cur.page.font_bold, 12)
+    cur.y -= 25
+
+
+def _layout_article(cur, article_num, title, content_lines):
+    page = cur.page
+    cur.check_page_break(25)
+    cur.set_font(page.font_bold, 10.5)
+    cur.draw(page.margin_left, f'第{article_num}条（{title}）')
+    cur.y -= 18
+    content_width = page.width - page.margin_left - page.margin_right
+    for line in content_lines:
+        if not line:
+            cur.y -= 8
+            continue
+        cur.check_page_break(15)
+        cur.draw_wrapped(line, page.margin_left + 5 * mm, content_width - 10 * mm, page.font_name)
+        cur.y -= 2
+    cur.y -= 8
+
+
+def _layout_closing(cur, statement, date, signers):
+    page = cur.page
+    cur.check_page_break(60)
+    cur.y -= 20
+    cur.set_font(page.font_name, 10.5)
+    cur.draw(page.margin_left, statement)
+    cur.y -= 30
+    cur.draw(page.margin_left, '　' * 20 + date)
+    cur.y -= 30
+    for signer in signers:
+        cur.check_page_break(20)
+        cur.draw(page.margin_left + 20 * mm, f'{signer}　　　　　　　印')
+        cur.y -= 25
+
+
+_LAYOUTS = {
+    'title': _layout_title,
+    'chapter': _layout_chapter,
+    'article': _layout_article,
+    'closing': _layout_closing,
+}
+
+
+def layout_block(block, y, page):
+    """ブロックを y から配置し、(描画命令のタプル, 配置後の y) を返す"""
+    key = (block, y, page)
+    with _lock:
+        cached = _blocks.get(key)
+        if cached is not None:
+            _blocks.move_to_end(key)
+    if cached is not None:
+        metrics.cache_hit('teikan_layout')
+        return cached
+
+    metrics.cache_miss('teikan_layout')
+    cur = _Cursor(page, y)
+    _LAYOUTS[block[0]](cur, *block[1:])
+    result = (tuple(cur.ops), cur.y)
+    with _lock:
+        _blocks[key] = result
+        while len(_blocks) > BLOCK_CACHE_SIZE:
+            _blocks.popitem(last=False)
+    return result
+
+
+def clear_cache():
+    """キャッシュを空にする（ベンチマークで初回生成の時間を測る場合など）"""
+    with _lock:
+        _blocks.clear()
+    wrap_text.cache_clear()
+
+
+class Document:
+    """定款のブロック（teikan_document.build() の要素）を上から順に配置し、render() で canvas に描画する"""
+
+    def __init__(self, page):
+        self.page = page
+        self.y = page.height - page.margin_top
+        self.ops = []
+
+    def add(self, block):
+        ops, self.y = layout_block(block, self.y, self.page)
+        self.ops.extend(ops)
+
+    def render(self, c):
+        for op in self.ops:
+            kind = op[0]
+            if kind == 'text':
+                c.drawString(op[1], op[2], op[3])
+            elif kind == 'font':
+                c.setFont(op[1], op[2])
+            else:
+                c.showPage()
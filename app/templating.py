@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Jinja テンプレートの高速化と計測
+
+- バイトコードキャッシュ: コンパイル済みのテンプレートを JINJA_CACHE_DIR に保存し、
+  ワーカーの再起動後もコンパイルし直さない（ソースが変われば自動的に作り直される）
+- {% cache %} タグ: 入力によって変わらない部分や、入力のハッシュで決まる部分の HTML を
+  プロセス内に保持する。キーにはテンプレート・タグの位置・ログイン中のテナントが自動で入る
+
+      {% cache 'company_types' %} ... {% endcache %}
+      {% cache 'teikan_doc', data|data_hash %} ... {% endcache %}
+
+  ブロックの中ではキーに含めていない変数（ユーザー名や CSRF トークンなど）を使わないこと。
+- テンプレートごとの描画時間: Server-Timing の template.<名前> と
+  teikan_template_render_duration_seconds に記録する
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from flask import before_render_template, g, has_request_context, session, template_rendered
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from . import metrics
+from .instrumentation import current as current_request_metrics
+
+BYTECODE_CACHE_ENABLED = os.getenv("JINJA_BYTECODE_CACHE", "1") not in ("0", "false", "False")
+CACHE_DIR = os.getenv("JINJA_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "teikan-jinja-cache")
+
+FRAGMENT_CACHE_SIZE = int(os.getenv("JINJA_FRAGMENT_CACHE_SIZE", "512"))
+FRAGMENT_CACHE_SECONDS = float(os.getenv("JINJA_FRAGMENT_CACHE_SECONDS", "3600"))
+
+
+def data_hash(value):
+    """テンプレートに渡した dict などの内容からキャッシュキーを作る（フィルター data_hash）"""
+    raw = json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+# ========================================
+# {% cache %} タグ
+# ========================================
+
+# キー → (有効期限, HTML)
+_fragments = OrderedDict()
+_fragments_lock = threading.Lock()
+
+
+def clear_fragments():
+    with _fragments_lock:
+        _fragments.clear()
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache 名前[, キー...] %} ... {% endcache %}"""
+
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        location = nodes.Const(f"{parser.name}:{lineno}")
+        call = self.call_method("_cached", [location, nodes.List(args)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _cached(self, location, args, caller):
+        tenant_id = session.get("tenant_id") if has_request_context() else None
+        key = (location, tenant_id, *map(str, args))
+        now = time.monotonic()
+        with _fragments_lock:
+            entry = _fragments.get(key)
+            if entry is not None and entry[0] > now:
+                _fragments.move_to_end(key)
+                metrics.cache_hit("template_fragment")
+                return entry[1]
+
+        metrics.cache_miss("template_fragment")
+        html = Markup(caller())
+        with _fragments_lock:
+            _fragments[key] = (now + FRAGMENT_CACHE_SECONDS, html)
+            _fragments.move_to_end(key)
+            while len(_fragments) > FRAGMENT_CACHE_SIZE:
+                _fragments.popitem(last=False)
+        return html
+
+
+# ========================================
+# 描画時間
+# ========================================
+
+def _span_name(template):
+    # Server-Timing の名前に使えない文字（/ など）を置き換える
+    name = re.sub(r"\.html?$", "", template.name or "string")
+    return "template." + re.sub(r"[^A-Za-z0-9_.-]", ".", name)
+
+
+def _on_before_render(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault("_template_started", []).append(time.perf_counter())
+
+
+def _on_rendered(sender, template, context, **extra):
+    if not has_request_context():
+        return
+    started = g.get("_template_started")
+    if not started:
+        return
+    elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+    metrics.observe_template(template.name or "string", elapsed_ms / 1000)
+    req_metrics = current_request_metrics()
+    if req_metrics is not None:
+        req_metrics.add_span(_span_name(template), elapsed_ms)
+
+
+def init_app(app):
+    """
+    Jinja の環境を作る前に呼ぶ（バイトコードキャッシュと {% cache %} タグは環境の作成時に設定する）
+    """
+    options = dict(app.jinja_options)
+    options["extensions"] = [*options.get("extensions", ()), FragmentCacheExtension]
+    if BYTECODE_CACHE_ENABLED:
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            options["bytecode_cache"] = FileSystemBytecodeCache(CACHE_DIR)
+        except OSError as e:
+            print(f"⚠️ テンプレートのバイトコードキャッシュを使えません（{CACHE_DIR}）: {e}")
+    app.jinja_options = options
+
+    app.add_template_filter(data_hash, "data_hash")
+    before_render_template.connect(_on_before_render, app)
+    template_rendered.connect(_on_rendered, app)
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+ワーカーのウォームアップ
+
+最初のリクエストで払うことになる初期化（PDF系ライブラリの読み込み・日本語フォントの登録・
+Jinja テンプレートのコンパイル）を先に済ませる。gunicorn で preload_app を使う場合は
+マスタープロセスで1回だけ実行し、fork 後のワーカーはその結果をそのまま共有する。
+"""
+
+import time
+
+# PDF 生成・プレビューで使うライブラリ（アプリのコードでは関数内で読み込んでいる）
+HEAVY_MODULES = [
+    'reportlab.pdfgen.canvas',
+    'reportlab.pdfbase.ttfonts',
+    'reportlab.platypus',
+    'pypdf',
+    'pdf2image',
+]
+
+_warmed = set()
+
+
+def _import_modules():
+    import importlib
+
+    for name in HEAVY_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+
+
+def _register_fonts():
+    from app.services.readiness import check_fonts
+
+    check_fonts()
+
+
+def _compile_templates(app):
+    env = app.jinja_env
+    for name in env.list_templates(filter_func=lambda n: n.endswith('.html')):
+        try:
+            env.get_template(name)
+        except Exception:
+            pass
+
+
+def warm(app):
+    """ウォームアップを行い、ステップごとの所要時間（ms）を返す（済んだステップは飛ばす）"""
+    steps = [
+        ('modules', _import_modules),
+        ('fonts', _register_fonts),
+        ('templates', lambda: _compile_templates(app)),
+    ]
+    timings = {}
+    for name, step in steps:
+        if name in _warmed:
+            continue
+        started = time.perf_counter()
+        try:
+            step()
+            _warmed.add(name)
+        except Exception as e:
+            print(f"⚠️ ウォームアップ失敗（{name}）: {e}")
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    return timings
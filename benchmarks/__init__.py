@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+"""
+ベンチマーク（書類生成・HTTP負荷試験）
+"""
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+書類生成（teikan.py の generate_*_pdf）のベンチマーク
+
+法人形態 × サイズ（small / medium / large）の合成データで各ジェネレーターを実行し、
+実時間・CPU時間・ピークRSS・出力バイト数・ページ数を計測してJSONで出力します。
+ベースラインを指定すると、実時間の中央値が閾値を超えて悪化したものを回帰として報告します。
+
+使い方:
+    python -m benchmarks.bench_generators -o report.json
+    python -m benchmarks.bench_generators --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_generators --baseline benchmarks/baseline.json --threshold 0.2
+    python -m benchmarks.bench_generators --only teikan,seal_registration --sizes large
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from benchmarks.fixtures import COMPANY_TYPES, SIZES, make_data
+
+# (名前, 関数名, 対象の法人形態) — download_all_docs と同じ組み合わせ
+GENERATORS = [
+    ('teikan', 'generate_teikan_pdf', None),
+    ('registration_application', 'generate_registration_application_pdf', None),
+    ('stamp_duty_sheet', 'generate_stamp_duty_sheet_pdf', None),
+    ('registration_items', 'generate_registration_items_pdf', None),
+    ('seal_registration', 'generate_seal_registration_pdf', None),
+    ('inkan_card', 'generate_inkan_card_pdf', None),
+    ('payment_certificate', 'generate_payment_certificate_pdf', {'合同会社', '株式会社'}),
+    ('capital_certificate', 'generate_capital_certificate_pdf', {'合同会社', '株式会社'}),
+    ('office_location', 'generate_office_location_pdf', {'合同会社'}),
+    ('acceptance_letter', 'generate_acceptance_letter_pdf', None),
+    ('founder_resolution', 'generate_founder_resolution_pdf', {'株式会社', '一般社団法人'}),
+]
+
+# 実時間がこの値（ミリ秒）未満の差は誤差として回帰扱いしない
+MIN_REGRESSION_MS = 5.0
+
+
+# ========================================
+# 計測
+# ========================================
+
+def _reset_peak_rss():
+    """ピークRSS（VmHWM）をリセットする。Linux 以外では何もしない"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_kb():
+    """現在のピークRSS（KB）"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def _count_pages(pdf_bytes):
+    try:
+        from pypdf import PdfReader
+        return len(PdfReader(io.BytesIO(pdf_bytes)).pages)
+    except Exception:
+        return None
+
+
+def measure(func, data, repeat):
+    """
+    func(data) を repeat 回実行して計測する
+    1回目の前にウォームアップ（フォント登録・テンプレート読み込み）を1回行う
+
+    wall_ms / cpu_ms は毎回 teikan_layout の折り返しキャッシュを空にしてから計測する
+    （同じデータを繰り返すとキャッシュの再生だけを測ることになるため）。
+    キャッシュが効いた状態の実時間は wall_ms_warm に別に記録する。
+    """
+    from app.services import teikan_layout
+
+    func(data)
+    walls, cpus, warms = [], [], []
+    rss_isolated = _reset_peak_rss()
+    for _ in range(repeat):
+        teikan_layout.clear_cache()
+        w0, c0 = time.perf_counter(), time.process_time()
+        out = func(data)
+        walls.append((time.perf_counter() - w0) * 1000)
+        cpus.append((time.process_time() - c0) * 1000)
+    for _ in range(repeat):
+        w0 = time.perf_counter()
+        func(data)
+        warms.append((time.perf_counter() - w0) * 1000)
+    return {
+        'wall_ms': round(statistics.median(walls), 3),
+        'wall_ms_min': round(min(walls), 3),
+        'wall_ms_max': round(max(walls), 3),
+        'cpu_ms': round(statistics.median(cpus), 3),
+        'wall_ms_warm': round(statistics.median(warms), 3),
+        'peak_rss_kb': _peak_rss_kb(),
+        'peak_rss_isolated': rss_isolated,
+        'bytes': len(out),
+        'pages': _count_pages(out),
+    }
+
+
+def run(only=None, company_types=None, sizes=None, repeat=5):
+    """ベンチマークを実行し、結果のリストを返す"""
+    from app.blueprints import teikan
+
+    results = []
+    for name, func_name, applies_to in GENERATORS:
+        if only and name not in only:
+            continue
+        func = getattr(teikan, func_name)
+        for company_type in company_types or COMPANY_TYPES:
+            if applies_to and company_type not in applies_to:
+                continue
+            for size in sizes or list(SIZES):
+                row = {'generator': name, 'company_type': company_type, 'size': size}
+                try:
+                    row.update(measure(func, make_data(company_type, size), repeat))
+                except Exception as e:
+                    row['error'] = f'{type(e).__name__}: {e}'
+                results.append(row)
+                _print_row(row)
+    return results
+
+
+# ========================================
+# レポート・ベースライン比較
+# ========================================
+
+def _key(row):
+    return f"{row['generator']}/{row['company_type']}/{row['size']}"
+
+
+def _print_row(row):
+    if 'error' in row:
+        print(f"❌ {_key(row):<48} {row['error']}")
+        return
+    print(f"   {_key(row):<48} wall {row['wall_ms']:>9.1f}ms  warm {row['wall_ms_warm']:>9.1f}ms  "
+          f"cpu {row['cpu_ms']:>9.1f}ms  "
+          f"rss {row['peak_rss_kb'] / 1024:>7.1f}MB  {row['bytes']:>8}B  {row['pages']}p")
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def build_report(results, repeat):
+    return {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline, threshold):
+    """
+    ベースラインと比較し、実時間の中央値が (1 + threshold) 倍を超えて
+    悪化したものを回帰として返す
+    """
+    base = {_key(r): r for r in baseline.get('results', []) if 'error' not in r}
+    regressions = []
+    for row in report['results']:
+        old = base.get(_key(row))
+        if not old or 'error' in row:
+            continue
+        ratio = row['wall_ms'] / old['wall_ms'] if old['wall_ms'] else 0
+        row['baseline_wall_ms'] = old['wall_ms']
+        row['ratio'] = round(ratio, 3)
+        if ratio > 1 + threshold and row['wall_ms'] - old['wall_ms'] > MIN_REGRESSION_MS:
+            regressions.append(row)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='書類生成ベンチマーク')
+    parser.add_argument('-o', '--output', help='JSONレポートの出力先')
+    parser.add_argument('--repeat', type=int, default=5, help='計測回数（中央値を採用）')
+    parser.add_argument('--only', help='対象ジェネレーター（カンマ区切り）')
+    parser.add_argument('--types', help='対象の法人形態（カンマ区切り）')
+    parser.add_argument('--sizes', help='対象サイズ（small,medium,large）')
+    parser.add_argument('--baseline', help='比較するベースラインJSON')
+    parser.add_argument('--threshold', type=float, default=0.2, help='回帰とみなす悪化率（既定 0.2 = 20%%）')
+    parser.add_argument('--save-baseline', help='結果をベースラインとして保存するパス')
+    args = parser.parse_args(argv)
+
+    split = lambda v: [s.strip() for s in v.split(',') if s.strip()] if v else None
+    results = run(only=split(args.only), company_types=split(args.types),
+                  sizes=split(args.sizes), repeat=args.repeat)
+    report = build_report(results, args.repeat)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        report['regressions'] = [_key(r) for r in regressions]
+
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ レポートを保存しました: {path}")
+
+    errors = [r for r in results if 'error' in r]
+    for row in regressions:
+        print(f"⚠️ 回帰: {_key(row)} {row['baseline_wall_ms']}ms → {row['wall_ms']}ms（×{row['ratio']}）")
+    if regressions or errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
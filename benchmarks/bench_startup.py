@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ワーカー起動時間（import app ＋ create_app()）のベンチマーク
+
+新しいプロセスで `python -X importtime` を使ってアプリを起動し、起動時間と
+モジュールごとの読み込み時間を計測します。次のどちらかに当てはまれば終了コード 1 を返します。
+
+- 起動時間の中央値が --budget-ms を超えた
+- 起動時に読み込まれてはいけない重いライブラリ（ReportLab・pypdf・pdf2image・markdown・PIL）が読み込まれた
+
+使い方:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --budget-ms 800 --repeat 5 -o startup.json
+    python -m benchmarks.bench_startup --db-init   # 起動時のDB初期化も含めて計測
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+from benchmarks.bench_generators import _git_revision
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 起動時に読み込まれてはいけないモジュール（最初に使うリクエストで読み込む）
+FORBIDDEN_MODULES = ['reportlab', 'pypdf', 'pdf2image', 'markdown', 'PIL']
+
+DEFAULT_BUDGET_MS = 1000.0
+
+_BOOT_SCRIPT = """
+import sys, time
+sys.path.insert(0, {root!r})
+t0 = time.perf_counter()
+from app import create_app
+t1 = time.perf_counter()
+app = create_app()
+t2 = time.perf_counter()
+sys.stderr.write("BOOT_RESULT %.3f %.3f %d\\n" % ((t1 - t0) * 1000, (t2 - t1) * 1000, len(list(app.url_map.iter_rules()))))
+"""
+
+_IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def parse_importtime(stderr):
+    """-X importtime の出力を [(モジュール, 自身のμs, 累計のμs, 深さ)] にする"""
+    rows = []
+    for line in stderr.splitlines():
+        m = _IMPORTTIME_RE.match(line)
+        if m:
+            self_us, cumulative_us, indent, module = m.groups()
+            rows.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def boot_once(db_init):
+    """アプリを1回起動して (import ms, create_app ms, ルート数, importtime の行) を返す"""
+    env = dict(os.environ)
+    env['DB_INIT_ON_STARTUP'] = '1' if db_init else '0'
+    env['PYTHONDONTWRITEBYTECODE'] = '0'
+    with tempfile.TemporaryDirectory() as cwd:
+        # SQLite のファイルは一時ディレクトリに作る（リポジトリの DB を触らない）
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', _BOOT_SCRIPT.format(root=REPO_ROOT)],
+            cwd=cwd, env=env, capture_output=True, text=True, timeout=120,
+        )
+    result = next((line for line in proc.stderr.splitlines() if line.startswith('BOOT_RESULT')), None)
+    if proc.returncode != 0 or not result:
+        raise RuntimeError(f'起動に失敗しました (exit {proc.returncode}):\n{proc.stderr[-2000:]}')
+    import_ms, create_ms, routes = result.split()[1:]
+    return float(import_ms), float(create_ms), int(routes), parse_importtime(proc.stderr)
+
+
+def run(repeat=5, db_init=False, top=15):
+    boots = [boot_once(db_init) for _ in range(repeat + 1)]
+    # 1回目は .pyc の生成などを含むため捨てる
+    boots = boots[1:]
+    totals = [i + c for i, c, _, _ in boots]
+    median_index = totals.index(sorted(totals)[len(totals) // 2])
+    import_ms, create_ms, routes, rows = boots[median_index]
+
+    loaded = {module for module, _, _, _ in rows}
+    forbidden = sorted({name for name in FORBIDDEN_MODULES
+                        for module in loaded if module == name or module.startswith(name + '.')})
+    top_level = [r for r in rows if r[3] <= 1]
+    return {
+        'boot_ms': round(statistics.median(totals), 1),
+        'boot_ms_min': round(min(totals), 1),
+        'boot_ms_max': round(max(totals), 1),
+        'import_ms': round(import_ms, 1),
+        'create_app_ms': round(create_ms, 1),
+        'routes': routes,
+        'modules_loaded': len(loaded),
+        'forbidden_loaded': forbidden,
+        'top_imports': [
+            {'module': m, 'cumulative_ms': round(cum / 1000, 1), 'self_ms': round(own / 1000, 1)}
+            for m, own, cum, _ in sorted(top_level, key=lambda r: -r[2])[:top]
+        ],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ワーカー起動時間ベンチマーク')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help=f'起動時間の上限（中央値、既定 {DEFAULT_BUDGET_MS:.0f}ms）')
+    parser.add_argument('--repeat', type=int, default=5, help='計測回数')
+    parser.add_argument('--db-init', action='store_true', help='起動時のDB初期化（DB_INIT_ON_STARTUP=1）を含める')
+    parser.add_argument('--top', type=int, default=15, help='表示する読み込み時間上位のモジュール数')
+    parser.add_argument('-o', '--output', help='JSONレポートの出力先')
+    args = parser.parse_args(argv)
+
+    result = run(repeat=args.repeat, db_init=args.db_init, top=args.top)
+    print(f"   起動 {result['boot_ms']:.1f}ms（import {result['import_ms']:.1f}ms + "
+          f"create_app {result['create_app_ms']:.1f}ms）  ルート {result['routes']}  "
+          f"モジュール {result['modules_loaded']}")
+    for row in result['top_imports']:
+        print(f"   {row['module']:<40} {row['cumulative_ms']:>8.1f}ms")
+
+    if args.output:
+        report = {
+            'meta': {
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'git_revision': _git_revision(),
+                'python': sys.version.split()[0],
+                'budget_ms': args.budget_ms,
+                'db_init': args.db_init,
+                'repeat': args.repeat,
+            },
+            'result': result,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ レポートを保存しました: {args.output}")
+
+    failed = False
+    if result['boot_ms'] > args.budget_ms:
+        print(f"⚠️ 起動時間が予算を超えています: {result['boot_ms']:.1f}ms > {args.budget_ms:.0f}ms")
+        failed = True
+    if result['forbidden_loaded']:
+        print(f"⚠️ 起動時に重いライブラリが読み込まれています: {', '.join(result['forbidden_loaded'])}")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
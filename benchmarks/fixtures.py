@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+ベンチマーク用の定款データ（セッションの teikan_data と同じ形式）
+
+法人形態ごとに small / medium / large の3サイズを用意する。
+乱数は使わず、同じ引数からは常に同じデータを作る。
+"""
+
+COMPANY_TYPES = ['合同会社', '株式会社', '一般社団法人']
+
+# サイズ → (社員・発起人の数, 事業目的の数)
+SIZES = {
+    'small': (1, 3),
+    'medium': (5, 15),
+    'large': (30, 60),
+}
+
+_SURNAMES = ['山田', '佐藤', '鈴木', '高橋', '田中', '伊藤', '渡辺', '中村', '小林', '加藤']
+_GIVEN = ['太郎', '花子', '一郎', '美咲', '健太', '陽子', '翔', '真由美', '大輔', '彩']
+_PURPOSES = [
+    'ソフトウェアの企画、開発、販売及び保守',
+    'Webサイト・アプリケーションの企画、設計、開発及び運営',
+    '飲食店の経営及び管理',
+    '不動産の売買、賃貸、仲介及び管理',
+    '経営コンサルティング業務',
+    '衣類、アクセサリー類、雑貨品等の企画、製作、小売、卸売及び輸出入',
+    '労働者派遣事業及び有料職業紹介事業',
+    'セミナー、講演会の企画、運営及び開催',
+]
+
+
+def make_members(count):
+    members = []
+    for i in range(count):
+        members.append({
+            'name': f'{_SURNAMES[i % 10]}　{_GIVEN[(i // 10) % 10]}',
+            'name_kana': 'ヤマダ　タロウ',
+            'is_representative': i == 0,
+            'contribution': str(1000000 // count * (1 if i else 2)),
+            'postal_code': '100-0001',
+            'address': f'東京都千代田区千代田{i + 1}番{i + 1}号',
+            'phone': '03-0000-0000',
+            'birth_era': '昭和',
+            'birth_year': str(40 + i % 20),
+            'birth_month': str(1 + i % 12),
+            'birth_day': str(1 + i % 28),
+        })
+    return members
+
+
+def make_purposes(count):
+    purposes = []
+    for i in range(count):
+        base = _PURPOSES[i % len(_PURPOSES)]
+        purposes.append(base if i < len(_PURPOSES) else f'{base}（第{i + 1}事業部）')
+    purposes.append('前（各）号に附帯関連する一切の事業')
+    return purposes
+
+
+def make_data(company_type='合同会社', size='small'):
+    """法人形態とサイズから定款データを作る"""
+    member_count, purpose_count = SIZES[size]
+    members = make_members(member_count)
+    capital = sum(int(m['contribution']) for m in members)
+    return {
+        'company_type': company_type,
+        'company_name': f'ベンチマーク{size}',
+        'company_name_kana': 'ベンチマーク',
+        'company_type_position': 'before',
+        'registration_method': '法務局に直接提出',
+        'postal_code': '100-0001',
+        'address': '東京都千代田区千代田',
+        'address_detail': '1番1号 ベンチマークビル3階',
+        'capital': str(capital),
+        'phone': '03-0000-0000',
+        'has_board_of_directors': 'false',
+        'members': members,
+        'purposes': make_purposes(purpose_count),
+        'fiscal_start_month': '4',
+        'fiscal_start_day': '1',
+        'fiscal_end_month': '3',
+        'fiscal_end_day': '末日',
+        'established_date': '2025-04-01',
+    }
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+定款作成フローのHTTP負荷試験
+
+仮想ユーザー（スレッド）ごとに次の流れを繰り返し、ルートごとのレイテンシと
+DBクエリ数（レスポンスの Server-Timing ヘッダーの db）を集計します。
+
+    ログイン → step1〜step4（各ステップで autosave_draft）→ 確認 → 全書類ZIP → 履歴
+
+- 既定ではアプリをプロセス内で起動し、Flask のテストクライアントで実行する
+- --url を指定すると、起動済みのサーバー（gunicorn 等）にHTTPで接続する
+- DB は環境変数 DATABASE_URL に従う（未設定ならカレントディレクトリの SQLite）
+- プロセス内で起動する場合は書類作成の流量制限（app/admission.py）を切る（--admission で有効のまま）。
+  --url で接続する場合は、サーバー側を ADMISSION=0 で起動するか制限を緩めておく。
+  429 が返ったリクエストは throttled として別に数え、1件でもあれば終了コード 1 で終わる
+- ルートごとに期待するステータスと Content-Type（全書類ZIPは 200 と application/zip）を決めておき、
+  違ったものはエラーとして数える（レイテンシは期待どおりのレスポンスだけで集計する）。
+  エラーが1件でもあれば終了コード 1 で終わる
+
+使い方:
+    python -m benchmarks.loadtest --users 4 --iterations 5 --tenants 2
+    DATABASE_URL=postgresql://... python -m benchmarks.loadtest --users 8 -o load.json
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000 --users 16 --no-seed
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+from benchmarks.fixtures import COMPANY_TYPES, SIZES, make_data
+
+PASSWORD = 'loadtest-pass'
+
+
+def login_id_for(tenant_index):
+    return f'loadtest_t{tenant_index}'
+
+
+# ========================================
+# テストデータ
+# ========================================
+
+def seed(tenant_count):
+    """
+    負荷試験用のテナントとテナント管理者を用意する（既にあれば再利用）
+
+    ログインは get_db（DATABASE_URL が無い場合は database/login_auth.db）を参照し、
+    定款の保存は SQLAlchemy 側のDBを使うため、管理者は両方に存在するようにする。
+    """
+    from app import init_database
+    from app.db import SessionLocal
+    from app.models_login import TTenant, TKanrisha
+    from app.services.login import hash_password
+    from app.utils import get_db, _sql, ROLES
+
+    init_database()
+    password_hash = hash_password(PASSWORD)
+    tenant_ids = []
+    db = SessionLocal()
+    try:
+        for i in range(tenant_count):
+            slug = f'loadtest-{i}'
+            tenant = db.query(TTenant).filter(TTenant.slug == slug).first()
+            if not tenant:
+                tenant = TTenant(名称=f'負荷試験テナント{i}', slug=slug)
+                db.add(tenant)
+                db.flush()
+            tenant_ids.append(tenant.id)
+            if not db.query(TKanrisha).filter(TKanrisha.login_id == login_id_for(i)).first():
+                db.add(TKanrisha(login_id=login_id_for(i), name=f'負荷試験{i}', email=f'{slug}@example.com',
+                                 password_hash=password_hash, role=ROLES["TENANT_ADMIN"], tenant_id=tenant.id))
+        db.commit()
+    finally:
+        db.close()
+
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        for i, tenant_id in enumerate(tenant_ids):
+            cur.execute(_sql(conn, 'SELECT id FROM "T_管理者" WHERE login_id=%s'), (login_id_for(i),))
+            if not cur.fetchone():
+                cur.execute(_sql(conn, 'INSERT INTO "T_管理者"(login_id, name, email, password_hash, role, tenant_id) '
+                                       'VALUES (%s, %s, %s, %s, %s, %s)'),
+                            (login_id_for(i), f'負荷試験{i}', f'loadtest-{i}@example.com',
+                             password_hash, ROLES["TENANT_ADMIN"], tenant_id))
+        conn.commit()
+    finally:
+        conn.close()
+    return tenant_ids
+
+
+def wizard_forms(data):
+    """定款データを step1〜step4 のフォーム入力に展開する"""
+    step1 = {k: data[k] for k in ('company_type', 'company_name', 'company_name_kana', 'company_type_position',
+                                   'registration_method', 'postal_code', 'address', 'address_detail',
+                                   'phone', 'has_board_of_directors')}
+    step1.update({'capital_from_step1': '1', 'capital': data['capital']})
+    step2 = {'member_count': str(len(data['members']))}
+    for i, m in enumerate(data['members']):
+        step2.update({
+            f'member_name_{i}': m['name'], f'member_name_kana_{i}': m['name_kana'],
+            f'contribution_{i}': m['contribution'], f'member_postal_{i}': m['postal_code'],
+            f'member_address_{i}': m['address'], f'member_phone_{i}': m['phone'],
+            f'member_birth_era_{i}': m['birth_era'], f'member_birth_year_{i}': m['birth_year'],
+            f'member_birth_month_{i}': m['birth_month'], f'member_birth_day_{i}': m['birth_day'],
+        })
+        if m['is_representative']:
+            step2[f'is_representative_{i}'] = 'on'
+    purposes = data['purposes'][:-1]
+    step3 = {'purpose_count': str(len(purposes))}
+    step3.update({f'purpose_{i}': p for i, p in enumerate(purposes)})
+    step4 = {k: data[k] for k in ('fiscal_start_month', 'fiscal_start_day', 'fiscal_end_month',
+                                   'fiscal_end_day', 'established_date')}
+    return step1, step2, step3, step4
+
+
+# 期待するレスポンス（ステータス, Content-Type）。Content-Type が None なら確認しない
+_REDIRECT = (302, None)
+_HTML = (200, 'text/html')
+# 書類のダウンロードは生成に失敗するとフラッシュメッセージ付きの 302 を返すので、
+# ステータスと Content-Type の両方で成功を確かめる
+_ZIP = (200, 'application/zip')
+
+
+def scenario(data, login_id):
+    """1回分のリクエスト列 [(ルート名, メソッド, パス, フォーム, 期待するレスポンス), ...]"""
+    step1, step2, step3, step4 = wizard_forms(data)
+    return [
+        ('login', 'POST', '/tenant_admin_login', {'login_id': login_id, 'password': PASSWORD}, _REDIRECT),
+        ('new', 'GET', '/apps/teikan/new', None, _REDIRECT),
+        ('step1', 'POST', '/apps/teikan/step1', step1, _REDIRECT),
+        ('step2', 'POST', '/apps/teikan/step2', step2, _REDIRECT),
+        ('step3', 'POST', '/apps/teikan/step3', step3, _REDIRECT),
+        ('step4', 'POST', '/apps/teikan/step4', step4, _REDIRECT),
+        ('confirm', 'GET', '/apps/teikan/confirm', None, _HTML),
+        ('download_all', 'GET', '/apps/teikan/registration_docs/download/all', None, _ZIP),
+        ('history', 'GET', '/apps/teikan/history', None, _HTML),
+    ]
+
+
+def _as_expected(status, content_type, expect):
+    expected_status, expected_type = expect
+    if status != expected_status:
+        return False
+    return expected_type is None or (content_type or '').split(';')[0].strip() == expected_type
+
+
+# ========================================
+# クライアント
+# ========================================
+
+def _server_timing_db(header):
+    """
+    Server-Timing ヘッダーの db からクエリ数（db;desc="N queries"）を取り出す
+    app/instrumentation.py が SQLAlchemy と get_db() の両方のクエリを数えて付ける
+    （SERVER_TIMING=0 のサーバーでは None）
+    """
+    for part in (header or '').split(','):
+        fields = [f.strip() for f in part.split(';')]
+        if fields and fields[0] in ('db', 'sql'):
+            for f in fields[1:]:
+                if f.startswith('desc='):
+                    digits = ''.join(ch for ch in f if ch.isdigit())
+                    return int(digits) if digits else None
+    return None
+
+
+class InProcessClient:
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def request(self, method, path, form):
+        resp = self._client.open(path, method=method, data=form, follow_redirects=False)
+        body = resp.get_data()
+        return (resp.status_code, len(body), _server_timing_db(resp.headers.get('Server-Timing')),
+                resp.headers.get('Content-Type'))
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self._base = base_url.rstrip('/')
+        self._opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect()
+        )
+
+    def request(self, method, path, form):
+        body = urllib.parse.urlencode(form).encode() if form is not None else None
+        req = urllib.request.Request(self._base + path, data=body, method=method)
+        try:
+            with self._opener.open(req, timeout=120) as resp:
+                data = resp.read()
+                return (resp.status, len(data), _server_timing_db(resp.headers.get('Server-Timing')),
+                        resp.headers.get('Content-Type'))
+        except urllib.error.HTTPError as e:
+            data = e.read()
+            return (e.code, len(data), _server_timing_db(e.headers.get('Server-Timing')),
+                    e.headers.get('Content-Type'))
+
+
+# ========================================
+# 実行・集計
+# ========================================
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def run(make_client, users, iterations, tenant_count, size):
+    samples = []  # (ルート, 経過ms, ステータス, バイト数, クエリ数, 期待どおりか)
+    lock = threading.Lock()
+
+    def worker(user_index):
+        client = make_client()
+        login_id = login_id_for(user_index % tenant_count)
+        company_type = COMPANY_TYPES[user_index % len(COMPANY_TYPES)]
+        data = make_data(company_type, size)
+        for _ in range(iterations):
+            for route, method, path, form, expect in scenario(data, login_id):
+                started = time.perf_counter()
+                try:
+                    status, nbytes, queries, content_type = client.request(method, path, form)
+                except Exception:
+                    status, nbytes, queries, content_type = 0, 0, None, None
+                elapsed = (time.perf_counter() - started) * 1000
+                ok = _as_expected(status, content_type, expect)
+                with lock:
+                    samples.append((route, elapsed, status, nbytes, queries, ok))
+
+    threads = [threading.Thread(target=worker, args=(i,), name=f'loadtest-{i}') for i in range(users)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples, duration):
+    routes = {}
+    for route, elapsed, status, nbytes, queries, ok in samples:
+        r = routes.setdefault(route, {'count': 0, 'lat': [], 'errors': 0, 'throttled': 0, 'bytes': 0,
+                                      'queries': [], 'statuses': {}})
+        r['count'] += 1
+        r['statuses'][str(status)] = r['statuses'].get(str(status), 0) + 1
+        if ok:
+            # レイテンシとサイズは期待どおりのレスポンスだけで集計する
+            # （生成に失敗した書類のリダイレクトを、書類の作成時間として数えないため）
+            r['lat'].append(elapsed)
+            r['bytes'] += nbytes
+        elif status == 429:
+            # 流量制限で断られたもの（処理していないのでレイテンシが短く、結果が良く見えてしまう）
+            r['throttled'] += 1
+        else:
+            r['errors'] += 1
+        if queries is not None:
+            r['queries'].append(queries)
+
+    summary = {}
+    for route, r in routes.items():
+        lat = r['lat']
+        rounded = lambda v: round(v, 2) if v is not None else None
+        summary[route] = {
+            'count': r['count'],
+            'errors': r['errors'],
+            'throttled': r['throttled'],
+            'statuses': r['statuses'],
+            'p50_ms': rounded(_percentile(lat, 50)),
+            'p95_ms': rounded(_percentile(lat, 95)),
+            'p99_ms': rounded(_percentile(lat, 99)),
+            'max_ms': rounded(max(lat) if lat else None),
+            'avg_bytes': int(r['bytes'] / len(lat)) if lat else None,
+            'db_queries_avg': round(statistics.mean(r['queries']), 1) if r['queries'] else None,
+            'db_queries_max': max(r['queries']) if r['queries'] else None,
+        }
+    total = len(samples)
+    return {
+        'requests': total,
+        'duration_s': round(duration, 3),
+        'throughput_rps': round(total / duration, 2) if duration else None,
+        'errors': sum(s['errors'] for s in summary.values()),
+        'throttled': sum(s['throttled'] for s in summary.values()),
+        'routes': summary,
+    }
+
+
+def _print_summary(result):
+    print(f"{'route':<14}{'count':>7}{'err':>5}{'429':>5}{'p50':>10}{'p95':>10}{'p99':>10}{'queries':>9}  status")
+    for route, s in result['routes'].items():
+        q = s['db_queries_avg'] if s['db_queries_avg'] is not None else '-'
+        statuses = ' '.join(f'{code}×{n}' for code, n in sorted(s['statuses'].items()))
+        ms = lambda v: f'{v:>10.1f}' if v is not None else f"{'-':>10}"
+        print(f"{route:<14}{s['count']:>7}{s['errors']:>5}{s['throttled']:>5}{ms(s['p50_ms'])}{ms(s['p95_ms'])}"
+              f"{ms(s['p99_ms'])}{q:>9}  {statuses}")
+    print(f"合計 {result['requests']} リクエスト / {result['duration_s']}秒 = {result['throughput_rps']} req/s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='定款作成フローの負荷試験')
+    parser.add_argument('--url', help='接続先サーバー（省略時はプロセス内のテストクライアント）')
+    parser.add_argument('--users', type=int, default=4, help='同時実行する仮想ユーザー数')
+    parser.add_argument('--iterations', type=int, default=3, help='ユーザーごとの繰り返し回数')
+    parser.add_argument('--tenants', type=int, default=2, help='使用するテナント数')
+    parser.add_argument('--size', choices=list(SIZES), default='small', help='入力データのサイズ')
+    parser.add_argument('--no-seed', action='store_true', help='テストデータを作成しない')
+    parser.add_argument('--admission', action='store_true',
+                        help='プロセス内で起動する場合も書類作成の流量制限を有効にする')
+    parser.add_argument('-o', '--output', help='JSONレポートの出力先')
+    args = parser.parse_args(argv)
+
+    if not args.url and not args.admission:
+        # app.admission は読み込み時に設定を読むので、アプリを読み込む前に切る
+        os.environ['ADMISSION'] = '0'
+
+    if not args.no_seed:
+        seed(args.tenants)
+
+    if args.url:
+        make_client = lambda: HttpClient(args.url)
+    else:
+        from app import create_app
+        app = create_app()
+        make_client = lambda: InProcessClient(app)
+
+    samples, duration = run(make_client, args.users, args.iterations, args.tenants, args.size)
+    result = summarize(samples, duration)
+    result['meta'] = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'target': args.url or 'in-process',
+        'database': (os.environ.get('DATABASE_URL') or 'sqlite (default)').split('@')[-1],
+        'users': args.users, 'iterations': args.iterations,
+        'tenants': args.tenants, 'size': args.size,
+        'admission': os.environ.get('ADMISSION', '1') if not args.url else 'server',
+    }
+    _print_summary(result)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"✅ レポートを保存しました: {args.output}")
+
+    if result['errors']:
+        print(f"❌ {result['errors']} 件のリクエストが期待したレスポンス（ステータス・Content-Type）になりませんでした")
+    if result['throttled']:
+        print(f"❌ {result['throttled']} 件のリクエストが流量制限（429）で断られました。"
+              f"サーバーを ADMISSION=0 で起動するか、ADMISSION_* の上限を上げてください")
+    if result['errors'] or result['throttled']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
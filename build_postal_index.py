@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+郵便番号索引の作成スクリプト
+
+日本郵便の KEN_ALL（CSV または ZIP）から、定款作成画面の住所自動入力で使う
+ローカル索引（SQLite）を作成します。KEN_ALL が更新されたら再実行してください。
+
+使い方:
+    python build_postal_index.py ken_all.zip
+    python build_postal_index.py KEN_ALL.CSV -o /path/to/postal_codes.sqlite
+    python build_postal_index.py --download
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import urllib.request
+
+from app.services import postal_index
+
+
+def download_ken_all(dest_dir):
+    """日本郵便から最新の KEN_ALL（ZIP）をダウンロードする"""
+    dest = os.path.join(dest_dir, 'ken_all.zip')
+    print(f"⬇️  ダウンロード中: {postal_index.KEN_ALL_URL}")
+    urllib.request.urlretrieve(postal_index.KEN_ALL_URL, dest)
+    return dest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='KEN_ALL から郵便番号索引を作成する')
+    parser.add_argument('source', nargs='?', help='KEN_ALL.CSV または ken_all.zip のパス')
+    parser.add_argument('--download', action='store_true', help='日本郵便から KEN_ALL を取得して作成する')
+    parser.add_argument('-o', '--output', default=None,
+                        help=f'出力先（既定: POSTAL_INDEX_PATH または {postal_index.DEFAULT_INDEX_PATH}）')
+    args = parser.parse_args(argv)
+
+    if not args.source and not args.download:
+        parser.error('KEN_ALL のパスを指定するか --download を付けてください')
+
+    output = args.output or postal_index.index_path()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            source = download_ken_all(tmp) if args.download else args.source
+            started = time.perf_counter()
+            count = postal_index.build_index(source, output)
+        elapsed = time.perf_counter() - started
+        print(f"✅ 郵便番号索引を作成しました: {output}（{count}件, {elapsed:.1f}秒）")
+    except Exception as e:
+        print(f"❌ 郵便番号索引の作成エラー: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+gunicorn 設定（`gunicorn wsgi:app` 実行時にカレントディレクトリから自動で読み込まれる）
+
+ワーカーの種類は環境変数 GUNICORN_WORKER_CLASS で選ぶ。
+
+- gthread（既定）: 1ワーカーあたり GUNICORN_THREADS 本のスレッドで処理する。
+  PDF生成中でも同じワーカーの他のスレッドが DB 待ちの軽いリクエストを捌ける
+- gevent: psycopg2 を psycogreen で協調動作させ、I/O 待ちの多い処理で同時接続数を稼ぐ。
+  ReportLab の描画は CPU を占有し、その間は同じワーカーの他のリクエストが止まる点に注意
+- sync: gunicorn の既定（1ワーカー1リクエスト）
+
+preload_app（GUNICORN_PRELOAD=0 で無効）ではマスターでアプリを読み込んでウォームアップし、
+fork 後のワーカーで DB コネクションプールとログの書き込みスレッドを作り直す。
+ReportLab のメモリ増加を抑えるため、max_requests（＋ジッター）件ごとにワーカーを入れ替える。
+"""
+
+import os
+import shutil
+
+WORKER_CLASS = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+
+if WORKER_CLASS == "gevent":
+    # preload でアプリを読み込む前にパッチを当てる（後からだと ssl 等が協調動作しない）
+    from gevent import monkey
+    monkey.patch_all()
+
+worker_class = WORKER_CLASS
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+if WORKER_CLASS == "gthread":
+    threads = int(os.getenv("GUNICORN_THREADS", "4"))
+elif WORKER_CLASS == "gevent":
+    worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "100"))
+
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") in ("1", "true", "True")
+
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+
+# 大きな ZIP 一式の生成を途中で打ち切らない長さにする
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# /metrics を全ワーカー分集計するための共有ディレクトリ（app/metrics.py 参照）
+# ワーカーが prometheus_client を読み込む前に設定しておく必要がある
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/teikan-metrics")
+# preload ではこの後すぐマスターでアプリ（メトリクス）を読み込むため、先に作っておく
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+
+def on_starting(server):
+    """
+    前回起動時のメトリクスファイルを消してから起動する
+    （preload 時のマスターの分も消えるが、ワーカーは fork 後に自分のファイルを作り直す）
+    """
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def when_ready(server):
+    """preload したアプリをマスターでウォームアップする（ワーカーは fork で結果を共有する）"""
+    if not preload_app:
+        return
+    from app.warmup import warm
+    timings = warm(server.app.wsgi())
+    server.log.info("warmup (master): %s", timings)
+
+    # マスターで記録したゲージ（コネクションプールのサイズ等）は集計に含めない
+    try:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(os.getpid())
+    except ImportError:
+        pass
+
+
+def post_fork(server, worker):
+    """fork 直後のワーカーで、親から引き継ぐと壊れるものを作り直す"""
+    if WORKER_CLASS == "gevent":
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+    if not preload_app:
+        return
+    # 親プロセスが開いた DB 接続を子で使わない（親の接続は閉じずに手放す）
+    from app.db import engine
+    engine.dispose(close=False)
+    from app.utils.db import dispose_pool
+    dispose_pool(close=False)
+
+    from app import metrics
+    metrics.instrument_pool(engine)
+
+    from app.logging import restart_after_fork
+    restart_after_fork()
+
+
+def post_worker_init(worker):
+    """preload しない場合はワーカーごとにウォームアップする（preload 時は済んでいるので飛ばされる）"""
+    from app.warmup import warm
+    timings = warm(worker.wsgi)
+    if timings:
+        worker.log.info("warmup (worker %s): %s", worker.pid, timings)
+
+
+def child_exit(server, worker):
+    """終了したワーカーのゲージを集計から外す（マスターで app を読み込まないよう直接呼ぶ）"""
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
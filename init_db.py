@@ -14,14 +14,14 @@ def init_database():
     """データベースを初期化"""
     try:
         # アプリケーションのインポート
-        from app.db import Base, engine, SessionLocal
-        from app import models_login, models_auth
+        from app import init_database as init_schema
+        from app.db import SessionLocal
         from app.models_login import TKanrisha, TTenant, TTenpo, TTenantAppSetting
         from werkzeug.security import generate_password_hash
         
+        # テーブル作成・ログイン用スキーマ・マイグレーション（web ワーカーの起動時には省略できる）
         print("📦 データベーステーブルを作成中...")
-        Base.metadata.create_all(bind=engine)
-        print("✅ データベーステーブル作成完了")
+        init_schema()
         
         # セッションを作成
         db = SessionLocal()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+定款アーカイブ（T_定款）のエクスポート／インポートスクリプト
+
+テナント単位で保存済み定款をNDJSON（gzip）に書き出し、
+別環境やバックアップから読み戻すために使用します。
+
+使い方:
+    python teikan_archive.py export --tenant-id 1 -o tenant1.ndjson.gz
+    python teikan_archive.py import --tenant-id 1 tenant1.ndjson.gz
+"""
+
+import argparse
+import os
+import sys
+
+
+def export_archive(tenant_id, output, batch_size):
+    """テナントの定款をファイルに書き出す"""
+    from app.services.teikan_archive import iter_export_gzip
+
+    with open(output, 'wb') as out:
+        for chunk in iter_export_gzip(tenant_id, batch_size=batch_size):
+            out.write(chunk)
+
+
+def import_archive(tenant_id, path, batch_size, created_by):
+    """ファイル（'-' は標準入力）からテナントの定款を読み込む"""
+    from app.services.teikan_archive import import_archive as _import
+
+    src = sys.stdin.buffer if path == '-' else open(path, 'rb')
+    try:
+        return _import(src, tenant_id, created_by=created_by, batch_size=batch_size)
+    finally:
+        if src is not sys.stdin.buffer:
+            src.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='定款アーカイブのエクスポート／インポート')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_export = sub.add_parser('export', help='テナントの定款をNDJSON（gzip）で書き出す')
+    p_export.add_argument('--tenant-id', type=int, required=True)
+    p_export.add_argument('-o', '--output', required=True, help='出力先ファイル（.ndjson.gz）')
+    p_export.add_argument('--batch-size', type=int, default=500)
+
+    p_import = sub.add_parser('import', help='NDJSON（gzip可）からテナントの定款を読み込む')
+    p_import.add_argument('--tenant-id', type=int, required=True)
+    p_import.add_argument('path', help="入力ファイル（'-' で標準入力）")
+    p_import.add_argument('--batch-size', type=int, default=500)
+    p_import.add_argument('--created-by', type=int, default=None,
+                          help='新しく作る定款の作成者にする管理者ID（アーカイブの作成者IDは使わない）')
+
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'export':
+            export_archive(args.tenant_id, args.output, args.batch_size)
+            print(f"✅ エクスポート完了: {args.output}")
+        else:
+            stats = import_archive(args.tenant_id, args.path, args.batch_size, args.created_by)
+            print(f"✅ インポート完了: 新規 {stats['inserted']}件 / "
+                  f"更新 {stats['updated']}件 / スキップ {stats['skipped']}件")
+    except Exception as e:
+        print(f"❌ 定款アーカイブ処理エラー: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    print(f"   DATABASE_URL: {os.environ.get('DATABASE_URL', '(未設定)')[:50]}...")
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+定款の版の履歴（T_定款履歴）の間引きスクリプト
+
+保持期間（既定は REVISION_KEEP_DAYS 日）より古い版を、最初の版・最新の版・
+日ごとの最後の版・状態が変わった版だけに減らし、残した版の連なりを組み直します。
+定期的（例: 毎日1回）に実行してください。
+
+使い方:
+    python teikan_revisions.py compact                    # 全定款
+    python teikan_revisions.py compact --keep-days 90     # 90日より古い版を間引く
+    python teikan_revisions.py compact --document-id 12   # 指定した定款のみ
+"""
+
+import argparse
+import os
+import sys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='定款の版の履歴の間引き')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_compact = sub.add_parser('compact', help='保持期間より古い版を間引く')
+    p_compact.add_argument('--keep-days', type=int, default=None,
+                           help='この日数より新しい版はすべて残す（省略時は REVISION_KEEP_DAYS）')
+    p_compact.add_argument('--document-id', type=int, default=None,
+                           help='対象の定款ID（省略時はすべての定款）')
+
+    args = parser.parse_args(argv)
+
+    try:
+        from app import init_database
+        from app.services.revisions import compact
+
+        init_database()
+        stats = compact(args.keep_days, args.document_id)
+        print(f"✅ 履歴を間引きました: 定款 {stats['documents']}件 / "
+              f"残した版 {stats['kept']} / 消した版 {stats['removed']} / "
+              f"{stats['bytes_before']:,} → {stats['bytes_after']:,} バイト")
+    except Exception as e:
+        print(f"❌ 履歴の間引きエラー: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    print(f"   DATABASE_URL: {os.environ.get('DATABASE_URL', '(未設定)')[:50]}...")
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+定款の利用状況集計（T_定款集計・T_定款集計_日次）の作り直しスクリプト
+
+集計テーブルを追加する前から保存されている定款を取り込む場合や、
+集計がずれた場合に T_定款 から数え直します。
+
+使い方:
+    python teikan_rollups.py backfill                 # 全テナント
+    python teikan_rollups.py backfill --tenant-id 1   # 指定テナントのみ
+    python teikan_rollups.py backfill --no-daily      # 現在の定款数だけ数え直す
+"""
+
+import argparse
+import os
+import sys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='定款の利用状況集計の作り直し')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_backfill = sub.add_parser('backfill', help='T_定款 から集計を作り直す')
+    p_backfill.add_argument('--tenant-id', type=int, default=None,
+                            help='対象テナント（省略時は全テナント。0 はテナント未選択の定款）')
+    p_backfill.add_argument('--no-daily', action='store_true',
+                            help='日次の作成数・完成数は作り直さない')
+    p_backfill.add_argument('--batch-size', type=int, default=1000)
+
+    args = parser.parse_args(argv)
+
+    try:
+        from app import init_database
+        from app.services.rollups import rebuild
+
+        init_database()
+        stats = rebuild(args.tenant_id, daily=not args.no_daily, batch_size=args.batch_size)
+        print(f"✅ 集計を作り直しました: 定款 {stats['documents']}件 / "
+              f"集計 {stats['status_rows']}行 / 日次 {stats['daily_rows']}行")
+    except Exception as e:
+        print(f"❌ 集計の作り直しエラー: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    print(f"   DATABASE_URL: {os.environ.get('DATABASE_URL', '(未設定)')[:50]}...")
+    main()